@@ -0,0 +1,88 @@
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+#
+
+import functools
+import json
+
+from ansible.parsing.ajson import AnsibleJSONDecoder
+from ansible.parsing.ajson import AnsibleJSONEncoder
+from ansible.plugins.cache import BaseCacheModule
+
+from tripleoclient import fact_cache
+
+DOCUMENTATION = '''
+    cache: tripleo_sqlite
+    short_description: Facts indexed by host in a SQLite database.
+    description:
+        - Stores the facts of every host in one SQLite database, as
+          managed by tripleoclient.fact_cache.SqliteFactCache.
+    options:
+      _uri:
+        required: True
+        description:
+          - Directory of the fact cache, the database is created in a
+            subdirectory of it
+        env:
+          - name: ANSIBLE_CACHE_PLUGIN_CONNECTION
+        ini:
+          - key: fact_caching_connection
+            section: defaults
+      _timeout:
+        default: 86400
+        description: Expiration timeout for the cache plugin data
+        env:
+          - name: ANSIBLE_CACHE_PLUGIN_TIMEOUT
+        ini:
+          - key: fact_caching_timeout
+            section: defaults
+        type: integer
+'''
+
+
+class CacheModule(BaseCacheModule):
+
+    def __init__(self, *args, **kwargs):
+        super(CacheModule, self).__init__(*args, **kwargs)
+        self._cache = fact_cache.SqliteFactCache(
+            self.get_option('_uri'),
+            timeout=int(self.get_option('_timeout')))
+        self._loads = functools.partial(json.loads, cls=AnsibleJSONDecoder)
+        self._dumps = functools.partial(json.dumps, cls=AnsibleJSONEncoder,
+                                        sort_keys=True)
+
+    def get(self, key):
+        return self._cache.get(key, loads=self._loads)
+
+    def set(self, key, value):
+        self._cache.set(key, value, dumps=self._dumps)
+
+    def keys(self):
+        return self._cache.keys()
+
+    def contains(self, key):
+        return self._cache.contains(key)
+
+    def delete(self, key):
+        self._cache.delete(key)
+
+    def flush(self):
+        self._cache.flush()
+
+    def copy(self):
+        return dict((k, self.get(k)) for k in self.keys())
+
+    def __getstate__(self):
+        return dict()
+
+    def __setstate__(self, data):
+        self.__init__()
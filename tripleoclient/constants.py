@@ -37,6 +37,16 @@ STANDALONE_NETWORKS_FILE = "/dev/null"
 UNDERCLOUD_NETWORKS_FILE = "network_data_undercloud.yaml"
 ANSIBLE_HOSTS_FILENAME = "hosts.yaml"
 EPHEMERAL_HEAT_POD_NAME = "ephemeral-heat"
+# Number of compressed ephemeral Heat database backups kept
+EPHEMERAL_HEAT_DB_BACKUP_KEEP = 5
+# The ephemeral Heat log is rotated by the launcher once it reaches this
+# size, and the rotated segments are compressed with this codec (gz, bz2
+# or xz)
+EPHEMERAL_HEAT_LOG_MAX_SIZE_MB = 100
+EPHEMERAL_HEAT_LOG_CODEC = 'gz'
+# Default folder of the NFS share receiving the overcloud ReaR backups
+OVERCLOUD_BACKUP_SHARED_FOLDER = '/ctl_plane_backups'
+OVERCLOUD_BACKUP_MANIFEST_FILE_NAME = 'overcloud-backup-manifest-{}.json'
 ANSIBLE_CWL = "tripleo_dense,tripleo_profile_tasks,tripleo_states"
 CONTAINER_IMAGE_PREPARE_LOG_FILE = "container_image_prepare.log"
 DEFAULT_CONTAINER_REGISTRY = "quay.io"
@@ -126,6 +136,36 @@ ENABLE_SSH_ADMIN_SSH_PORT_TIMEOUT = 600
 
 ADDITIONAL_ARCHITECTURES = ['ppc64le']
 
+# Maximum number of concurrent ironic node updates when assigning profiles
+PROFILE_ASSIGN_WORKERS = 10
+
+# Maximum number of stacks parsed in parallel by overcloud export ceph
+CEPH_EXPORT_WORKERS = 4
+
+# TripleO services mapped to the Ceph daemons of a generated Ceph spec
+CEPH_SPEC_SERVICE_MAP = {
+    'CephMon': ['mon'],
+    'CephMgr': ['mgr'],
+    'CephOSD': ['osd'],
+}
+
+# Keys allowed in the crush location of a Ceph spec host entry
+CEPH_SPEC_CRUSH_LOCATIONS = ['osd', 'host', 'chassis', 'rack', 'row', 'pdu',
+                             'pod', 'room', 'datacenter', 'zone', 'region',
+                             'root']
+
+# OSD spec used when --osd-spec is not passed to overcloud ceph spec
+CEPH_SPEC_DEFAULT_OSD_SPEC = {'data_devices': {'all': True}}
+
+# HTTP connection pool size of the shared openstacksdk connections
+SDK_CONNECTION_POOL_SIZE = 32
+
+# Ansible fact cache of tripleoclient playbooks, see tripleoclient.fact_cache
+FACT_CACHE_BACKEND = 'sqlite'
+FACT_CACHE_TIMEOUT = 7200
+FACT_CACHE_DB_DIR = 'sqlite'
+FACT_CACHE_DB_NAME = 'facts.sqlite'
+
 DEFAULT_VALIDATIONS_BASEDIR = "/usr/share/ansible"
 
 VALIDATIONS_LOG_BASEDIR = '/var/log/validations'
@@ -135,6 +175,15 @@ DEFAULT_WORK_DIR = os.path.join(os.environ.get('HOME', '~/'),
 
 DEFAULT_TEMPLATES_DIR = "/usr/share/python-tripleoclient/templates"
 
+# Number of config-download snapshot commits kept in the stack git repo.
+# The default of 1 amends a single commit on every snapshot.
+CONFIG_DOWNLOAD_SNAPSHOT_KEEP = 1
+# Arguments passed to "git gc" after a snapshot. None disables gc.
+CONFIG_DOWNLOAD_SNAPSHOT_GC = ['--auto', '--quiet']
+CONFIG_DOWNLOAD_SNAPSHOT_INDEX = 'tripleo-snapshot-index.json'
+# Fraction of changed paths above which the whole tree is staged at once.
+CONFIG_DOWNLOAD_SNAPSHOT_FULL_RATIO = 0.5
+
 TRIPLEO_STATIC_INVENTORY = 'tripleo-ansible-inventory.yaml'
 ANSIBLE_INVENTORY = os.path.join(DEFAULT_WORK_DIR,
                                  '{}/', TRIPLEO_STATIC_INVENTORY)
@@ -295,6 +344,10 @@ WD_DEFAULT_ROLES_FILE_NAME = 'tripleo-{}-roles-data.yaml'
 WD_DEFAULT_NETWORKS_FILE_NAME = 'tripleo-{}-network-data.yaml'
 WD_DEFAULT_VIP_FILE_NAME = 'tripleo-{}-virtual-ips.yaml'
 WD_DEFAULT_BAREMETAL_FILE_NAME = 'tripleo-{}-baremetal-deployment.yaml'
+WD_DEFAULT_STACK_DATA_CACHE_FILE_NAME = 'tripleo-{}-stack-data-cache.json'
+WD_DEFAULT_CEPH_EXPORT_CACHE_FILE_NAME = 'tripleo-{}-ceph-export-cache.json'
+WD_DEFAULT_UPDATE_RUN_STATE_FILE_NAME = 'tripleo-{}-update-run-state.json'
+WD_DEFAULT_DEPLOY_TRACE_FILE_NAME = 'tripleo-{}-deploy-trace.json'
 KIND_TEMPLATES = {'roles': WD_DEFAULT_ROLES_FILE_NAME,
                   'networks': WD_DEFAULT_NETWORKS_FILE_NAME,
                   'baremetal': WD_DEFAULT_BAREMETAL_FILE_NAME,
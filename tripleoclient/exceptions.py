@@ -80,6 +80,10 @@ class NodeProvideError(WorkflowServiceError):
     """Node Provide failed."""
 
 
+class NodeUnprovisionError(WorkflowServiceError):
+    """Node Unprovision failed."""
+
+
 class NodeConfigurationError(WorkflowServiceError):
     """Node Configuration failed."""
 
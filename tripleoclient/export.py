@@ -14,6 +14,8 @@
 #
 
 
+from concurrent import futures
+import json
 import logging
 import os
 import re
@@ -137,16 +139,77 @@ def export_stack(heat, stack, should_filter=False,
     return data
 
 
+# Use the libyaml parser when available, it is several times faster than
+# the pure-Python one on the large config-download files.
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+CEPH_EXPORT_FILES = ('global_vars.yaml',
+                     'ceph-ansible/inventory.yml',
+                     'ceph-ansible/group_vars/all.yml')
+
+
+class _YamlDocument(object):
+    """Composed YAML document constructing only the values looked up
+
+    The file is composed into a node graph once and python objects are
+    only built for the paths requested with ``get``, so the host vars of
+    a big inventory are never materialized.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'r') as ff:
+            try:
+                self._root = yaml.compose(ff.read(), Loader=_YAML_LOADER)
+            except yaml.MarkedYAMLError as e:
+                LOG.error(
+                    _('Could not read file %s') % path)
+                LOG.error(e)
+                raise
+        self._loader = _YAML_LOADER('')
+        # Key to value node index of each mapping node already traversed
+        self._mappings = {}
+
+    def _mapping(self, node):
+        index = self._mappings.get(id(node))
+        if index is None:
+            index = dict((key_node.value, value_node)
+                         for key_node, value_node in node.value)
+            self._mappings[id(node)] = index
+        return index
+
+    def _node(self, *path):
+        node = self._root
+        for key in path:
+            if isinstance(node, yaml.SequenceNode) and isinstance(key, int):
+                try:
+                    node = node.value[key]
+                except IndexError:
+                    raise KeyError(key)
+                continue
+            if not isinstance(node, yaml.MappingNode):
+                raise KeyError(key)
+            node = self._mapping(node)[key]
+        return node
+
+    def keys(self, *path):
+        """Return the mapping keys or sequence indexes found at path"""
+        node = self._node(*path)
+        if isinstance(node, yaml.MappingNode):
+            return [key_node.value for key_node, _value in node.value]
+        if isinstance(node, yaml.SequenceNode):
+            return list(range(len(node.value)))
+        return []
+
+    def get(self, *path):
+        """Construct and return the value found at path"""
+        return self._loader.construct_object(self._node(*path), deep=True)
+
+
 def export_ceph_net_key(stack, config_download_dir=constants.DEFAULT_WORK_DIR):
     file = os.path.join(config_download_dir, stack, "global_vars.yaml")
-    with open(file, 'r') as ff:
-        try:
-            global_data = yaml.safe_load(ff)
-        except yaml.MarkedYAMLError as e:
-            LOG.error(
-                _('Could not read file %s') % file)
-            LOG.error(e)
-    return str(global_data['service_net_map']['ceph_mon_network']) + '_ip'
+    global_data = _YamlDocument(file)
+    return str(global_data.get('service_net_map', 'ceph_mon_network')) + '_ip'
 
 
 def export_storage_ips(stack, config_download_dir=constants.DEFAULT_WORK_DIR,
@@ -155,22 +218,55 @@ def export_storage_ips(stack, config_download_dir=constants.DEFAULT_WORK_DIR,
         ceph_net_key = export_ceph_net_key(stack, config_download_dir)
     inventory_file = "ceph-ansible/inventory.yml"
     file = os.path.join(config_download_dir, stack, inventory_file)
-    with open(file, 'r') as ff:
-        try:
-            inventory_data = yaml.safe_load(ff)
-        except yaml.MarkedYAMLError as e:
-            LOG.error(
-                _('Could not read file %s') % file)
-            LOG.error(e)
+    inventory_data = _YamlDocument(file)
     mon_ips = []
-    for mon_role in inventory_data['mons']['children'].keys():
-        for hostname in inventory_data[mon_role]['hosts']:
-            ip = inventory_data[mon_role]['hosts'][hostname][ceph_net_key]
+    for mon_role in inventory_data.keys('mons', 'children'):
+        for hostname in inventory_data.keys(mon_role, 'hosts'):
+            ip = inventory_data.get(mon_role, 'hosts', hostname, ceph_net_key)
             mon_ips.append(ip)
 
     return mon_ips
 
 
+def _ceph_export_signature(stack, cephx, config_download_dir):
+    signature = [stack, cephx, config_download_dir]
+    for name in CEPH_EXPORT_FILES:
+        try:
+            st = os.stat(os.path.join(config_download_dir, stack, name))
+        except OSError:
+            return None
+        signature.append([name, st.st_mtime_ns, st.st_size])
+    return signature
+
+
+def _ceph_export_cache_file(stack, working_dir):
+    if not working_dir or not os.path.isdir(working_dir):
+        return None
+    return os.path.join(
+        working_dir,
+        constants.WD_DEFAULT_CEPH_EXPORT_CACHE_FILE_NAME.format(stack))
+
+
+def _load_ceph_export_cache(cache_file, signature):
+    try:
+        with open(cache_file, 'r') as f:
+            cached = json.load(f)
+        if cached.get('signature') == signature:
+            return cached['ceph']
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+def _save_ceph_export_cache(cache_file, signature, ceph):
+    try:
+        with open(cache_file, 'w') as f:
+            json.dump({'signature': signature, 'ceph': ceph}, f)
+    except (IOError, OSError) as e:
+        LOG.warning('Unable to write Ceph export cache %s: %s',
+                    cache_file, e)
+
+
 def export_ceph(stack, cephx,
                 config_download_dir=constants.DEFAULT_WORK_DIR,
                 mon_ips=[]):
@@ -183,22 +279,17 @@ def export_ceph(stack, cephx,
     # Use ceph-ansible group_vars/all.yml to get remaining values
     ceph_ansible_all = "ceph-ansible/group_vars/all.yml"
     file = os.path.join(config_download_dir, stack, ceph_ansible_all)
-    with open(file, 'r') as ff:
-        try:
-            ceph_data = yaml.safe_load(ff)
-        except yaml.MarkedYAMLError as e:
-            LOG.error(
-                _('Could not read file %s') % file)
-            LOG.error(e)
+    ceph_data = _YamlDocument(file)
 
-    for key in ceph_data['keys']:
-        if key['name'] == 'client.' + str(cephx):
-            cephx_keys = [key]
+    for index in ceph_data.keys('keys'):
+        if ceph_data.get('keys', index, 'name') == 'client.' + str(cephx):
+            cephx_keys = [ceph_data.get('keys', index)]
 
+    cluster = ceph_data.get('cluster')
     ceph_conf_overrides = {}
     ceph_conf_overrides['client'] = {}
     ceph_conf_overrides['client']['keyring'] = '/etc/ceph/' \
-                                               + ceph_data['cluster'] \
+                                               + cluster \
                                                + '.client.' + cephx \
                                                + '.keyring'
     # Combine extracted data into one map to return
@@ -206,13 +297,73 @@ def export_ceph(stack, cephx,
     data['external_cluster_mon_ips'] = str(','.join(mon_ips))
     data['keys'] = cephx_keys
     data['ceph_conf_overrides'] = ceph_conf_overrides
-    data['cluster'] = ceph_data['cluster']
-    data['fsid'] = ceph_data['fsid']
+    data['cluster'] = cluster
+    data['fsid'] = ceph_data.get('fsid')
     data['dashboard_enabled'] = False
 
     return data
 
 
+def export_cephs(stacks, cephx, config_download_dirs,
+                 max_workers=constants.CEPH_EXPORT_WORKERS,
+                 working_dirs=None):
+    """Export the Ceph data of several stacks
+
+    The result of each stack is persisted in its working directory along
+    with the mtimes and sizes of the config-download files it was
+    extracted from. Stacks whose files did not change since then are
+    served from that cache, the others are parsed in parallel worker
+    processes.
+
+    :param stacks: stack names
+    :type stacks: list
+    :param cephx: name of the cephx client key to export
+    :type cephx: string
+    :param config_download_dirs: config-download directory of each stack
+    :type config_download_dirs: list
+    :param max_workers: maximum number of stacks parsed at once
+    :type max_workers: int
+    :param working_dirs: working directory of each stack holding the
+                         cache, caching is disabled when not set
+    :type working_dirs: list
+    :returns: list of export_ceph results, in the order of stacks
+    """
+    if not working_dirs:
+        working_dirs = [None] * len(stacks)
+    cephs = [None] * len(stacks)
+    pending = {}
+    for index, (stack, config_download_dir, working_dir) in enumerate(
+            zip(stacks, config_download_dirs, working_dirs)):
+        key = (stack, cephx, config_download_dir)
+        signature = _ceph_export_signature(*key)
+        cache_file = _ceph_export_cache_file(stack, working_dir)
+        cached = None
+        if signature is not None and cache_file:
+            cached = _load_ceph_export_cache(cache_file, signature)
+        if cached is not None:
+            LOG.debug('Using cached Ceph data of stack %s', stack)
+            cephs[index] = cached
+        else:
+            pending[index] = (key, signature, cache_file)
+
+    if len(pending) > 1 and max_workers > 1:
+        with futures.ProcessPoolExecutor(
+                max_workers=min(max_workers, len(pending))) as executor:
+            results = {
+                index: executor.submit(export_ceph, *item[0])
+                for index, item in pending.items()}
+            for index, future in results.items():
+                cephs[index] = future.result()
+    else:
+        for index, item in pending.items():
+            cephs[index] = export_ceph(*item[0])
+
+    for index, (key, signature, cache_file) in pending.items():
+        if signature is not None and cache_file:
+            _save_ceph_export_cache(cache_file, signature, cephs[index])
+    return cephs
+
+
 def export_overcloud(heat, stack, excludes, should_filter,
                      config_download_dir):
     data = export_passwords(heat, stack, excludes)
@@ -0,0 +1,297 @@
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+#
+
+"""Backends of the Ansible fact cache shared by tripleoclient playbooks"""
+
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from tripleoclient import constants
+
+LOG = logging.getLogger(__name__)
+
+# Directory holding the tripleo_sqlite Ansible cache plugin
+PLUGIN_DIR = os.path.join(os.path.dirname(__file__),
+                          'ansible_plugins', 'cache')
+
+
+class JsonFileFactCache(object):
+    """Ansible jsonfile cache, one JSON document per host
+
+    :param path: Directory of the cache
+    :type path: String
+
+    :param timeout: Seconds after which facts expire, 0 never expires them
+    :type timeout: Integer
+    """
+
+    plugin = 'jsonfile'
+
+    def __init__(self, path, timeout=constants.FACT_CACHE_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+
+    @property
+    def connection(self):
+        return self.path
+
+    def _entries(self):
+        """Host files of the cache, dot files are not hosts for Ansible"""
+        if not os.path.isdir(self.path):
+            return []
+        return [e for e in os.scandir(self.path)
+                if e.is_file() and not e.name.startswith('.')]
+
+    def close(self):
+        pass
+
+    def keys(self):
+        return [e.name for e in self._entries()]
+
+    def delete(self, host):
+        try:
+            os.unlink(os.path.join(self.path, host))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def prune(self):
+        """Remove the facts older than the timeout, return their count"""
+        if not self.timeout:
+            return 0
+        expiry = time.time() - self.timeout
+        pruned = 0
+        for entry in self._entries():
+            if entry.stat().st_mtime < expiry:
+                os.unlink(entry.path)
+                pruned += 1
+        return pruned
+
+
+class SqliteFactCache(object):
+    """Ansible facts indexed by host in a single SQLite database
+
+    Facts are stored as JSON text along with the time they were written,
+    so expiring them or dropping a host is a single indexed statement
+    instead of a walk over one file per host. The database lives in its
+    own subdirectory so that the jsonfile backend sharing the cache
+    directory never mistakes it for a host.
+
+    :param path: Directory of the cache
+    :type path: String
+
+    :param timeout: Seconds after which facts expire, 0 never expires them
+    :type timeout: Integer
+    """
+
+    plugin = 'tripleo_sqlite'
+
+    def __init__(self, path, timeout=constants.FACT_CACHE_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._db = None
+
+    @property
+    def connection(self):
+        return os.path.join(self.path, constants.FACT_CACHE_DB_DIR,
+                            constants.FACT_CACHE_DB_NAME)
+
+    def _connect(self):
+        if self._db is None:
+            db_dir = os.path.dirname(self.connection)
+            if not os.path.isdir(db_dir):
+                os.makedirs(db_dir)
+            self._db = sqlite3.connect(self.connection, timeout=30)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS facts ('
+                'host TEXT PRIMARY KEY, '
+                'updated REAL NOT NULL, '
+                'data TEXT NOT NULL)')
+            self._db.execute(
+                'CREATE INDEX IF NOT EXISTS facts_updated '
+                'ON facts (updated)')
+        return self._db
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        db = self._connect()
+        with db:
+            yield db
+
+    def _expiry(self):
+        if not self.timeout:
+            return 0
+        return time.time() - self.timeout
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _is_empty(self):
+        return self._db is None and not os.path.isfile(self.connection)
+
+    def get(self, host, loads=json.loads):
+        if self._is_empty():
+            raise KeyError(host)
+        row = self._connect().execute(
+            'SELECT data FROM facts WHERE host = ? AND updated >= ?',
+            (host, self._expiry())).fetchone()
+        if row is None:
+            raise KeyError(host)
+        return loads(row[0])
+
+    def set(self, host, facts, dumps=json.dumps, updated=None):
+        if updated is None:
+            updated = time.time()
+        with self._transaction() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO facts (host, updated, data) '
+                'VALUES (?, ?, ?)', (host, updated, dumps(facts)))
+
+    def keys(self):
+        if self._is_empty():
+            return []
+        return [row[0] for row in self._connect().execute(
+            'SELECT host FROM facts WHERE updated >= ? ORDER BY host',
+            (self._expiry(),))]
+
+    def contains(self, host):
+        if self._is_empty():
+            return False
+        return self._connect().execute(
+            'SELECT 1 FROM facts WHERE host = ? AND updated >= ?',
+            (host, self._expiry())).fetchone() is not None
+
+    def delete(self, host):
+        if self._is_empty():
+            return False
+        with self._transaction() as db:
+            return db.execute('DELETE FROM facts WHERE host = ?',
+                              (host,)).rowcount > 0
+
+    def flush(self):
+        with self._transaction() as db:
+            db.execute('DELETE FROM facts')
+
+    def prune(self):
+        """Remove the facts older than the timeout, return their count"""
+        if not self.timeout or self._is_empty():
+            return 0
+        with self._transaction() as db:
+            return db.execute('DELETE FROM facts WHERE updated < ?',
+                              (self._expiry(),)).rowcount
+
+    def migrate_jsonfile(self):
+        """Move the facts left by the jsonfile backend into the database
+
+        Valid facts keep their age, expired or unreadable ones are dropped.
+        Every host file is removed, so later calls have nothing to do.
+
+        :returns: Number of hosts whose facts were imported
+        """
+        legacy = JsonFileFactCache(self.path, timeout=self.timeout)
+        entries = legacy._entries()
+        if not entries:
+            return 0
+        expiry = self._expiry()
+        migrated = 0
+        for entry in entries:
+            updated = entry.stat().st_mtime
+            if updated >= expiry:
+                try:
+                    with open(entry.path) as f:
+                        facts = json.load(f)
+                except ValueError:
+                    LOG.debug('Dropping unreadable cached facts of %s',
+                              entry.name)
+                else:
+                    self.set(entry.name, facts, updated=updated)
+                    migrated += 1
+            legacy.delete(entry.name)
+        LOG.info('Moved the cached facts of %s hosts from %s to %s',
+                 migrated, self.path, self.connection)
+        return migrated
+
+
+BACKENDS = {
+    'jsonfile': JsonFileFactCache,
+    'sqlite': SqliteFactCache,
+}
+
+
+def get_fact_cache(backend=None, path=None, timeout=None):
+    """Return the fact cache used by tripleoclient playbooks
+
+    The backend and timeout default to the TRIPLEO_FACT_CACHE_BACKEND and
+    TRIPLEO_FACT_CACHE_TIMEOUT environment variables, then to the
+    constants of the same name.
+
+    :param backend: One of BACKENDS
+    :type backend: String
+
+    :param path: Directory of the cache, ~/.tripleo/fact_cache by default
+    :type path: String
+
+    :param timeout: Seconds after which facts expire, 0 never expires them
+    :type timeout: Integer
+
+    :returns: JsonFileFactCache or SqliteFactCache
+    """
+    if backend is None:
+        backend = os.environ.get('TRIPLEO_FACT_CACHE_BACKEND',
+                                 constants.FACT_CACHE_BACKEND)
+        if backend not in BACKENDS:
+            LOG.warning('Ignoring unknown fact cache backend %s', backend)
+            backend = constants.FACT_CACHE_BACKEND
+    elif backend not in BACKENDS:
+        raise ValueError('Unknown fact cache backend {}, expected one of '
+                         '{}'.format(backend, ', '.join(sorted(BACKENDS))))
+    if timeout is None:
+        timeout = os.environ.get('TRIPLEO_FACT_CACHE_TIMEOUT',
+                                 constants.FACT_CACHE_TIMEOUT)
+        try:
+            timeout = int(timeout)
+            if timeout < 0:
+                raise ValueError(timeout)
+        except ValueError:
+            LOG.warning('Ignoring invalid fact cache timeout %s', timeout)
+            timeout = constants.FACT_CACHE_TIMEOUT
+    if path is None:
+        path = os.path.join(os.path.expanduser('~'), '.tripleo',
+                            'fact_cache')
+    return BACKENDS[backend](path, timeout=timeout)
+
+
+def evict_hosts(hosts, cache=None):
+    """Drop the cached facts of hosts, typically after deleting nodes
+
+    :param hosts: Inventory names of the hosts
+    :type hosts: List
+
+    :param cache: Fact cache, get_fact_cache() by default
+
+    :returns: Number of hosts whose facts were dropped
+    """
+    if cache is None:
+        cache = get_fact_cache()
+        with contextlib.closing(cache):
+            return evict_hosts(hosts, cache=cache)
+    evicted = sum(1 for host in hosts if cache.delete(host))
+    LOG.debug('Evicted cached facts of %s hosts', evicted)
+    return evicted
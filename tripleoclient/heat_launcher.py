@@ -16,9 +16,13 @@
 import configparser
 import datetime
 import glob
+import bz2
 import grp
+import gzip
+import hashlib
 import json
 import logging
+import lzma
 import multiprocessing
 import os
 import pwd
@@ -27,6 +31,7 @@ import signal
 import subprocess
 import tarfile
 import tempfile
+import threading
 import time
 
 import jinja2
@@ -41,11 +46,57 @@ from tripleoclient.constants import (DEFAULT_HEAT_CONTAINER,
                                      DEFAULT_EPHEMERAL_HEAT_API_CONTAINER,
                                      DEFAULT_EPHEMERAL_HEAT_ENGINE_CONTAINER,
                                      DEFAULT_TEMPLATES_DIR,
+                                     EPHEMERAL_HEAT_DB_BACKUP_KEEP,
+                                     EPHEMERAL_HEAT_LOG_CODEC,
+                                     EPHEMERAL_HEAT_LOG_MAX_SIZE_MB,
                                      EPHEMERAL_HEAT_POD_NAME)
 from tripleoclient.exceptions import HeatPodMessageQueueException
 
 log = logging.getLogger(__name__)
 
+# Streaming compressors for the heat db backups, in order of preference, as
+# (suffix, compress command, decompress command). gzip is always available.
+DB_BACKUP_CODECS = [
+    ('.zst', ['zstd', '-q', '-T0', '-c'], ['zstd', '-q', '-d', '-c']),
+    ('.gz', ['pigz', '-c'], ['pigz', '-d', '-c']),
+    ('.gz', ['gzip', '-c'], ['gzip', '-d', '-c']),
+]
+
+# Statements creating the heat database and user in the mysql container
+HEAT_DB_BOOTSTRAP_SQL = [
+    'create database if not exists heat',
+    "create user if not exists 'heat'@'%' identified by 'heat'",
+    "grant all privileges on heat.* to 'heat'@'%'",
+    'flush privileges',
+]
+
+# Hiera keys read when configuring the heat pod, looked up together
+HIERA_KEYS = [
+    'rabbitmq::default_user',
+    'rabbitmq::default_pass',
+    'fqdn_ctlplane',
+    'rabbitmq::port',
+    'controller_virtual_ip',
+    'ctlplane',
+]
+
+# Ephemeral Heat settings which can be tuned, see get_heat_tuning
+HEAT_TUNING_KEYS = (
+    'num_engine_workers',
+    'max_resources_per_stack',
+    'executor_thread_pool_size',
+    'rpc_response_timeout',
+    'db_max_pool_size',
+    'db_max_overflow',
+)
+
+# Log compression codecs as (file opener, tarfile mode)
+LOG_CODECS = {
+    'gz': (gzip.open, 'w:gz'),
+    'bz2': (bz2.open, 'w:bz2'),
+    'xz': (lzma.open, 'w:xz'),
+}
+
 NEXT_DAY = (timeutils.utcnow() + datetime.timedelta(days=2)).isoformat()
 
 FAKE_TOKEN_RESPONSE = {
@@ -126,6 +177,151 @@ FAKE_TOKEN_RESPONSE = {
 }
 
 
+def _host_memory_mb():
+    try:
+        return (os.sysconf('SC_PAGE_SIZE') *
+                os.sysconf('SC_PHYS_PAGES')) // (1024 * 1024)
+    except (ValueError, OSError):
+        return 0
+
+
+def get_heat_tuning(overrides=None, cpu_count=None, memory_mb=None):
+    """Return the tuning profile of the ephemeral Heat configuration
+
+    Engine workers follow the host CPUs, bounded by the host memory (about
+    512MB per worker). The RPC thread pool, RPC timeout and database pool
+    grow with the number of overcloud nodes, given as the node_count
+    override, as the number of nested stacks does.
+
+    :param overrides: node_count and values of HEAT_TUNING_KEYS replacing
+                      the derived ones.
+    :type overrides: dict
+    :returns: dict of HEAT_TUNING_KEYS
+    """
+    overrides = dict(overrides or {})
+    node_count = int(overrides.pop('node_count', 0) or 0)
+    unknown = set(overrides) - set(HEAT_TUNING_KEYS)
+    if unknown:
+        raise ValueError('Unknown heat tuning settings: {}'.format(
+            ', '.join(sorted(unknown))))
+    cpu_count = cpu_count or multiprocessing.cpu_count()
+    if memory_mb is None:
+        memory_mb = _host_memory_mb()
+    workers = int(cpu_count / 2)
+    if memory_mb:
+        workers = min(workers, memory_mb // 512)
+
+    tuning = {
+        'num_engine_workers': max(workers, 1),
+        'max_resources_per_stack': -1,
+        'executor_thread_pool_size': min(max(64, 2 * node_count), 256),
+        'rpc_response_timeout': min(600 + 5 * node_count, 3600),
+        'db_max_pool_size': min(max(5, node_count // 10), 50),
+        'db_max_overflow': min(max(50, node_count // 2), 200),
+    }
+    tuning.update((key, int(value)) for key, value in overrides.items())
+    return tuning
+
+
+class HeatLogCompressor(object):
+    """Rotate and compress a Heat log in the background
+
+    Every Heat process writes the same log file through a
+    WatchedFileHandler, so Heat itself must not rotate it. Once the log
+    reaches max_size_mb it is renamed to <log>.rotated-<ns>, a name Heat
+    never writes to, and the Heat processes reopen a new log on their
+    next write. A rotated segment is streamed into <log>-<ns>.<codec> in
+    fixed size chunks and removed once it was left alone for a full
+    interval, so teardown only has to deal with the current segment.
+    """
+
+    ROTATED_SUFFIX = '.rotated-'
+
+    def __init__(self, log_file_path, codec=EPHEMERAL_HEAT_LOG_CODEC,
+                 interval=30, max_size_mb=EPHEMERAL_HEAT_LOG_MAX_SIZE_MB):
+        if codec not in LOG_CODECS:
+            raise ValueError('Unsupported log codec %s' % codec)
+        self.log_file_path = log_file_path
+        self.codec = codec
+        self.interval = interval
+        self.max_size = (max_size_mb or 0) * 1024 * 1024
+        self._stop = threading.Event()
+        self._thread = None
+
+    def rotate(self):
+        """Rename the log when it reached the maximum size"""
+        try:
+            size = os.path.getsize(self.log_file_path)
+        except FileNotFoundError:
+            return None
+        if not self.max_size or size < self.max_size:
+            return None
+        rotated = '{}{}{}'.format(self.log_file_path, self.ROTATED_SUFFIX,
+                                  time.time_ns())
+        os.rename(self.log_file_path, rotated)
+        log.debug("Rotated {} to {}".format(self.log_file_path, rotated))
+        return rotated
+
+    def _segments(self, settle=0):
+        segments = []
+        now = time.time()
+        prefix = self.log_file_path + self.ROTATED_SUFFIX
+        for path in glob.glob(prefix + '*'):
+            stamp = path[len(prefix):]
+            # Heat may still flush a few lines into a segment it had
+            # opened before the rename, wait for it to settle.
+            if stamp.isdigit() and now - os.path.getmtime(path) >= settle:
+                segments.append((int(stamp), path))
+        return [path for stamp, path in sorted(segments)]
+
+    def compress(self, path, cleanup=True):
+        """Stream path into a compressed file and return its name"""
+        opener = LOG_CODECS[self.codec][0]
+        stamp = path.rsplit(self.ROTATED_SUFFIX, 1)[-1]
+        target = '{}-{}.{}'.format(self.log_file_path, stamp, self.codec)
+        with open(path, 'rb') as src:
+            with opener(target + '.tmp', 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.rename(target + '.tmp', target)
+        if cleanup:
+            os.unlink(path)
+        log.debug("Compressed {} into {}".format(path, target))
+        return target
+
+    def compress_rotated(self, settle=0):
+        """Compress the rotated segments left alone for settle seconds"""
+        return [self.compress(path) for path in self._segments(settle)]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.compress_rotated(settle=self.interval)
+                self.rotate()
+            except Exception as e:
+                log.warning("Failed to rotate heat log segments: %s", e)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='heat-log-compressor',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and compress what is left
+
+        Heat must be stopped first, the remaining rotated segments are
+        compressed without waiting for them to settle.
+        """
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return self.compress_rotated()
+
+
 class HeatBaseLauncher(object):
 
     # The init function will need permission to touch these files
@@ -139,7 +335,10 @@ class HeatBaseLauncher(object):
                  use_tmp_dir=True,
                  use_root=False,
                  rm_heat=False,
-                 skip_heat_pull=False):
+                 skip_heat_pull=False,
+                 log_codec=EPHEMERAL_HEAT_LOG_CODEC,
+                 log_max_size_mb=EPHEMERAL_HEAT_LOG_MAX_SIZE_MB,
+                 tuning=None):
         self.api_port = api_port
         self.all_container_image = all_container_image
         self.api_container_image = api_container_image
@@ -151,6 +350,10 @@ class HeatBaseLauncher(object):
         self.skip_heat_pull = skip_heat_pull
         self.zipped_db_suffix = '.tar.bzip2'
         self.log_dir = os.path.join(self.heat_dir, 'log')
+        self.log_codec = log_codec
+        self.log_max_size_mb = log_max_size_mb
+        self.log_compressor = None
+        self.tuning = tuning or {}
         self.use_tmp_dir = use_tmp_dir
 
         if not os.path.isdir(self.heat_dir):
@@ -315,20 +518,49 @@ heat.filter_factory = heat.api.openstack:faultwrap_filter
     def check_message_bus(self):
         return True
 
-    def tar_file(self, file_path, cleanup=True):
-        tf_name = '{}-{}{}'.format(file_path, self.timestamp,
-                                   self.zipped_db_suffix)
-        tf = tarfile.open(tf_name, 'w:bz2')
-        tf.add(file_path, os.path.basename(file_path))
-        tf.close()
+    def tar_file(self, file_path, cleanup=True, codec='bz2'):
+        if codec == 'bz2':
+            suffix = self.zipped_db_suffix
+        else:
+            suffix = '.tar.' + codec
+        tf_name = '{}-{}{}'.format(file_path, self.timestamp, suffix)
+        # tarfile streams the member in blocks, memory use is bounded
+        # whatever the size of the file.
+        with tarfile.open(tf_name, LOG_CODECS[codec][1]) as tf:
+            tf.add(file_path, os.path.basename(file_path))
         log.info("Created tarfile {}".format(tf_name))
         if cleanup:
             log.info("Deleting {}".format(file_path))
             os.unlink(file_path)
+        return tf_name
 
     def untar_file(self, tar_path, extract_dir):
-        tf = tarfile.open(tar_path, 'r:bz2')
-        tf.extractall(extract_dir)
+        with tarfile.open(tar_path, 'r:*') as tf:
+            tf.extractall(extract_dir)
+
+    def start_log_compressor(self, log_file_path):
+        """Compress the rotated segments of log_file_path while Heat runs"""
+        if not self.log_max_size_mb:
+            return
+        self.log_compressor = HeatLogCompressor(
+            log_file_path, codec=self.log_codec,
+            max_size_mb=self.log_max_size_mb)
+        self.log_compressor.start()
+
+    def finalize_log(self, log_file_path):
+        """Compress the remaining segments of a Heat log at teardown"""
+        compressor = self.log_compressor
+        if compressor is None or \
+                compressor.log_file_path != log_file_path:
+            compressor = HeatLogCompressor(log_file_path,
+                                           codec=self.log_codec)
+        start = time.monotonic()
+        compressor.stop()
+        self.log_compressor = None
+        if os.path.exists(log_file_path):
+            self.tar_file(log_file_path, codec=self.log_codec)
+        log.info("Finalized heat log {} in {:.2f} seconds".format(
+            log_file_path, time.monotonic() - start))
 
 
 class HeatContainerLauncher(HeatBaseLauncher):
@@ -457,10 +689,12 @@ class HeatPodLauncher(HeatContainerLauncher):
     heat_type = 'pod'
 
     def __init__(self, *args, **kwargs):
+        self._hiera_values = {}
         super(HeatPodLauncher, self).__init__(*args, **kwargs)
         if not os.path.isdir(self.log_dir):
             os.makedirs(self.log_dir)
         self.host = "127.0.0.1"
+        self.db_backup_keep = EPHEMERAL_HEAT_DB_BACKUP_KEEP
         self._chcon()
 
     def _chcon(self):
@@ -513,28 +747,15 @@ class HeatPodLauncher(HeatContainerLauncher):
             'sudo', 'podman', 'play', 'kube',
             os.path.join(self.heat_dir, 'heat-pod.yaml')
         ])
+        self.start_log_compressor(os.path.join(self.log_dir, self.log_file))
 
     def heat_db_sync(self, restore_db=False):
-        if not self.database_exists():
-            subprocess.check_call([
-                'sudo', 'podman', 'exec', '-u', 'root',
-                'mysql', 'mysql', '-e', 'create database heat'
-            ])
-            subprocess.check_call([
-                'sudo', 'podman', 'exec', '-u', 'root',
-                'mysql', 'mysql', '-e',
-                'create user if not exists '
-                '\'heat\'@\'%\' identified by \'heat\''
-            ])
-            subprocess.check_call([
-                'sudo', 'podman', 'exec', '-u', 'root',
-                'mysql', 'mysql', 'heat', '-e',
-                'grant all privileges on heat.* to \'heat\'@\'%\''
-            ])
-            subprocess.check_call([
-                'sudo', 'podman', 'exec', '-u', 'root',
-                'mysql', 'mysql', '-e', 'flush privileges;'
-            ])
+        # All the statements are idempotent, so they are sent in a single
+        # exec without checking whether the database exists first.
+        subprocess.check_call([
+            'sudo', 'podman', 'exec', '-u', 'root',
+            'mysql', 'mysql', '-e', '; '.join(HEAT_DB_BOOTSTRAP_SQL)
+        ])
         cmd = [
             'sudo', 'podman', 'run', '--rm',
             '--user', 'heat',
@@ -549,20 +770,82 @@ class HeatPodLauncher(HeatContainerLauncher):
         if restore_db:
             self.do_restore_db()
 
+    def _db_backups(self):
+        suffixes = set([self.zipped_db_suffix] +
+                       [codec[0] for codec in DB_BACKUP_CODECS])
+        db_backups = set()
+        for suffix in suffixes:
+            db_backups.update(glob.glob('{}-*{}'.format(self.db_dump_path,
+                                                        suffix)))
+        return list(db_backups)
+
+    def _is_streamed_db_backup(self, path):
+        return path.endswith(tuple(codec[0] for codec in DB_BACKUP_CODECS))
+
+    def _db_backup_codec(self, path=None):
+        for suffix, compress, decompress in DB_BACKUP_CODECS:
+            if path and not path.endswith(suffix):
+                continue
+            if shutil.which(compress[0]):
+                return suffix, compress, decompress
+        raise Exception('No compressor available for %s' % (path or 'backup'))
+
+    def _file_checksum(self, path):
+        checksum = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                checksum.update(chunk)
+        return checksum.hexdigest()
+
+    def _verify_db_backup(self, db_backup):
+        checksum_file = db_backup + '.sha256'
+        if not os.path.exists(checksum_file):
+            log.warning("No checksum found for %s", db_backup)
+            return
+        with open(checksum_file) as f:
+            expected = f.read().split()[0]
+        if self._file_checksum(db_backup) != expected:
+            raise Exception('Checksum mismatch for db backup %s' % db_backup)
+
+    def _prune_db_backups(self):
+        db_backups = sorted(self._db_backups(), key=os.path.getmtime)
+        for db_backup in db_backups[:-max(self.db_backup_keep, 1)]:
+            log.info("Deleting old db backup {}".format(db_backup))
+            for path in db_backup, db_backup + '.sha256':
+                if os.path.exists(path):
+                    os.unlink(path)
+
+    def _restore_db_stream(self, db_backup):
+        self._verify_db_backup(db_backup)
+        _suffix, _compress, decompress = self._db_backup_codec(db_backup)
+        reader = subprocess.Popen(decompress + [db_backup],
+                                  stdout=subprocess.PIPE)
+        try:
+            subprocess.run([
+                'sudo', 'podman', 'exec', '-i', '-u', 'root',
+                'mysql', 'mysql', 'heat'], stdin=reader.stdout,
+                check=True)
+        finally:
+            reader.stdout.close()
+            if reader.wait():
+                raise subprocess.CalledProcessError(reader.returncode,
+                                                    decompress)
+
     def do_restore_db(self, db_dump_path=None):
         if not db_dump_path:
             db_dump_path = self.db_dump_path
             # Find the latest dump from self.heat_dir
-            db_dumps = glob.glob(
-                '{}-*{}'.format
-                (db_dump_path,
-                 self.zipped_db_suffix))
+            db_dumps = self._db_backups()
             if not db_dumps:
                 raise Exception('No db backups found to restore in %s' %
                                 self.heat_dir)
             db_dump = max(db_dumps, key=os.path.getmtime)
-            self.untar_file(db_dump, self.heat_dir)
             log.info("Restoring db from {}".format(db_dump))
+            if self._is_streamed_db_backup(db_dump):
+                # Compressed dumps are streamed straight into mysql
+                self._restore_db_stream(db_dump)
+                return
+            self.untar_file(db_dump, self.heat_dir)
         try:
             with open(db_dump_path) as f:
                 subprocess.run([
@@ -575,17 +858,45 @@ class HeatPodLauncher(HeatContainerLauncher):
     def do_backup_db(self, db_dump_path=None):
         if not db_dump_path:
             db_dump_path = self.db_dump_path
-        if os.path.exists(db_dump_path):
+        suffix, compress, _decompress = self._db_backup_codec()
+        db_backup = '{}-{}{}'.format(db_dump_path, self.timestamp, suffix)
+        if os.path.exists(db_backup):
             raise Exception("Won't overwrite existing db dump at %s. "
-                            "Remove it first." % db_dump_path)
+                            "Remove it first." % db_backup)
         log.info("Starting back up of heat db")
-        with open(db_dump_path, 'w') as out:
-            subprocess.run([
-                'sudo', 'podman', 'exec', '-u', 'root',
-                'mysql', 'mysqldump', 'heat'], stdout=out,
-                check=True)
-
-        self.tar_file(db_dump_path)
+        # mysqldump is piped through the compressor and the compressed
+        # stream is checksummed while written, no plain dump hits the disk.
+        dump = subprocess.Popen([
+            'sudo', 'podman', 'exec', '-u', 'root',
+            'mysql', 'mysqldump', 'heat'], stdout=subprocess.PIPE)
+        writer = subprocess.Popen(compress, stdin=dump.stdout,
+                                  stdout=subprocess.PIPE)
+        dump.stdout.close()
+        checksum = hashlib.sha256()
+        tmp_backup = db_backup + '.tmp'
+        try:
+            with open(tmp_backup, 'wb') as out:
+                for chunk in iter(lambda: writer.stdout.read(1024 * 1024),
+                                  b''):
+                    checksum.update(chunk)
+                    out.write(chunk)
+            for proc, cmd in ((dump, 'mysqldump'), (writer, compress[0])):
+                if proc.wait():
+                    raise subprocess.CalledProcessError(proc.returncode, cmd)
+            os.rename(tmp_backup, db_backup)
+        finally:
+            writer.stdout.close()
+            for proc in dump, writer:
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+            if os.path.exists(tmp_backup):
+                os.unlink(tmp_backup)
+        with open(db_backup + '.sha256', 'w') as f:
+            f.write('{}  {}\n'.format(checksum.hexdigest(),
+                                      os.path.basename(db_backup)))
+        log.info("Created db backup {}".format(db_backup))
+        self._prune_db_backups()
 
     def pod_exists(self):
         try:
@@ -621,8 +932,7 @@ class HeatPodLauncher(HeatContainerLauncher):
         config = self._read_heat_config()
         log_file_path = os.path.join(self.log_dir,
                                      config['DEFAULT']['log_file'])
-        if os.path.exists(log_file_path):
-            self.tar_file(log_file_path)
+        self.finalize_log(log_file_path)
 
     def stop_heat(self):
         if self.pod_exists() and self.get_pod_state() != 'Exited':
@@ -689,15 +999,28 @@ class HeatPodLauncher(HeatContainerLauncher):
             decoded = decoded[:-1]
         return decoded
 
+    def _get_hiera(self, key):
+        if key not in self._hiera_values:
+            # The hiera CLI resolves a single key per run, so run all the
+            # lookups under one sudo and separate the values with NULs.
+            # set -e makes a failed lookup fail the whole call.
+            keys = HIERA_KEYS if key in HIERA_KEYS else [key]
+            output = subprocess.check_output(
+                ['sudo', 'sh', '-c',
+                 'set -e; for key in "$@"; do hiera "$key"; '
+                 'printf "\\0"; done',
+                 'hiera'] + keys)
+            values = output.split(b'\0')
+            for index, k in enumerate(keys):
+                self._hiera_values[k] = self._decode(
+                    values[index] if index < len(values) else b'')
+        return self._hiera_values[key]
+
     def _get_transport_url(self):
-        user = self._decode(subprocess.check_output(
-            ['sudo', 'hiera', 'rabbitmq::default_user']))
-        password = self._decode(subprocess.check_output(
-            ['sudo', 'hiera', 'rabbitmq::default_pass']))
-        fqdn_ctlplane = self._decode(subprocess.check_output(
-            ['sudo', 'hiera', 'fqdn_ctlplane']))
-        port = self._decode(subprocess.check_output(
-            ['sudo', 'hiera', 'rabbitmq::port']))
+        user = self._get_hiera('rabbitmq::default_user')
+        password = self._get_hiera('rabbitmq::default_pass')
+        fqdn_ctlplane = self._get_hiera('fqdn_ctlplane')
+        port = self._get_hiera('rabbitmq::port')
 
         transport_url = "rabbit://%s:%s@%s:%s/?ssl=0" % \
             (user, password, fqdn_ctlplane, port)
@@ -710,15 +1033,16 @@ class HeatPodLauncher(HeatContainerLauncher):
                     self._get_ctlplane_vip()))
 
     def _get_ctlplane_vip(self):
-        return self._decode(subprocess.check_output(
-            ['sudo', 'hiera', 'controller_virtual_ip']))
+        return self._get_hiera('controller_virtual_ip')
 
     def _get_ctlplane_ip(self):
-        return self._decode(subprocess.check_output(
-            ['sudo', 'hiera', 'ctlplane']))
+        return self._get_hiera('ctlplane')
+
+    def _get_heat_tuning(self):
+        return get_heat_tuning(self.tuning)
 
     def _get_num_engine_workers(self):
-        return int(multiprocessing.cpu_count() / 2)
+        return self._get_heat_tuning()['num_engine_workers']
 
     @retry(retry=retry_if_exception_type(HeatPodMessageQueueException),
            reraise=True,
@@ -748,13 +1072,16 @@ class HeatPodLauncher(HeatContainerLauncher):
         with open(heat_config_tmpl_path) as tmpl:
             heat_config_tmpl = jinja2.Template(tmpl.read())
 
-        config_vars = {
+        config_vars = self._get_heat_tuning()
+        log.info("Ephemeral heat tuning: %s", ', '.join(
+            '{}={}'.format(k, v) for k, v in sorted(config_vars.items())))
+        config_vars.update({
             "transport_url": self._get_transport_url(),
             "db_connection": self._get_db_connection(),
             "api_port": self.api_port,
             "num_engine_workers": self._get_num_engine_workers(),
             "log_file": self.log_file,
-        }
+        })
         heat_config = heat_config_tmpl.render(**config_vars)
 
         with open(self.config_file, 'w') as conf:
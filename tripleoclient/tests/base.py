@@ -22,6 +22,7 @@ import fixtures
 import testtools
 
 from tripleoclient.tests import fakes
+from tripleoclient import utils
 
 _TRUE_VALUES = ('true', '1', 'yes')
 
@@ -55,6 +56,9 @@ class TestCase(testtools.TestCase):
 
         self.log_fixture = self.useFixture(fixtures.FakeLogger())
 
+        utils.clear_sdk_connections()
+        self.addCleanup(utils.clear_sdk_connections)
+
 
 class TestCommand(TestCase):
     """Test command classes"""
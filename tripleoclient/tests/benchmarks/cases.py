@@ -0,0 +1,196 @@
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+#
+
+"""The benchmarked code paths
+
+Each case takes the scale and a scratch directory, builds its fixtures
+and returns the callable to time. Fixture sizes are given for scale 1.
+"""
+
+import collections
+import contextlib
+import functools
+import io
+import os
+from unittest import mock
+
+from oslo_config import cfg
+
+from tripleoclient import heat_launcher
+from tripleoclient.tests.benchmarks import fakes
+from tripleoclient import utils
+from tripleoclient.v1 import overcloud_netenv_validate
+from tripleoclient.v2 import tripleo_container_image
+from tripleoclient.workflows import parameters
+
+CASES = collections.OrderedDict()
+
+
+def case(name):
+    def decorator(func):
+        CASES[name] = func
+        return func
+    return decorator
+
+
+def scaled(count, scale):
+    return max(1, int(count * scale))
+
+
+@case('utils.process_multiple_environments')
+def process_multiple_environments(scale, tmpdir):
+    tht_root = os.path.join(tmpdir, 'tht')
+    env_files = fakes.make_environments(tht_root, scaled(300, scale))
+
+    def run():
+        return utils.process_multiple_environments(
+            env_files, tht_root, tht_root, env_files_tracker=[])
+    return run
+
+
+@case('utils.replace_links_in_template')
+def replace_links_in_template(scale, tmpdir):
+    template = fakes.make_heat_template(scaled(5000, scale))
+    links = {'templates/resource-%d.yaml' % i: '/tht/resource-%d.yaml' % i
+             for i in range(50)}
+    links.update({'templates/script-%d.sh' % i: '/tht/script-%d.sh' % i
+                  for i in range(50)})
+
+    def run():
+        return utils.replace_links_in_template(template, links)
+    return run
+
+
+@case('utils.get_roles_data')
+def get_roles_data(scale, tmpdir):
+    fakes.write_yaml(utils.get_roles_file_path(tmpdir, 'overcloud'),
+                     fakes.make_roles_data(scaled(200, scale)))
+
+    def run():
+        return utils.get_roles_data(tmpdir, 'overcloud')
+    return run
+
+
+@case('utils.assign_and_verify_profiles')
+def assign_and_verify_profiles(scale, tmpdir):
+    profiles = ['control', 'compute', 'ceph-storage', 'block-storage',
+                'swift-storage', 'networker']
+    count = scaled(3000, scale)
+    flavors = {p: (fakes.FakeFlavor(p, p), count // (len(profiles) * 2))
+               for p in profiles}
+
+    # nodes are left untouched by a dry run, share them between runs
+    client = fakes.FakeBaremetalClient(
+        fakes.make_baremetal_nodes(count, profiles))
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return utils.assign_and_verify_profiles(
+                client, flavors, assign_profiles=True, dry_run=True)
+    return run
+
+
+@case('undercloud_config._calculate_allocation_pools')
+def calculate_allocation_pools(scale, tmpdir):
+    # imported here, the undercloud modules pull the undercloud only
+    # dependencies like netifaces
+    from tripleoclient.v1 import undercloud_config
+
+    subnet = fakes.make_ctlplane_subnet(scaled(2000, scale))
+
+    def run():
+        with _undercloud_conf():
+            return undercloud_config._calculate_allocation_pools(subnet)
+    return run
+
+
+@contextlib.contextmanager
+def _undercloud_conf():
+    conf = cfg.CONF
+    overrides = {'local_ip': '172.20.0.4/16',
+                 'undercloud_admin_host': '172.20.0.5',
+                 'undercloud_public_host': '172.20.0.6'}
+    for key, value in overrides.items():
+        conf.set_override(key, value)
+    try:
+        yield conf
+    finally:
+        for key in overrides:
+            conf.clear_override(key)
+
+
+@case('overcloud_netenv_validate.overlap_checks')
+def netenv_overlap_checks(scale, tmpdir):
+    params = fakes.make_network_environment(scaled(400, scale))
+    pools = {k: v for k, v in params.items()
+             if k.endswith('AllocationPools')}
+    cidrs = [v for k, v in params.items() if k.endswith('NetCidr')]
+    cmd = overcloud_netenv_validate.ValidateOvercloudNetenv(
+        mock.Mock(), mock.Mock())
+
+    def run():
+        cmd.error_count = 0
+        cmd.check_cidr_overlap(cidrs)
+        cmd.check_allocation_pools_pairing(params, pools)
+        return cmd.error_count
+    return run
+
+
+@case('tripleo_container_image.Build.find_image')
+def container_image_find_image(scale, tmpdir):
+    root = os.path.join(tmpdir, 'tcib')
+    names = fakes.make_container_images(root, scaled(400, scale))
+    lookups = names[::max(1, len(names) // 20)]
+    cmd = tripleo_container_image.Build(mock.Mock(), mock.Mock())
+    cmd.image_parents = collections.OrderedDict()
+
+    def run():
+        return [cmd.find_image(name, root, 'base') for name in lookups]
+    return run
+
+
+@case('parameters._analyze_parameters')
+def analyze_parameters(scale, tmpdir):
+    stack_data, role_list = fakes.make_parameter_tree(
+        scaled(50, scale), scaled(500, scale), scaled(5000, scale))
+
+    def run():
+        return parameters._analyze_parameters(stack_data, role_list)
+    return run
+
+
+def finalize_heat_log(scale, tmpdir, codec):
+    """Compress two rotated segments and archive the current Heat log"""
+    launcher = heat_launcher.HeatBaseLauncher(
+        heat_dir=os.path.join(tmpdir, 'heat'), use_tmp_dir=False,
+        log_codec=codec)
+    log_file = launcher.log_file
+    segments = [log_file + heat_launcher.HeatLogCompressor.ROTATED_SUFFIX +
+                str(stamp) for stamp in (1, 2)] + [log_file]
+    sources = []
+    for i, segment in enumerate(segments):
+        source = os.path.join(tmpdir, 'heat-%d.log' % i)
+        fakes.make_heat_log(source, scaled(100, scale))
+        sources.append((source, segment))
+
+    def run():
+        # finalize_log removes the logs, hard links keep the fixtures
+        for source, segment in sources:
+            os.link(source, segment)
+        return launcher.finalize_log(log_file)
+    return run
+
+
+for _codec in sorted(heat_launcher.LOG_CODECS):
+    case('heat_launcher.finalize_log[%s]' % _codec)(
+        functools.partial(finalize_heat_log, codec=_codec))
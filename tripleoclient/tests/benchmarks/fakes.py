@@ -0,0 +1,279 @@
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+#
+
+"""Synthetic fixtures and in memory clients used by the benchmarks"""
+
+import os
+
+import yaml
+
+
+class FakeBaremetalNode(object):
+    def __init__(self, uuid, provision_state='available', capabilities=''):
+        self.uuid = uuid
+        self.provision_state = provision_state
+        self.properties = {'capabilities': capabilities}
+
+
+class FakeBaremetalNodeManager(object):
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.updates = 0
+
+    def list(self, maintenance=None, detail=False):
+        return list(self.nodes)
+
+    def update(self, uuid, patch):
+        self.updates += 1
+
+
+class FakeBaremetalClient(object):
+    """Ironic client returning a fixed list of nodes"""
+
+    def __init__(self, nodes):
+        self.node = FakeBaremetalNodeManager(nodes)
+
+
+class FakeFlavor(object):
+    def __init__(self, name, profile):
+        self.name = name
+        self.profile = profile
+
+    def get_keys(self):
+        return {'capabilities:profile': self.profile}
+
+
+def make_baremetal_nodes(count, profiles):
+    """Return count nodes, a third tagged with a profile, the rest only
+    declaring a <profile>_profile capability or active
+    """
+    nodes = []
+    for i in range(count):
+        profile = profiles[i % len(profiles)]
+        if i % 3 == 0:
+            caps = 'profile:%s,boot_option:local' % profile
+        else:
+            caps = '%s_profile:true,boot_option:local,cpu_vt:true' % profile
+        state = 'active' if i % 7 == 0 else 'available'
+        nodes.append(FakeBaremetalNode('node-%05d' % i, state, caps))
+    return nodes
+
+
+def write_yaml(path, data):
+    dirname = os.path.dirname(path)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    with open(path, 'w') as f:
+        yaml.safe_dump(data, f, default_flow_style=False)
+    return path
+
+
+def make_heat_template(resources, path_prefix='templates'):
+    """Return a Heat template with get_file and type links in each
+    resource
+    """
+    template = {'heat_template_version': 'wallaby',
+                'parameters': {'ServiceNetMap': {'type': 'json'}},
+                'resources': {}}
+    for i in range(resources):
+        template['resources']['Resource%d' % i] = {
+            'type': '%s/resource-%d.yaml' % (path_prefix, i % 50),
+            'properties': {
+                'config': {'get_file': '%s/script-%d.sh'
+                           % (path_prefix, i % 50)},
+                'nested': [{'get_file': '%s/data-%d.json'
+                            % (path_prefix, i % 20)},
+                           {'list_join': [',', ['a', 'b', {
+                               'get_param': 'ServiceNetMap'}]]}],
+            },
+        }
+    return template
+
+
+def make_environments(tht_root, count, resources_per_env=5):
+    """Write count environments in tht_root registering nested templates,
+    return their paths
+    """
+    template = {'heat_template_version': 'wallaby',
+                'resources': {'Config': {
+                    'type': 'OS::Heat::SoftwareConfig',
+                    'properties': {'config': {'get_file': 'script.sh'}}}}}
+    templates = []
+    for i in range(resources_per_env * 4):
+        path = os.path.join(tht_root, 'deployment', 'service-%d' % i,
+                            'service.yaml')
+        write_yaml(path, template)
+        with open(os.path.join(os.path.dirname(path), 'script.sh'),
+                  'w') as f:
+            f.write('#!/bin/sh\necho service %d\n' % i)
+        templates.append(path)
+
+    env_files = []
+    for i in range(count):
+        registry = {}
+        for j in range(resources_per_env):
+            registry['OS::TripleO::Services::Service%d_%d' % (i, j)] = \
+                os.path.relpath(templates[(i + j) % len(templates)],
+                                os.path.join(tht_root, 'environments'))
+        registry['OS::TripleO::Services::Noop%d' % i] = 'OS::Heat::None'
+        env = {
+            'resource_registry': registry,
+            'parameter_defaults': {
+                'Param%d' % i: 'value',
+                'NestedParam': {'key%d' % i: {'a': i, 'b': [i, i + 1]}},
+                'ControllerExtraConfig': {'hiera::key%d' % i: i},
+            },
+        }
+        env_files.append(write_yaml(
+            os.path.join(tht_root, 'environments', 'env-%d.yaml' % i), env))
+    return env_files
+
+
+def make_roles_data(count):
+    """Return count roles with a realistic list of services"""
+    services = ['OS::TripleO::Services::Service%d' % i for i in range(120)]
+    return [{'name': 'Role%d' % i,
+             'description': 'Synthetic role %d' % i,
+             'CountDefault': 1,
+             'tags': ['primary'] if i == 0 else [],
+             'networks': {'InternalApi': {'subnet': 'internal_api_subnet'},
+                          'Storage': {'subnet': 'storage_subnet'}},
+             'HostnameFormatDefault': '%%stackname%%-role%d-%%index%%' % i,
+             'ServicesDefault': services}
+            for i in range(count)]
+
+
+def make_parameter_tree(roles, params_per_role, resources):
+    """Return the stack data of a deployment and its role names
+
+    Every role has params_per_role parameters set by the user, one unused
+    parameter and one role specific parameter set under the role name.
+    One resource in ten has a deprecated parameter group.
+    """
+    role_list = ['Role%d' % r for r in range(roles)]
+    tree_params = {'label': {'name': 'label'}}
+    user_params = {'label': 'deprecated'}
+    for role in role_list:
+        for p in range(params_per_role):
+            name = '%sParam%d' % (role, p)
+            tree_params[name] = {'name': name, 'default': 0}
+            user_params[name] = p
+        specific = '%sRoleSpecific' % role
+        tree_params[specific] = {'name': specific, 'tags': ['role_specific']}
+        tree_params[role] = {'name': role}
+        user_params[role] = specific
+        user_params['%sUnused' % role] = True
+    tree_resources = {}
+    for i in range(resources):
+        label = 'deprecated' if i % 10 == 0 else 'other'
+        tree_resources['res%d' % i] = {'parameter_groups': [
+            {'label': label, 'parameters': ['Old%d' % i]}]}
+    stack_data = {
+        'environment_parameters': user_params,
+        'heat_resource_tree': {'parameters': tree_params,
+                               'resources': tree_resources},
+    }
+    return stack_data, role_list
+
+
+def make_container_images(root, count, depth=3):
+    """Write a tree of count image directories, each with a config file,
+    return the image names
+    """
+    names = []
+    write_yaml(os.path.join(root, 'base', 'base.yaml'),
+               {'tcib_actions': [{'run': 'dnf update -y'}]})
+    for i in range(count):
+        parts = ['base'] + ['group-%d' % (i % (j + 5))
+                            for j in range(depth - 1)]
+        name = 'image-%d' % i
+        write_yaml(os.path.join(root, *(parts + [name, name + '.yaml'])),
+                   {'tcib_packages': {'common': ['package-%d' % i]},
+                    'tcib_actions': [{'run': 'echo %d' % i}]})
+        names.append(name)
+    return names
+
+
+def make_network_environment(count):
+    """Return the parameter_defaults of count non overlapping networks"""
+    params = {}
+    for i in range(count):
+        base = '10.%d.%d' % (i // 256, i % 256)
+        params['Net%dNetCidr' % i] = base + '.0/24'
+        params['Net%dAllocationPools' % i] = [
+            {'start': base + '.10', 'end': base + '.100'},
+            {'start': base + '.110', 'end': base + '.200'}]
+        params['Net%dNetworkVlanID' % i] = 100 + i
+    return params
+
+
+class FakeSubnet(dict):
+    """undercloud.conf subnet group, a dict with attribute access"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def make_ctlplane_subnet(excludes):
+    """Return a /16 ctlplane subnet with excludes single addresses and
+    ranges excluded from DHCP
+    """
+    dhcp_exclude = []
+    for i in range(excludes):
+        if i % 2:
+            dhcp_exclude.append('172.20.%d.%d' % (i // 100 + 1, i % 100 + 1))
+        else:
+            dhcp_exclude.append('172.20.%d.%d-172.20.%d.%d' % (
+                i // 100 + 1, i % 100 + 101, i // 100 + 1, i % 100 + 110))
+    return FakeSubnet(
+        cidr='172.20.0.0/16',
+        dhcp_start=['172.20.0.10'],
+        dhcp_end=['172.20.250.250'],
+        dhcp_exclude=dhcp_exclude,
+        inspection_iprange='172.20.251.1,172.20.251.250',
+        gateway='172.20.0.1',
+        dns_nameservers=['172.20.0.2', '172.20.0.3'],
+        host_routes=[],
+        masquerade=False)
+
+
+def make_heat_log(path, size_mb):
+    """Write a Heat engine log of about size_mb MiB to path, each request
+    logging a few dozen lines about one resource
+    """
+    levels = ['DEBUG'] * 8 + ['INFO', 'WARNING']
+    size = size_mb * 1024 * 1024
+    written = 0
+    line = 0
+    with open(path, 'w') as f:
+        while written < size:
+            chunk = []
+            for i in range(line, line + 10000):
+                req = i // 40
+                chunk.append(
+                    '2021-06-01 %02d:%02d:%02d.%06d %d %s '
+                    'heat.engine.resource [req-%032x - - - - -] UPDATE: '
+                    'Server "resource-%d" Stack "overcloud-Role%d-%012x" '
+                    'step %d, waiting for the nested stack\n' % (
+                        i // 3600000 % 24, i // 60000 % 60, i // 1000 % 60,
+                        i * 7919 % 1000000, 4242 + req % 8,
+                        levels[i % len(levels)],
+                        req * 2654435761 % 2 ** 128, req % 5000, req % 50,
+                        req % 50 * 40503, i % 40))
+            line += len(chunk)
+            data = ''.join(chunk)
+            f.write(data)
+            written += len(data)
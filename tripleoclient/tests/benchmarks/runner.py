@@ -0,0 +1,180 @@
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+#
+
+"""Run the benchmarks and compare them against a stored baseline"""
+
+import argparse
+import json
+import logging
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from prettytable import PrettyTable
+
+from tripleoclient.tests.benchmarks import cases
+
+# Median slow down, relative to the baseline, reported as a regression
+DEFAULT_THRESHOLD = 0.25
+
+
+def run_case(name, scale=1.0, repeat=5, warmup=1):
+    """Time a case, return its statistics in seconds
+
+    :param name: Name of the case in cases.CASES
+    :param scale: Multiplier of the fixture sizes of the case
+    :param repeat: Number of timed runs
+    :param warmup: Number of runs before the timed ones
+    :returns: dict with the min, median, mean and max run times
+    """
+    tmpdir = tempfile.mkdtemp(prefix='tripleoclient-bench-')
+    try:
+        func = cases.CASES[name](scale, tmpdir)
+        for _ in range(warmup):
+            func()
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return {
+        'runs': repeat,
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'max': max(times),
+    }
+
+
+def run(names=None, scale=1.0, repeat=5, warmup=1):
+    """Run the cases matching names, all of them by default"""
+    results = {}
+    logging.disable(logging.CRITICAL)
+    try:
+        for name in cases.CASES:
+            if names and not any(n in name for n in names):
+                continue
+            results[name] = run_case(name, scale, repeat, warmup)
+    finally:
+        logging.disable(logging.NOTSET)
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return the cases whose median is slower than the baseline's by more
+    than threshold, as (name, baseline median, median, ratio) tuples
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if not reference or not reference['median']:
+            continue
+        ratio = result['median'] / reference['median']
+        if ratio > 1 + threshold:
+            regressions.append(
+                (name, reference['median'], result['median'], ratio))
+    return regressions
+
+
+def format_results(results, baseline=None):
+    baseline = baseline or {}
+    table = PrettyTable(['Benchmark', 'Min (ms)', 'Median (ms)',
+                         'Max (ms)', 'Baseline (ms)', 'Change'])
+    table.align['Benchmark'] = 'l'
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference and reference['median']:
+            ref = '%.2f' % (reference['median'] * 1000)
+            change = '%+.1f%%' % (
+                (result['median'] / reference['median'] - 1) * 100)
+        else:
+            ref = change = '-'
+        table.add_row([name, '%.2f' % (result['min'] * 1000),
+                       '%.2f' % (result['median'] * 1000),
+                       '%.2f' % (result['max'] * 1000), ref, change])
+    return table
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m tripleoclient.tests.benchmarks',
+        description='Offline micro-benchmarks of tripleoclient helpers.')
+    parser.add_argument('names', nargs='*', metavar='<name>',
+                        help='Only run the benchmarks whose name contains '
+                             'one of these strings.')
+    parser.add_argument('--list', action='store_true',
+                        help='List the benchmarks and exit.')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='Multiplier of the fixture sizes '
+                             '(default: %(default)s).')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of timed runs of each benchmark '
+                             '(default: %(default)s).')
+    parser.add_argument('--warmup', type=int, default=1,
+                        help='Number of untimed runs before the timed ones '
+                             '(default: %(default)s).')
+    parser.add_argument('--output', metavar='<results.json>',
+                        help='Write the results to this file, it can be '
+                             'used as a later --baseline.')
+    parser.add_argument('--baseline', metavar='<results.json>',
+                        help='Compare the results against the results of a '
+                             'previous run and exit with 1 on regressions.')
+    parser.add_argument('--threshold', type=float,
+                        default=DEFAULT_THRESHOLD,
+                        help='Median slow down, as a fraction of the '
+                             'baseline, counted as a regression '
+                             '(default: %(default)s).')
+    return parser
+
+
+def main(argv=None, stdout=sys.stdout):
+    args = get_parser().parse_args(argv)
+    if args.list:
+        for name in cases.CASES:
+            print(name, file=stdout)
+        return 0
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        if stored.get('scale') != args.scale:
+            print('The baseline was run with --scale %s, not %s'
+                  % (stored.get('scale'), args.scale), file=stdout)
+            return 2
+        baseline = stored['results']
+
+    results = run(args.names, args.scale, args.repeat, args.warmup)
+    print(format_results(results, baseline), file=stdout)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'scale': args.scale,
+                       'repeat': args.repeat,
+                       'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'results': results}, f, indent=2, sort_keys=True)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after, ratio in regressions:
+            print('REGRESSION %s: median %.2fms -> %.2fms (x%.2f)'
+                  % (name, before * 1000, after * 1000, ratio), file=stdout)
+        if regressions:
+            return 1
+    return 0
@@ -0,0 +1,107 @@
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+#
+
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from tripleoclient.tests import base
+from tripleoclient.tests.benchmarks import cases
+from tripleoclient.tests.benchmarks import runner
+
+
+class TestBenchmarkCases(base.TestCase):
+    """Run every case once on tiny fixtures so they keep working"""
+
+    def _run(self, name):
+        result = runner.run_case(name, scale=0.01, repeat=1, warmup=0)
+        self.assertEqual(1, result['runs'])
+        self.assertGreaterEqual(result['median'], 0)
+
+    def test_all_cases_covered(self):
+        tests = [t for t in dir(self) if t.startswith('test_') and
+                 t != 'test_all_cases_covered']
+        self.assertEqual(len(cases.CASES), len(tests))
+
+    def test_process_multiple_environments(self):
+        self._run('utils.process_multiple_environments')
+
+    def test_replace_links_in_template(self):
+        self._run('utils.replace_links_in_template')
+
+    def test_get_roles_data(self):
+        self._run('utils.get_roles_data')
+
+    def test_assign_and_verify_profiles(self):
+        self._run('utils.assign_and_verify_profiles')
+
+    def test_calculate_allocation_pools(self):
+        self._run('undercloud_config._calculate_allocation_pools')
+
+    def test_netenv_overlap_checks(self):
+        self._run('overcloud_netenv_validate.overlap_checks')
+
+    def test_container_image_find_image(self):
+        self._run('tripleo_container_image.Build.find_image')
+
+    def test_analyze_parameters(self):
+        self._run('parameters._analyze_parameters')
+
+    def test_finalize_heat_log_bz2(self):
+        self._run('heat_launcher.finalize_log[bz2]')
+
+    def test_finalize_heat_log_gz(self):
+        self._run('heat_launcher.finalize_log[gz]')
+
+    def test_finalize_heat_log_xz(self):
+        self._run('heat_launcher.finalize_log[xz]')
+
+
+class TestRunner(base.TestCase):
+
+    results = {'a': {'min': 1.0, 'median': 1.0, 'mean': 1.0, 'max': 1.0,
+                     'runs': 1},
+               'b': {'min': 1.5, 'median': 1.5, 'mean': 1.5, 'max': 1.5,
+                     'runs': 1}}
+
+    def test_compare(self):
+        baseline = {'a': {'median': 0.9}, 'b': {'median': 1.0}}
+        self.assertEqual([('b', 1.0, 1.5, 1.5)],
+                         runner.compare(self.results, baseline, 0.25))
+        self.assertEqual([], runner.compare(self.results, baseline, 0.5))
+        self.assertEqual([], runner.compare(self.results, {}, 0.25))
+
+    @mock.patch.object(runner, 'run', autospec=True)
+    def test_main_baseline(self, mock_run):
+        mock_run.return_value = self.results
+        tmpdir = tempfile.mkdtemp()
+        baseline = os.path.join(tmpdir, 'baseline.json')
+        output = os.path.join(tmpdir, 'results.json')
+        with open(baseline, 'w') as f:
+            json.dump({'scale': 1.0, 'results': {'a': {'median': 1.0},
+                                                 'b': {'median': 1.0}}}, f)
+
+        stdout = io.StringIO()
+        self.assertEqual(1, runner.main(['--baseline', baseline,
+                                         '--output', output], stdout))
+        self.assertIn('REGRESSION b', stdout.getvalue())
+        self.assertNotIn('REGRESSION a', stdout.getvalue())
+        with open(output) as f:
+            self.assertEqual(self.results, json.load(f)['results'])
+
+        self.assertEqual(0, runner.main(['--baseline', output],
+                                        io.StringIO()))
+        self.assertEqual(2, runner.main(['--baseline', output,
+                                         '--scale', '2'], io.StringIO()))
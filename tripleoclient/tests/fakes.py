@@ -19,6 +19,8 @@ from unittest import mock
 
 from osc_lib.tests import utils
 
+from tripleoclient import utils as oooutils
+
 AUTH_TOKEN = "foobar"
 AUTH_URL = "http://0.0.0.0"
 WS_URL = "ws://0.0.0.0"
@@ -274,6 +276,9 @@ class FakePlaybookExecution(utils.TestCommand):
     def setUp(self, ansible_mock=True):
         super(FakePlaybookExecution, self).setUp()
 
+        oooutils.clear_sdk_connections()
+        self.addCleanup(oooutils.clear_sdk_connections)
+
         self.app.options = FakeOptions()
         self.app.client_manager.auth_ref = mock.Mock(auth_token="TOKEN")
         self.baremetal = self.app.client_manager.baremetal = mock.MagicMock()
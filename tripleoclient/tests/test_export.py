@@ -14,6 +14,8 @@
 #
 from json.decoder import JSONDecodeError
 import os
+import shutil
+import tempfile
 
 from unittest import mock
 from unittest import TestCase
@@ -277,3 +279,78 @@ class TestExport(TestCase):
         self.assertEqual(data, expected)
         self.mock_open_ceph_all.assert_called_once_with(
             '/foo/dcn0/ceph-ansible/group_vars/all.yml', 'r')
+
+
+class TestExportCephs(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        for stack in ('dcn0', 'dcn1'):
+            self._write(stack, 'global_vars.yaml',
+                        "service_net_map:\n  ceph_mon_network: storage\n")
+            self._write(stack, 'ceph-ansible/inventory.yml',
+                        "mons:\n  children:\n    Compute: {}\n"
+                        "Compute:\n  hosts:\n"
+                        "    %s-compute-0:\n"
+                        "      storage_ip: 192.168.24.%d\n"
+                        "      unused: [1, 2, 3]\n"
+                        % (stack, int(stack[-1]) + 10))
+            self._write(stack, 'ceph-ansible/group_vars/all.yml',
+                        "cluster: %s\nfsid: fsid-%s\nkeys:\n"
+                        "  - name: client.admin\n"
+                        "  - name: client.openstack\n    key: secret\n"
+                        % (stack, stack))
+
+    def _write(self, stack, name, content):
+        path = os.path.join(self.tmp_dir, stack, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_export_cephs_ordered(self):
+        cephs = export.export_cephs(['dcn1', 'dcn0'], 'openstack',
+                                    [self.tmp_dir, self.tmp_dir],
+                                    max_workers=2)
+        self.assertEqual(['dcn1', 'dcn0'], [c['cluster'] for c in cephs])
+        self.assertEqual('192.168.24.11', cephs[0]['external_cluster_mon_ips'])
+        self.assertEqual([{'name': 'client.openstack', 'key': 'secret'}],
+                         cephs[1]['keys'])
+
+    def test_export_cephs_cached(self):
+        working_dir = os.path.join(self.tmp_dir, 'overcloud-deploy')
+        os.makedirs(working_dir)
+        first = export.export_cephs(['dcn0'], 'openstack', [self.tmp_dir],
+                                    working_dirs=[working_dir])
+        cache_file = os.path.join(working_dir,
+                                  'tripleo-dcn0-ceph-export-cache.json')
+        self.assertTrue(os.path.isfile(cache_file))
+        with mock.patch('tripleoclient.export.export_ceph') as mock_export:
+            second = export.export_cephs(['dcn0'], 'openstack',
+                                         [self.tmp_dir],
+                                         working_dirs=[working_dir])
+        mock_export.assert_not_called()
+        self.assertEqual(first, second)
+
+        # another cephx client is not served from the cache
+        admin = export.export_cephs(['dcn0'], 'admin', [self.tmp_dir],
+                                    working_dirs=[working_dir])
+        self.assertEqual([{'name': 'client.admin'}], admin[0]['keys'])
+
+        # a changed file invalidates the cached data of its stack
+        all_yml = os.path.join(self.tmp_dir, 'dcn0',
+                               'ceph-ansible/group_vars/all.yml')
+        st = os.stat(all_yml)
+        os.utime(all_yml, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        with mock.patch('tripleoclient.export.export_ceph',
+                        return_value={}) as mock_export:
+            export.export_cephs(['dcn0'], 'openstack', [self.tmp_dir],
+                                working_dirs=[working_dir])
+        mock_export.assert_called_once_with('dcn0', 'openstack',
+                                            self.tmp_dir)
+
+    def test_export_cephs_without_working_dir(self):
+        export.export_cephs(['dcn0'], 'openstack', [self.tmp_dir])
+        with mock.patch('tripleoclient.export.export_ceph') as mock_export:
+            export.export_cephs(['dcn0'], 'openstack', [self.tmp_dir])
+        mock_export.assert_called_once_with('dcn0', 'openstack',
+                                            self.tmp_dir)
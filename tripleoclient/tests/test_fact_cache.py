@@ -0,0 +1,156 @@
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+#
+
+import os
+import tempfile
+import time
+from unittest import mock
+
+from tripleoclient import fact_cache
+from tripleoclient.tests import base
+
+
+class TestSqliteFactCache(base.TestCase):
+
+    def setUp(self):
+        super(TestSqliteFactCache, self).setUp()
+        self.path = os.path.join(tempfile.mkdtemp(), 'fact_cache')
+        self.cache = fact_cache.SqliteFactCache(self.path, timeout=60)
+        self.addCleanup(self.cache.close)
+
+    def test_empty_cache_is_not_created(self):
+        self.assertEqual([], self.cache.keys())
+        self.assertFalse(self.cache.contains('host-0'))
+        self.assertRaises(KeyError, self.cache.get, 'host-0')
+        self.assertFalse(self.cache.delete('host-0'))
+        self.assertEqual(0, self.cache.prune())
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_set_get_delete(self):
+        self.cache.set('host-0', {'ansible_hostname': 'host-0'})
+        self.cache.set('host-1', {'ansible_hostname': 'host-1'})
+        self.assertEqual({'ansible_hostname': 'host-0'},
+                         self.cache.get('host-0'))
+        self.assertEqual(['host-0', 'host-1'], self.cache.keys())
+        self.assertTrue(self.cache.delete('host-0'))
+        self.assertFalse(self.cache.contains('host-0'))
+        self.assertEqual(['host-1'], self.cache.keys())
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.path, 'sqlite', 'facts.sqlite')))
+
+    def test_expired_facts(self):
+        now = time.time()
+        with mock.patch('time.time', return_value=now - 120):
+            self.cache.set('host-0', {})
+        self.cache.set('host-1', {})
+        self.assertFalse(self.cache.contains('host-0'))
+        self.assertRaises(KeyError, self.cache.get, 'host-0')
+        self.assertEqual(['host-1'], self.cache.keys())
+        self.assertEqual(1, self.cache.prune())
+        self.assertEqual(0, self.cache.prune())
+
+    def test_no_timeout(self):
+        cache = fact_cache.SqliteFactCache(self.path, timeout=0)
+        self.addCleanup(cache.close)
+        with mock.patch('time.time', return_value=0):
+            cache.set('host-0', {})
+        self.assertEqual(['host-0'], cache.keys())
+        self.assertEqual(0, cache.prune())
+
+    def test_flush(self):
+        self.cache.set('host-0', {})
+        self.cache.flush()
+        self.assertEqual([], self.cache.keys())
+
+    def test_not_a_jsonfile_host(self):
+        self.cache.set('host-0', {})
+        jsonfile = fact_cache.JsonFileFactCache(self.path, timeout=1)
+        with mock.patch('time.time', return_value=time.time() + 120):
+            self.assertEqual(0, jsonfile.prune())
+        self.assertEqual([], jsonfile.keys())
+        self.assertEqual(['host-0'], self.cache.keys())
+
+    def test_migrate_jsonfile(self):
+        os.makedirs(self.path)
+        for host in ('host-0', 'host-1', 'host-2'):
+            with open(os.path.join(self.path, host), 'w') as f:
+                f.write('{"ansible_hostname": "%s"}' % host)
+        with open(os.path.join(self.path, 'host-2'), 'w') as f:
+            f.write('{')
+        old = time.time() - 120
+        os.utime(os.path.join(self.path, 'host-1'), (old, old))
+        self.assertEqual(1, self.cache.migrate_jsonfile())
+        self.assertEqual(['host-0'], self.cache.keys())
+        self.assertEqual({'ansible_hostname': 'host-0'},
+                         self.cache.get('host-0'))
+        self.assertEqual(['sqlite'], os.listdir(self.path))
+        self.assertEqual(0, self.cache.migrate_jsonfile())
+
+
+class TestJsonFileFactCache(base.TestCase):
+
+    def setUp(self):
+        super(TestJsonFileFactCache, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.cache = fact_cache.JsonFileFactCache(self.path, timeout=60)
+        for host in ('host-0', 'host-1'):
+            with open(os.path.join(self.path, host), 'w') as f:
+                f.write('{}')
+
+    def test_delete(self):
+        self.assertTrue(self.cache.delete('host-0'))
+        self.assertFalse(self.cache.delete('host-0'))
+        self.assertEqual(['host-1'], self.cache.keys())
+
+    def test_prune(self):
+        old = time.time() - 120
+        os.utime(os.path.join(self.path, 'host-0'), (old, old))
+        self.assertEqual(1, self.cache.prune())
+        self.assertEqual(['host-1'], self.cache.keys())
+
+
+class TestGetFactCache(base.TestCase):
+
+    def test_defaults(self):
+        cache = fact_cache.get_fact_cache()
+        self.assertIsInstance(cache, fact_cache.SqliteFactCache)
+        self.assertEqual(7200, cache.timeout)
+        self.assertEqual(
+            os.path.join(self.temp_homedir, '.tripleo', 'fact_cache'),
+            cache.path)
+
+    @mock.patch.dict(os.environ, {'TRIPLEO_FACT_CACHE_BACKEND': 'jsonfile',
+                                  'TRIPLEO_FACT_CACHE_TIMEOUT': '10'})
+    def test_environment(self):
+        cache = fact_cache.get_fact_cache(path='/tmp/facts')
+        self.assertIsInstance(cache, fact_cache.JsonFileFactCache)
+        self.assertEqual(10, cache.timeout)
+
+    def test_unknown_backend(self):
+        self.assertRaises(ValueError, fact_cache.get_fact_cache, 'redis')
+
+    @mock.patch.dict(os.environ, {'TRIPLEO_FACT_CACHE_BACKEND': 'redis',
+                                  'TRIPLEO_FACT_CACHE_TIMEOUT': '2h'})
+    def test_invalid_environment(self):
+        cache = fact_cache.get_fact_cache(path='/tmp/facts')
+        self.assertIsInstance(cache, fact_cache.SqliteFactCache)
+        self.assertEqual(7200, cache.timeout)
+
+    def test_evict_hosts(self):
+        cache = fact_cache.get_fact_cache()
+        self.addCleanup(cache.close)
+        cache.set('host-0', {})
+        cache.set('host-1', {})
+        self.assertEqual(1, fact_cache.evict_hosts(['host-0', 'host-2'],
+                                                   cache=cache))
+        self.assertEqual(['host-1'], cache.keys())
@@ -0,0 +1,104 @@
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+#
+
+import json
+import os
+import tempfile
+import threading
+
+from tripleoclient.tests import base
+from tripleoclient import tracing
+
+
+@tracing.traced('playbook {playbook}')
+def _run(playbook, inventory=None):
+    return playbook
+
+
+class TestTracer(base.TestCase):
+
+    def test_span_without_tracer(self):
+        self.assertIsNone(tracing.get_tracer())
+        with tracing.span('phase') as s:
+            self.assertIsNone(s)
+        self.assertEqual('deploy.yaml', _run('deploy.yaml'))
+
+    def test_nested_spans(self):
+        with tracing.Tracer('deploy') as tracer:
+            self.assertIs(tracer, tracing.get_tracer())
+            with tracing.span('stack', stack='overcloud'):
+                _run(playbook='deploy.yaml')
+            with tracing.span('export'):
+                pass
+        self.assertIsNone(tracing.get_tracer())
+
+        self.assertEqual(
+            [('deploy', 0), ('stack', 1), ('playbook deploy.yaml', 2),
+             ('export', 1)],
+            [(s.name, s.depth) for s in tracer.spans])
+        root, stack, playbook, _ = tracer.spans
+        self.assertEqual({'stack': 'overcloud'}, stack.args)
+        self.assertGreaterEqual(root.wall, stack.wall)
+        self.assertGreaterEqual(stack.wall, playbook.wall)
+        self.assertGreater(root.max_rss, 0)
+
+    def test_failed_span(self):
+        tracer = tracing.Tracer('deploy')
+
+        def fail():
+            with tracer:
+                with tracing.span('stack'):
+                    raise ValueError('boom')
+        self.assertRaises(ValueError, fail)
+        self.assertEqual(['ValueError: boom', 'ValueError: boom'],
+                         [s.error for s in tracer.spans])
+        self.assertIn('stack (failed)', tracer.summary().get_string())
+
+    def test_spans_of_threads(self):
+        with tracing.Tracer('deploy') as tracer:
+            with tracing.span('backup'):
+                threads = [threading.Thread(target=_run, args=(name,))
+                           for name in ('a.yaml', 'b.yaml')]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        playbooks = [s for s in tracer.spans if s.name.startswith('playbook')]
+        self.assertEqual(2, len(playbooks))
+        self.assertEqual([0, 0], [s.depth for s in playbooks])
+        self.assertNotIn(threading.get_ident(), [s.tid for s in playbooks])
+
+    def test_export(self):
+        with tracing.Tracer('deploy') as tracer:
+            with tracing.span('stack'):
+                pass
+        path = os.path.join(tempfile.mkdtemp(), 'trace.json')
+        self.assertEqual(path, tracer.export(path))
+        with open(path) as f:
+            trace = json.load(f)
+        self.assertEqual(['deploy', 'stack'],
+                         [e['name'] for e in trace['traceEvents']])
+        event = trace['traceEvents'][1]
+        self.assertEqual('X', event['ph'])
+        self.assertEqual(os.getpid(), event['pid'])
+        self.assertIn('cpu_s', event['args'])
+        self.assertIn('max_rss_kb', event['args'])
+
+    def test_summary(self):
+        with tracing.Tracer('deploy') as tracer:
+            with tracing.span('stack'):
+                pass
+        rows = tracer.summary().get_string().splitlines()
+        self.assertIn('Wall (s)', rows[1])
+        self.assertIn('| deploy ', rows[3])
+        self.assertIn('|   stack ', rows[4])
@@ -18,19 +18,26 @@ import ansible_runner
 import argparse
 import datetime
 import fixtures
+import getpass
+import io
+import json
 import logging
 import openstack
 import os
 import os.path
+import requests
 import shutil
 import socket
 import subprocess
 import tempfile
+import textwrap
+import threading
 from unittest import mock
 
 import sys
 
 from heatclient import exc as hc_exc
+from osc_lib import exceptions as oscexc
 
 from uuid import uuid4
 
@@ -268,6 +275,225 @@ class TestRunAnsiblePlaybook(TestCase):
         )
 
 
+class TestRunLocalPlaybook(base.TestCase):
+
+    def setUp(self):
+        super(TestRunLocalPlaybook, self).setUp()
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+
+    def _getfacl(self, admin_perms):
+        return (
+            '# file: {0}\n# owner: stack\nuser::rwx\n'
+            'user:tripleo-admin:rwx\n\n'
+            '# file: {0}/stack\n# owner: stack\nuser::rwx\n'
+            'user:tripleo-admin:{1}\t#effective:r-x\nmask::r-x\n\n'
+        ).format(self.tmpdir, admin_perms)
+
+    @mock.patch('subprocess.check_output', autospec=True)
+    @mock.patch('tripleoclient.utils.run_ansible_playbook', autospec=True)
+    def test_grant_local_access_native(self, mock_playbook, mock_getfacl):
+        mock_getfacl.return_value = self._getfacl('rwx')
+        os.makedirs(os.path.join(self.tmpdir, 'stack'))
+        utils.run_local_playbook(
+            playbook='cli-grant-local-access.yaml',
+            workdir=self.tmpdir,
+            extra_vars={'access_path': self.tmpdir,
+                        'execution_user': getpass.getuser()})
+        mock_playbook.assert_not_called()
+        self.assertEqual(
+            ['getfacl', '-R', '-p', '--absolute-names', '--', self.tmpdir],
+            mock_getfacl.call_args[0][0])
+
+    @mock.patch('subprocess.check_output', autospec=True)
+    @mock.patch('tripleoclient.utils.run_ansible_playbook', autospec=True)
+    def test_grant_local_access_missing_admin_acl(self, mock_playbook,
+                                                  mock_getfacl):
+        mock_getfacl.return_value = self._getfacl('r-x')
+        os.makedirs(os.path.join(self.tmpdir, 'stack'))
+        utils.run_local_playbook(
+            playbook='cli-grant-local-access.yaml',
+            workdir=self.tmpdir,
+            extra_vars={'access_path': self.tmpdir,
+                        'execution_user': getpass.getuser()})
+        mock_playbook.assert_called_once()
+
+    @mock.patch('subprocess.check_output', autospec=True,
+                side_effect=OSError('getfacl not found'))
+    @mock.patch('tripleoclient.utils.run_ansible_playbook', autospec=True)
+    def test_grant_local_access_native_error(self, mock_playbook,
+                                             mock_getfacl):
+        with mock.patch.object(utils.LOG, 'warning') as mock_warning:
+            utils.run_local_playbook(
+                playbook='cli-grant-local-access.yaml',
+                workdir=self.tmpdir,
+                extra_vars={'access_path': self.tmpdir,
+                            'execution_user': getpass.getuser()})
+        mock_warning.assert_called_once()
+        mock_playbook.assert_called_once()
+
+    @mock.patch('tripleoclient.utils.run_ansible_playbook', autospec=True)
+    def test_grant_local_access_fallback(self, mock_playbook):
+        extra_vars = {'access_path': os.path.join(self.tmpdir, 'missing'),
+                      'execution_user': getpass.getuser()}
+        utils.run_local_playbook(
+            playbook='cli-grant-local-access.yaml',
+            workdir=self.tmpdir,
+            verbosity=1,
+            extra_vars=extra_vars)
+        mock_playbook.assert_called_once_with(
+            playbook='cli-grant-local-access.yaml',
+            inventory='localhost,',
+            workdir=self.tmpdir,
+            verbosity=1,
+            extra_vars=extra_vars)
+
+    @mock.patch('tripleoclient.utils.run_ansible_playbook', autospec=True)
+    def test_get_horizon_url_native(self, mock_playbook):
+        outputs = os.path.join(self.tmpdir, 'outputs')
+        os.makedirs(outputs)
+        with open(os.path.join(outputs, 'EndpointMap'), 'w') as f:
+            yaml.safe_dump(
+                {'HorizonPublic': {'uri': 'http://1.2.3.4:80/dashboard'}}, f)
+        output_file = os.path.join(self.tmpdir, 'horizon', 'horizon_url')
+        utils.run_local_playbook(
+            playbook='cli-undercloud-get-horizon-url.yaml',
+            workdir=self.tmpdir,
+            extra_vars={'stack_name': 'overcloud',
+                        'horizon_url_output_file': output_file},
+            context={'working_dir': self.tmpdir})
+        mock_playbook.assert_not_called()
+        with open(output_file) as f:
+            self.assertEqual('http://1.2.3.4:80/dashboard', f.read())
+
+    @mock.patch('tripleoclient.utils.run_ansible_playbook', autospec=True)
+    def test_get_horizon_url_fallback(self, mock_playbook):
+        utils.run_local_playbook(
+            playbook='cli-undercloud-get-horizon-url.yaml',
+            workdir=self.tmpdir,
+            extra_vars={'stack_name': 'overcloud',
+                        'horizon_url_output_file': 'horizon_url'},
+            context={'working_dir': self.tmpdir})
+        mock_playbook.assert_called_once()
+
+    @mock.patch('tripleoclient.utils.run_ansible_playbook', autospec=True)
+    def test_unregistered_playbook(self, mock_playbook):
+        utils.run_local_playbook(playbook='other.yaml', workdir=self.tmpdir)
+        mock_playbook.assert_called_once_with(
+            playbook='other.yaml', inventory='localhost,',
+            workdir=self.tmpdir, extra_vars=None)
+
+
+class TestPlaybookSession(base.TestCase):
+
+    def setUp(self):
+        super(TestPlaybookSession, self).setUp()
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+        env = mock.patch('tripleoclient.utils.ansible_playbook_env',
+                         autospec=True, return_value={'A': 'B'})
+        self.mock_env = env.start()
+        self.addCleanup(env.stop)
+        prepare = mock.patch('tripleoclient.utils.prepare_fact_cache',
+                             autospec=True)
+        self.mock_prepare = prepare.start()
+        self.addCleanup(prepare.stop)
+
+    @mock.patch('tripleoclient.utils.run_ansible_playbook', autospec=True)
+    def test_env_computed_once(self, mock_playbook):
+        other = os.path.join(self.tmpdir, 'other')
+        session = utils.PlaybookSession(self.tmpdir,
+                                        playbook_dir=self.tmpdir)
+        session.run('one.yaml', inventory='localhost,', extra_vars={'a': 1})
+        session.run('two.yaml', inventory='localhost,', extra_vars={'b': 1})
+        session.run('three.yaml', inventory='localhost,', forks=1)
+        session.run('four.yaml', inventory='localhost,', workdir=other)
+        self.assertEqual(
+            [mock.call(workdir=self.tmpdir, facts=mock.ANY),
+             mock.call(workdir=self.tmpdir, facts=mock.ANY, forks=1),
+             mock.call(workdir=other, facts=mock.ANY)],
+            self.mock_env.mock_calls)
+        self.mock_prepare.assert_called_once_with(mock.ANY)
+        mock_playbook.assert_any_call(
+            playbook='one.yaml', inventory='localhost,',
+            playbook_dir=self.tmpdir, workdir=self.tmpdir,
+            extra_vars={'a': 1}, ansible_env={'A': 'B'})
+        self.assertEqual(4, mock_playbook.call_count)
+        self.assertEqual(['one.yaml', 'two.yaml', 'three.yaml',
+                          'four.yaml'], list(session.results))
+
+    @mock.patch('tripleoclient.utils.run_ansible_playbook', autospec=True,
+                side_effect=RuntimeError('Ansible execution failed'))
+    def test_run_failure(self, mock_playbook):
+        session = utils.PlaybookSession(self.tmpdir)
+        self.assertRaises(RuntimeError, session.run, 'one.yaml',
+                          inventory='localhost,')
+        self.assertEqual({'one.yaml': 'failed'}, session.results)
+
+    @mock.patch('tripleoclient.utils.run_ansible_playbook', autospec=True)
+    def test_run_local_playbook(self, mock_playbook):
+        session = utils.PlaybookSession(self.tmpdir)
+        utils.run_local_playbook(playbook='other.yaml', workdir=self.tmpdir,
+                                 session=session)
+        mock_playbook.assert_called_once_with(
+            playbook='other.yaml', inventory='localhost,',
+            workdir=self.tmpdir, extra_vars=None, ansible_env={'A': 'B'})
+        self.assertEqual({'other.yaml': 'successful'}, session.results)
+
+    @mock.patch('tripleoclient.utils.run_ansible_playbook', autospec=True)
+    def test_temporary_workdir(self, mock_playbook):
+        cwd = os.getcwd()
+        with utils.PlaybookSession() as session:
+            self.assertEqual(os.path.realpath(session.workdir),
+                             os.path.realpath(os.getcwd()))
+        self.assertEqual(cwd, os.getcwd())
+        self.assertFalse(os.path.exists(session.workdir))
+
+
+class TestRunPhaseGraph(base.TestCase):
+
+    def test_dependencies_ordered(self):
+        order = []
+        blocker = threading.Event()
+
+        def slow():
+            blocker.wait(5)
+            order.append('slow')
+
+        def fast():
+            order.append('fast')
+            blocker.set()
+
+        timings = utils.run_phase_graph({
+            'slow': (slow, []),
+            'fast': (fast, []),
+            'last': (lambda: order.append('last'), ['slow', 'fast']),
+        })
+        # fast unblocks slow, so both must have run concurrently
+        self.assertEqual(['fast', 'slow', 'last'], order)
+        self.assertEqual(['fast', 'slow', 'last'], list(timings))
+
+    def test_failure_stops_dependents(self):
+        dependent = mock.Mock()
+        independent = mock.Mock()
+
+        def fail():
+            raise RuntimeError('boom')
+
+        self.assertRaisesRegex(RuntimeError, 'boom', utils.run_phase_graph,
+                               {'fail': (fail, []),
+                                'dependent': (dependent, ['fail']),
+                                'independent': (independent, [])})
+        dependent.assert_not_called()
+        independent.assert_called_once_with()
+
+    def test_invalid_graph(self):
+        func = mock.Mock()
+        self.assertRaises(ValueError, utils.run_phase_graph,
+                          {'a': (func, ['missing'])})
+        self.assertRaises(ValueError, utils.run_phase_graph,
+                          {'a': (func, ['b']), 'b': (func, ['a'])})
+        func.assert_not_called()
+
+
 class TestRunRolePlaybooks(TestCase):
     def setUp(self):
         tmp_dir = utils.TempDirs().dir
@@ -1256,6 +1482,39 @@ class TestAssignVerifyProfiles(TestCase):
                            for node in self.nodes]
         self.assertEqual([None] * 3, actual_profiles)
 
+    @mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_assign_profiles_dry_run_plan(self, mock_stdout):
+        self.nodes[:] = [self._get_fake_node(possible_profiles=['compute']),
+                         self._get_fake_node(possible_profiles=['control'])]
+
+        self._test(0, 0, dry_run=True)
+        output = mock_stdout.getvalue()
+        self.assertIn('%s -> compute' % self.nodes[0].uuid, output)
+        self.assertIn('%s -> control' % self.nodes[1].uuid, output)
+
+    def test_assign_profiles_update_failure(self):
+        self.nodes[:] = [self._get_fake_node(possible_profiles=['compute']),
+                         self._get_fake_node(possible_profiles=['control'])]
+        self.bm_client.node.update.side_effect = [None, Exception('boom')]
+
+        self._test(1, 0, assign_profiles=True)
+        self.assertEqual(2, self.bm_client.node.update.call_count)
+
+    def test_assign_profiles_many_nodes(self):
+        self.flavors = {name: (fakes.FakeFlavor(name), 100)
+                        for name in ('compute', 'control')}
+        self.nodes[:] = (
+            [self._get_fake_node(possible_profiles=['compute', 'control'])
+             for _ in range(150)] +
+            [self._get_fake_node(profile='control') for _ in range(50)])
+
+        self._test(0, 0, assign_profiles=True)
+        self.assertEqual(150, self.bm_client.node.update.call_count)
+        profiles = [utils.node_get_capabilities(node).get('profile')
+                    for node in self.nodes]
+        self.assertEqual(100, profiles.count('compute'))
+        self.assertEqual(100, profiles.count('control'))
+
     def test_scale(self):
         # active nodes with assigned profiles are fine
         self.nodes[:] = [self._get_fake_node(profile='compute',
@@ -2056,6 +2315,24 @@ class TestGetLocalTimezone(TestCase):
         self.assertEqual('UTC', utils.get_local_timezone())
 
 
+class TestParseHeatTuning(TestCase):
+    def test_parse_heat_tuning(self):
+        self.assertEqual(
+            {'num_engine_workers': '4', 'node_count': 120},
+            utils.parse_heat_tuning(['num_engine_workers=4'],
+                                    node_count=120))
+        self.assertEqual(
+            {'node_count': '10'},
+            utils.parse_heat_tuning(['node_count=10'], node_count=120))
+        self.assertEqual({}, utils.parse_heat_tuning([]))
+
+    def test_parse_heat_tuning_invalid(self):
+        self.assertRaises(oscexc.CommandError,
+                          utils.parse_heat_tuning, ['workers=4'])
+        self.assertRaises(oscexc.CommandError,
+                          utils.parse_heat_tuning, ['num_engine_workers=x'])
+
+
 class TestParseExtraVars(TestCase):
     def test_simple_case_text_format(self):
         input_parameter = ['key1=val1', 'key2=val2 key3=val3']
@@ -2150,6 +2427,116 @@ class TestGeneralUtils(base.TestCommand):
         self.assertEqual(limit_hosts_actual, limit_hosts_expected)
 
 
+class TestBuildStackData(base.TestCase):
+
+    def setUp(self):
+        super(TestBuildStackData, self).setUp()
+        utils._STACK_DATA_CACHE.clear()
+        self.addCleanup(utils._STACK_DATA_CACHE.clear)
+        self.clients = mock.Mock()
+        self.validate = self.clients.orchestration.stacks.validate
+        self.validate.return_value = {
+            'Environment': {'parameter_defaults': {'Foo': 1}},
+            'Parameters': {'Foo': {'Type': 'String'}},
+        }
+
+    def test_build_stack_data_memoized(self):
+        first = utils.build_stack_data(
+            self.clients, 'overcloud', 'tmpl', {'a': 'b'}, ['env.yaml'])
+        second = utils.build_stack_data(
+            self.clients, 'overcloud', 'tmpl', {'a': 'b'}, ['env.yaml'])
+        self.assertEqual(first, second)
+        self.assertEqual({'Foo': 1}, first['environment_parameters'])
+        self.validate.assert_called_once()
+
+        utils.build_stack_data(
+            self.clients, 'overcloud', 'tmpl', {'a': 'c'}, ['env.yaml'])
+        self.assertEqual(2, self.validate.call_count)
+
+    def test_build_stack_data_persistent_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            first = utils.build_stack_data(
+                self.clients, 'overcloud', 'tmpl', {}, [],
+                cache_dir=cache_dir)
+            self.assertTrue(os.path.exists(os.path.join(
+                cache_dir, 'tripleo-overcloud-stack-data-cache.json')))
+            utils._STACK_DATA_CACHE.clear()
+            second = utils.build_stack_data(
+                self.clients, 'overcloud', 'tmpl', {}, [],
+                cache_dir=cache_dir)
+        self.assertEqual(first, second)
+        self.validate.assert_called_once()
+
+
+class TestParseAnsibleInventory(base.TestCase):
+
+    INVENTORY = {
+        'Undercloud': {'hosts': {'undercloud': {}}},
+        'Controller': {
+            'hosts': {'controller-0': {'ansible_host': '192.168.24.10'},
+                      'controller-1': {}},
+            'vars': {'role': 'Controller'}},
+        'Compute': {'hosts': {'compute-0': None}},
+        'overcloud': {'children': {'Controller': {}, 'Compute': {}}},
+    }
+
+    def setUp(self):
+        super(TestParseAnsibleInventory, self).setUp()
+        utils._INVENTORY_INDEX_CACHE.clear()
+        self.addCleanup(utils._INVENTORY_INDEX_CACHE.clear)
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+        self.inventory = os.path.join(self.tmpdir, 'inventory.yaml')
+        with open(self.inventory, 'w') as f:
+            yaml.safe_dump(self.INVENTORY, f, sort_keys=False)
+
+    def test_parse_static_inventory(self):
+        self.assertEqual(
+            ['controller-0', 'controller-1', 'compute-0'],
+            utils.parse_ansible_inventory(self.inventory, 'overcloud'))
+        self.assertEqual(
+            ['undercloud', 'controller-0', 'controller-1', 'compute-0'],
+            utils.parse_ansible_inventory(self.inventory, 'all'))
+        self.assertEqual(
+            ['compute-0'],
+            utils.parse_ansible_inventory(self.inventory, 'compute-0'))
+
+    def test_inventory_index(self):
+        index = utils.get_inventory_index(self.inventory)
+        self.assertIn('compute-0', index)
+        self.assertNotIn('compute-1', index)
+        self.assertEqual({'ansible_host': '192.168.24.10'},
+                         index.hostvars['controller-0'])
+        self.assertIs(index, utils.get_inventory_index(self.inventory))
+
+    def test_inventory_index_invalidated_on_change(self):
+        index = utils.get_inventory_index(self.inventory)
+        with open(self.inventory, 'w') as f:
+            yaml.safe_dump({'Compute': {'hosts': {'compute-1': {}}}}, f)
+        os.utime(self.inventory, ns=(0, 0))
+        new_index = utils.get_inventory_index(self.inventory)
+        self.assertIsNot(index, new_index)
+        self.assertIn('compute-1', new_index)
+
+    @mock.patch('ansible.inventory.manager.InventoryManager', autospec=True)
+    def test_parse_pattern_fallback(self, mock_inventory_manager):
+        mock_inventory_manager.return_value.get_hosts.return_value = [
+            'controller-0']
+        self.assertEqual(
+            ['controller-0'],
+            utils.parse_ansible_inventory(self.inventory,
+                                          'overcloud:!compute-0'))
+        mock_inventory_manager.return_value.get_hosts.assert_called_once_with(
+            pattern='overcloud:!compute-0')
+
+    def test_parse_ini_inventory(self):
+        ini = os.path.join(self.tmpdir, 'inventory.ini')
+        with open(ini, 'w') as f:
+            f.write('[Compute]\ncompute-0\n')
+        self.assertIsNone(utils.get_inventory_index(ini))
+        self.assertEqual(['compute-0'],
+                         utils.parse_ansible_inventory(ini, 'Compute'))
+
+
 class TestTempDirs(base.TestCase):
 
     @mock.patch('tripleoclient.utils.tempfile.mkdtemp',
@@ -2191,6 +2578,38 @@ class TestTempDirs(base.TestCase):
             "Not cleaning temporary directory [ foo ]")
 
 
+class TestGetSdkConnection(base.TestCase):
+
+    @mock.patch('openstack.connect', autospec=True)
+    def test_connection_is_shared(self, mock_connect):
+        conn = utils.get_sdk_connection('undercloud')
+        self.assertIs(conn, utils.get_sdk_connection('undercloud'))
+        mock_connect.assert_called_once_with(cloud='undercloud')
+
+    @mock.patch('openstack.connect', autospec=True)
+    def test_connection_per_cloud(self, mock_connect):
+        mock_connect.side_effect = lambda cloud: mock.Mock(name=cloud)
+        self.assertIsNot(utils.get_sdk_connection('undercloud'),
+                         utils.get_sdk_connection('other'))
+        self.assertEqual(2, mock_connect.call_count)
+
+    @mock.patch('openstack.connect', autospec=True)
+    def test_connection_pool_size(self, mock_connect):
+        session = requests.Session()
+        mock_connect.return_value.session.session = session
+        utils.get_sdk_connection('undercloud', pool_size=7)
+        for prefix in ('https://', 'http://'):
+            self.assertEqual(7, session.adapters[prefix]._pool_maxsize)
+
+    @mock.patch('openstack.connect', autospec=True)
+    def test_clear_sdk_connections(self, mock_connect):
+        conn = utils.get_sdk_connection('undercloud')
+        utils.clear_sdk_connections()
+        conn.close.assert_called_once_with()
+        utils.get_sdk_connection('undercloud')
+        self.assertEqual(2, mock_connect.call_count)
+
+
 class TestGetCtlplaneAttrs(base.TestCase):
 
     @mock.patch('openstack.connect', autospec=True)
@@ -2229,7 +2648,7 @@ class TestGetCtlplaneAttrs(base.TestCase):
             ip_version=4
         )
         mock_conn.network.find_network.return_value = fake_network
-        mock_conn.network.get_subnet.return_value = fake_subnet
+        mock_conn.network.subnets.return_value = [fake_subnet]
         expected = {
             'network': {
                 'dns_domain': 'ctlplane.localdomain.',
@@ -2248,6 +2667,37 @@ class TestGetCtlplaneAttrs(base.TestCase):
             }
         }
         self.assertEqual(expected, utils.get_ctlplane_attrs())
+        mock_conn.network.subnets.assert_called_once_with(
+            network_id=fake_network.id,
+            fields=list(utils.CTLPLANE_SUBNET_FIELDS))
+        mock_conn.network.get_subnet.assert_not_called()
+
+    @mock.patch('openstack.connect', autospec=True)
+    @mock.patch.object(openstack.connection, 'Connection', autospec=True)
+    def test_get_ctlplane_attrs_memoized(self, mock_conn, mock_connect):
+        mock_connect.return_value = mock_conn
+        mock_conn.network.find_network.return_value = \
+            fakes.FakeNeutronNetwork(name='ctlplane', mtu=1500,
+                                     dns_domain='', tags=[],
+                                     subnet_ids=['leaf1', 'leaf0', 'gone'])
+        mock_conn.network.subnets.return_value = [
+            fakes.FakeNeutronSubnet(
+                id=leaf, name=leaf, cidr=cidr, gateway_ip=None,
+                host_routes=[], dns_nameservers=[], ip_version=4)
+            for leaf, cidr in (('leaf0', '192.168.24.0/24'),
+                               ('leaf1', '192.168.25.0/24'))]
+
+        attrs = utils.get_ctlplane_attrs()
+        self.assertEqual(['leaf1', 'leaf0'], list(attrs['subnets']))
+        attrs['subnets'].clear()
+        self.assertEqual(2, len(utils.get_ctlplane_attrs()['subnets']))
+        mock_connect.assert_called_once_with(cloud='undercloud')
+        mock_conn.network.find_network.assert_called_once_with('ctlplane')
+        mock_conn.network.subnets.assert_called_once()
+
+        utils.clear_sdk_connections()
+        utils.get_ctlplane_attrs()
+        self.assertEqual(2, mock_conn.network.subnets.call_count)
 
 
 class TestGetHostEntry(base.TestCase):
@@ -2731,6 +3181,163 @@ class TestGetHostsFromCephSpec(TestCase):
         self.assertEqual(expected, hosts)
 
 
+class TestGenerateCephSpec(TestCase):
+
+    roles_data = textwrap.dedent('''
+    - name: Controller
+      ServicesDefault:
+        - OS::TripleO::Services::CephMgr
+        - OS::TripleO::Services::CephMon
+        - OS::TripleO::Services::Keystone
+    - name: Compute
+      ServicesDefault:
+        - OS::TripleO::Services::NovaCompute
+    - name: CephStorage
+      ServicesDefault:
+        - OS::TripleO::Services::CephOSD
+    ''')
+
+    baremetal_env = textwrap.dedent('''
+    parameter_defaults:
+      ControllerHostnameFormat: '%stackname%-controller-%index%'
+      ComputeHostnameFormat: '%stackname%-novacompute-%index%'
+      CephStorageHostnameFormat: '%stackname%-cephstorage-%index%'
+      HostnameMap:
+        overcloud-controller-0: oc0-controller-0
+        overcloud-novacompute-0: oc0-compute-0
+        overcloud-cephstorage-0: oc0-ceph-0
+        overcloud-cephstorage-1: oc0-ceph-1
+    ''')
+
+    inventory = textwrap.dedent('''
+    Controller:
+      hosts:
+        oc0-controller-0:
+          ansible_host: 192.168.24.23
+    Compute:
+      hosts:
+        oc0-compute-0:
+          ansible_host: 192.168.24.21
+    CephStorage:
+      children:
+        overcloud_CephStorage: {}
+    overcloud_CephStorage:
+      hosts:
+        oc0-ceph-0:
+          ansible_host: 192.168.24.13
+        oc0-ceph-1:
+          ansible_host: 192.168.24.14
+    ''')
+
+    expected = textwrap.dedent('''\
+    ---
+    addr: 192.168.24.23
+    hostname: oc0-controller-0
+    labels:
+    - _admin
+    - mgr
+    - mon
+    service_type: host
+    ---
+    addr: 192.168.24.13
+    hostname: oc0-ceph-0
+    labels:
+    - osd
+    service_type: host
+    ---
+    addr: 192.168.24.14
+    hostname: oc0-ceph-1
+    labels:
+    - osd
+    service_type: host
+    ---
+    placement:
+      hosts:
+      - oc0-controller-0
+    service_id: mon
+    service_name: mon
+    service_type: mon
+    ---
+    placement:
+      hosts:
+      - oc0-controller-0
+    service_id: mgr
+    service_name: mgr
+    service_type: mgr
+    ---
+    data_devices:
+      all: true
+    placement:
+      hosts:
+      - oc0-ceph-0
+      - oc0-ceph-1
+    service_id: default_drive_group
+    service_name: osd.default_drive_group
+    service_type: osd
+    ''')
+
+    def setUp(self):
+        super(TestGenerateCephSpec, self).setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.paths = {}
+        for name in ('roles_data', 'baremetal_env', 'inventory'):
+            self.paths[name] = os.path.join(self.tmp, name + '.yaml')
+            with open(self.paths[name], 'w') as f:
+                f.write(getattr(self, name))
+        self.output = os.path.join(self.tmp, 'ceph_spec.yaml')
+
+    def _generate(self, **kwargs):
+        return utils.generate_ceph_spec(
+            self.output, self.paths['roles_data'],
+            self.paths['baremetal_env'], self.paths['inventory'], **kwargs)
+
+    def test_generate_ceph_spec(self):
+        specs = self._generate()
+        with open(self.output) as f:
+            self.assertEqual(self.expected, f.read())
+        self.assertEqual(list(yaml.safe_load_all(self.expected)), specs)
+        hosts = utils.get_host_groups_from_ceph_spec(self.output)
+        self.assertEqual(['oc0-controller-0'], hosts['mon'])
+        self.assertEqual(['oc0-ceph-0', 'oc0-ceph-1'], hosts['osd'])
+
+    def test_generate_ceph_spec_osd_spec_and_crush(self):
+        specs = self._generate(
+            osd_spec={'data_devices': {'paths': ['/dev/vdb']}},
+            crush_hierarchy={'oc0-ceph-0': {'rack': 'r0'}})
+        self.assertEqual({'rack': 'r0'}, specs[1]['location'])
+        self.assertNotIn('location', specs[2])
+        self.assertEqual({'paths': ['/dev/vdb']}, specs[-1]['data_devices'])
+
+    def test_generate_ceph_spec_invalid_crush(self):
+        self.assertRaises(RuntimeError, self._generate,
+                          crush_hierarchy={'oc0-ceph-0': {'shelf': 's0'}})
+
+    def test_generate_ceph_spec_missing_hostname_map(self):
+        with open(self.paths['baremetal_env'], 'w') as f:
+            f.write('parameter_defaults: {}\n')
+        self.assertRaises(RuntimeError, self._generate)
+
+    def test_get_ceph_roles_to_hosts_unknown_format(self):
+        roles_to_hosts = utils.get_ceph_roles_to_hosts(
+            self.paths['baremetal_env'], ['Controller', 'ObjectStorage'])
+        self.assertEqual({'Controller': ['oc0-controller-0'],
+                          'ObjectStorage': []}, roles_to_hosts)
+
+    @mock.patch('socket.gethostname', return_value='standalone')
+    def test_generate_standalone_ceph_spec(self, mock_hostname):
+        specs = utils.generate_standalone_ceph_spec(self.output,
+                                                    '192.168.24.1')
+        self.assertEqual(
+            {'service_type': 'host', 'addr': '192.168.24.1',
+             'hostname': 'standalone',
+             'labels': ['_admin', 'mgr', 'mon', 'osd']}, specs[0])
+        self.assertEqual(['osd', 'mon', 'mgr'],
+                         [spec['service_type'] for spec in specs[1:]])
+        for spec in specs[1:]:
+            self.assertEqual({'hosts': ['standalone']}, spec['placement'])
+
+
 class TestProcessCephDaemons(TestCase):
 
     def test_process_ceph_daemons(self):
@@ -2753,3 +3360,98 @@ class TestProcessCephDaemons(TestCase):
             found = utils.process_ceph_daemons(f.name)
 
         self.assertEqual(found, expected)
+
+
+class TestRollingBatches(base.TestCase):
+
+    INVENTORY = {
+        'Undercloud': {'hosts': {'undercloud': {}}},
+        'Controller': {'hosts': {'controller-0': {}, 'controller-1': {}}},
+        'Compute': {'hosts': {'compute-%d' % i: {} for i in range(5)}},
+        'overcloud': {'children': {'Controller': {}, 'Compute': {}}},
+    }
+
+    def setUp(self):
+        super(TestRollingBatches, self).setUp()
+        utils._INVENTORY_INDEX_CACHE.clear()
+        self.addCleanup(utils._INVENTORY_INDEX_CACHE.clear)
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+        self.inventory = os.path.join(self.tmpdir, 'inventory.yaml')
+        with open(self.inventory, 'w') as f:
+            yaml.safe_dump(self.INVENTORY, f, sort_keys=False)
+        self.state_file = os.path.join(self.tmpdir, 'state.json')
+
+    def test_plan_host_batches(self):
+        self.assertEqual(
+            [('Controller', ['controller-0', 'controller-1']),
+             ('Compute', ['compute-0', 'compute-1']),
+             ('Compute', ['compute-2', 'compute-3']),
+             ('Compute', ['compute-4'])],
+            utils.plan_host_batches(self.inventory, 'overcloud', 2))
+        self.assertEqual(
+            [('Compute', ['compute-4']),
+             ('ungrouped', ['undercloud'])],
+            utils.plan_host_batches(self.inventory,
+                                    'compute-4,undercloud', 2))
+
+    def test_run_rolling_batches(self):
+        batches = utils.plan_host_batches(self.inventory, 'Compute', 2)
+        run_batch = mock.Mock()
+        failed = utils.run_rolling_batches(batches, run_batch,
+                                           state_file=self.state_file,
+                                           parallel=2)
+        self.assertEqual(set(), failed)
+        self.assertEqual(
+            [['compute-0', 'compute-1'], ['compute-2', 'compute-3'],
+             ['compute-4']],
+            sorted(c[0][0] for c in run_batch.call_args_list))
+        self.assertFalse(os.path.exists(self.state_file))
+
+    def test_run_rolling_batches_resume(self):
+        batches = utils.plan_host_batches(self.inventory, 'Compute', 2)
+
+        def _fail_third(hosts, event_handler):
+            if hosts == ['compute-4']:
+                event_handler({'event': 'runner_on_failed',
+                               'event_data': {'host': 'compute-4'}})
+                raise RuntimeError('boom')
+
+        self.assertRaises(exceptions.DeploymentError,
+                          utils.run_rolling_batches, batches, _fail_third,
+                          state_file=self.state_file, signature='update')
+        with open(self.state_file) as f:
+            self.assertEqual([0, 1], json.load(f)['completed'])
+
+        run_batch = mock.Mock()
+        utils.run_rolling_batches(batches, run_batch,
+                                  state_file=self.state_file,
+                                  signature='update')
+        run_batch.assert_called_once_with(['compute-4'], mock.ANY)
+        self.assertFalse(os.path.exists(self.state_file))
+
+    def test_run_rolling_batches_max_fail_percentage(self):
+        batches = utils.plan_host_batches(self.inventory, 'overcloud', 1)
+
+        def _fail_controller_0(hosts, event_handler):
+            if hosts == ['controller-0']:
+                raise RuntimeError('boom')
+
+        failed = utils.run_rolling_batches(batches, _fail_controller_0,
+                                           state_file=self.state_file,
+                                           max_fail_percentage=20)
+        self.assertEqual({'controller-0'}, failed)
+        # the failed batch is retried by the next run
+        with open(self.state_file) as f:
+            self.assertEqual([1, 2, 3, 4, 5, 6], json.load(f)['completed'])
+
+    def test_run_rolling_batches_invalid_parallel(self):
+        batches = utils.plan_host_batches(self.inventory, 'Compute', 2)
+        with open(self.state_file, 'w') as f:
+            json.dump({'signature': None, 'batches': [], 'completed': []}, f)
+        run_batch = mock.Mock()
+        for parallel in (0, -1):
+            self.assertRaises(ValueError, utils.run_rolling_batches,
+                              batches, run_batch,
+                              state_file=self.state_file, parallel=parallel)
+        run_batch.assert_not_called()
+        self.assertTrue(os.path.exists(self.state_file))
@@ -13,11 +13,16 @@
 #   under the License.
 #
 
+import json
+import os
 from unittest import mock
 
+import fixtures
 from osc_lib.tests import utils
+import yaml
 
 from tripleoclient import constants
+from tripleoclient import exceptions
 from tripleoclient.tests import fakes
 from tripleoclient.v1 import overcloud_backup
 from unittest.mock import call
@@ -366,3 +371,151 @@ class TestOvercloudBackup(utils.TestCommand):
             'The inventory file',
             self.cmd.take_action,
             parsed_args)
+
+
+class TestOvercloudBackupWaves(utils.TestCommand):
+
+    def setUp(self):
+        super(TestOvercloudBackupWaves, self).setUp()
+
+        app_args = mock.Mock()
+        app_args.verbose_level = 1
+        self.app.options = fakes.FakeOptions()
+        self.cmd = overcloud_backup.BackupOvercloud(self.app, app_args)
+        self.tmp = self.useFixture(fixtures.TempDir()).path
+        self.inventory = os.path.join(self.tmp, 'inventory.yaml')
+        with open(self.inventory, 'w') as f:
+            yaml.safe_dump({
+                'overcloud': {'children': {
+                    'Controller': {'hosts': {
+                        'controller-0': {'ansible_host': '192.168.24.10'},
+                        'controller-1': {'ansible_host': '192.168.24.11'}}},
+                    'Compute': {'hosts': {
+                        'compute-0': {}, 'compute-1': {}, 'compute-2': {}}},
+                    'CephStorage': {'hosts': {
+                        'ceph-0': {}, 'ceph-1': {}}},
+                }},
+                'ceph_mon': {'hosts': {'ceph-0': {}}},
+            }, f)
+        self.manifest = os.path.join(self.tmp, 'manifest.json')
+        self.backups = os.path.join(self.tmp, 'backups')
+        os.makedirs(os.path.join(self.backups, 'controller-0'))
+
+    def _take_action(self, *args):
+        arglist = ['--inventory', self.inventory,
+                   '--manifest', self.manifest,
+                   '--extra-vars',
+                   json.dumps({'tripleo_backup_and_restore_shared_storage_'
+                               'folder': self.backups})] + list(args)
+        parsed_args = self.check_parser(self.cmd, arglist, [])
+        self.cmd.take_action(parsed_args)
+
+    def _load_manifest(self):
+        with open(self.manifest) as f:
+            return json.load(f)
+
+    @mock.patch('tripleoclient.utils.run_ansible_playbook',
+                autospec=True)
+    def test_overcloud_backup_waves(self, mock_playbook):
+        def _backup(**kwargs):
+            if kwargs['limit_hosts'] == 'controller-0':
+                with open(os.path.join(self.backups, 'controller-0',
+                                       'backup.tar.gz'), 'w') as f:
+                    f.write('x' * 42)
+        mock_playbook.side_effect = _backup
+
+        self._take_action('--wave', 'Controller', '--wave', 'Compute:2')
+
+        self.assertEqual(5, mock_playbook.call_count)
+        hosts = [c[1]['limit_hosts'] for c in mock_playbook.call_args_list]
+        self.assertEqual(['controller-0', 'controller-1'], hosts[:2])
+        self.assertEqual(['compute-0', 'compute-1', 'compute-2'],
+                         sorted(hosts[2:]))
+        mock_playbook.assert_any_call(
+            playbook='cli-overcloud-backup.yaml',
+            inventory=mock.ANY,
+            workdir=mock.ANY,
+            playbook_dir=constants.ANSIBLE_TRIPLEO_PLAYBOOKS,
+            tags='bar_create_recover_image',
+            skip_tags=None,
+            limit_hosts='controller-1',
+            verbosity=3,
+            extra_vars={
+                'tripleo_backup_and_restore_shared_storage_folder':
+                    self.backups,
+                'tripleo_controller_group_name':
+                    'tripleo_backup_controller_1'},
+            event_handler=mock.ANY)
+        # the wave inventory only lives during the backup
+        self.assertFalse(
+            os.path.exists(mock_playbook.call_args[1]['inventory']))
+
+        manifest = self._load_manifest()
+        self.assertEqual([{'group': 'Controller', 'concurrency': 1,
+                           'hosts': ['controller-0', 'controller-1']},
+                          {'group': 'Compute', 'concurrency': 2,
+                           'hosts': ['compute-0', 'compute-1', 'compute-2']}],
+                         manifest['waves'])
+        nodes = {n['host']: n for n in manifest['nodes']}
+        self.assertEqual(5, len(nodes))
+        self.assertEqual({'success'}, {n['status'] for n in nodes.values()})
+        self.assertEqual(42, nodes['controller-0']['archive_size'])
+        self.assertIsNone(nodes['compute-0']['archive_size'])
+        self.assertEqual('Compute', nodes['compute-0']['group'])
+
+    @mock.patch('tripleoclient.utils.run_ansible_playbook',
+                autospec=True)
+    def test_overcloud_backup_waves_host_inventory(self, mock_playbook):
+        def _backup(**kwargs):
+            with open(kwargs['inventory']) as f:
+                inventory = yaml.safe_load(f)
+            group = kwargs['extra_vars']['tripleo_controller_group_name']
+            self.assertEqual({'hosts': {kwargs['limit_hosts']: {}}},
+                             inventory[group])
+            self.assertIn('overcloud', inventory)
+        mock_playbook.side_effect = _backup
+
+        self._take_action('--wave', 'Compute:3')
+        self.assertEqual(3, mock_playbook.call_count)
+
+    @mock.patch('tripleoclient.utils.run_ansible_playbook',
+                autospec=True)
+    def test_overcloud_backup_waves_failure(self, mock_playbook):
+        def _backup(**kwargs):
+            if kwargs['limit_hosts'] == 'controller-0':
+                raise RuntimeError('ReaR failed')
+        mock_playbook.side_effect = _backup
+
+        self.assertRaises(exceptions.DeploymentError, self._take_action,
+                          '--wave', 'Controller', '--wave', 'Compute:2')
+        # the failure stops the wave, the next waves are not started
+        self.assertEqual(1, mock_playbook.call_count)
+        self.assertEqual([('controller-0', 'failed')],
+                         [(n['host'], n['status'])
+                          for n in self._load_manifest()['nodes']])
+
+    def test_overcloud_backup_waves_unknown_group(self):
+        self.assertRaisesRegex(RuntimeError, 'no host in the Networker',
+                               self._take_action, '--wave', 'Networker')
+
+    def test_overcloud_backup_invalid_wave(self):
+        for wave in ('Compute:0', 'Compute:many', ':2'):
+            self.assertRaises(utils.ParserException, self.check_parser,
+                              self.cmd, ['--wave', wave], [])
+
+    @mock.patch('tripleoclient.utils.run_ansible_playbook',
+                autospec=True)
+    def test_overcloud_backup_waves_quorum(self, mock_playbook):
+        for wave in ('Controller:2', 'overcloud:3', 'CephStorage:2',
+                     'controller-1:2'):
+            self.assertRaisesRegex(RuntimeError, 'quorum',
+                                   self._take_action, '--wave', 'Compute:3',
+                                   '--wave', wave)
+        mock_playbook.assert_not_called()
+        self.assertFalse(os.path.exists(self.manifest))
+
+        # the controller group is the one the backup playbook targets
+        self._take_action(
+            '--wave', 'Controller:2', '--extra-vars',
+            json.dumps({'tripleo_controller_group_name': 'Compute'}))
+        self.assertEqual(2, mock_playbook.call_count)
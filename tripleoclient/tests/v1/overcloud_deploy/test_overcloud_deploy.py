@@ -1432,7 +1432,8 @@ class TestDeployOvercloud(fakes.TestDeployOvercloud):
                        deployment_timeout=448,  # 451 - 3, total time left
                        in_flight_validations=False, limit_hosts=None,
                        skip_tags=None, tags=None, timeout=42,
-                       verbosity=3, forks=None, denyed_hostnames=None)],
+                       verbosity=3, forks=None, denyed_hostnames=None,
+                       session=mock.ANY)],
             fixture.mock_config_download.mock_calls)
         fixture.mock_config_download.assert_called()
         mock_copy.assert_called_once()
@@ -1490,7 +1491,7 @@ class TestDeployOvercloud(fakes.TestDeployOvercloud):
             'config-download/overcloud/deploy_steps_playbook.yaml')
         self.assertIn(
             [mock.call(
-                ansible_cfg=None, ansible_timeout=42,
+                ansible_cfg=None, ansible_env=mock.ANY, ansible_timeout=42,
                 extra_env_variables={'ANSIBLE_BECOME': True}, extra_vars=None,
                 inventory=mock.ANY, key=mock.ANY, limit_hosts=None,
                 playbook=playbook, playbook_dir=mock.ANY,
@@ -1648,7 +1649,8 @@ class TestDeployOvercloud(fakes.TestDeployOvercloud):
             playbook='cli-overcloud-network-provision.yaml',
             playbook_dir='/usr/share/ansible/tripleo-playbooks',
             verbosity=3,
-            workdir=mock.ANY)
+            workdir=mock.ANY,
+            ansible_env=mock.ANY)
 
     def test__provision_virtual_ips(self):
         self.cmd.working_dir = self.tmp_dir.join('working_dir')
@@ -1707,7 +1709,23 @@ class TestDeployOvercloud(fakes.TestDeployOvercloud):
             playbook='cli-overcloud-network-vip-provision.yaml',
             playbook_dir='/usr/share/ansible/tripleo-playbooks',
             verbosity=3,
-            workdir=mock.ANY)
+            workdir=mock.ANY,
+            ansible_env=mock.ANY)
+
+    def test_write_trace_for_archive(self):
+        tracer = mock.Mock()
+        tracer.export.side_effect = lambda path: path
+        parsed_args = mock.Mock(stack='overcloud', dry_run=False)
+        self.cmd.working_dir = self.tmp_dir.path
+        self.cmd.app.stdout = StringIO()
+        self.cmd._write_trace(tracer, parsed_args, summary=False)
+        tracer.export.assert_called_once_with(os.path.join(
+            self.tmp_dir.path, 'tripleo-overcloud-deploy-trace.json'))
+        tracer.summary.assert_not_called()
+        self.assertEqual('', self.cmd.app.stdout.getvalue())
+
+        self.cmd._write_trace(None, parsed_args, summary=False)
+        self.assertEqual(1, tracer.export.call_count)
 
     def test_check_limit_warning(self):
         mock_warning = mock.MagicMock()
@@ -32,6 +32,7 @@ from tripleoclient import exceptions
 from tripleoclient.tests.v1.overcloud_node import fakes
 from tripleoclient.v1 import overcloud_node
 from tripleoclient.v2 import overcloud_node as overcloud_node_v2
+from tripleoclient.workflows import tripleo_baremetal as tb
 
 
 class TestDeleteNode(fakes.TestDeleteNode):
@@ -59,12 +60,13 @@ class TestDeleteNode(fakes.TestDeleteNode):
         self.addCleanup(wait_stack.stop)
         self.app.client_manager.compute.servers.get.return_value = None
 
+    @mock.patch('tripleoclient.fact_cache.evict_hosts', autospec=True)
     @mock.patch('heatclient.common.event_utils.get_events',
                 autospec=True)
     @mock.patch('tripleoclient.utils.run_ansible_playbook',
                 autospec=True)
     def test_node_delete(self, mock_playbook,
-                         mock_get_events):
+                         mock_get_events, mock_evict):
         argslist = ['instance1', 'instance2', '--stack', 'overcast',
                     '--timeout', '90', '--yes']
         verifylist = [
@@ -73,6 +75,7 @@ class TestDeleteNode(fakes.TestDeleteNode):
         ]
         parsed_args = self.check_parser(self.cmd, argslist, verifylist)
         self.cmd.take_action(parsed_args)
+        mock_evict.assert_called_once_with(['instance1', 'instance2'])
 
     @mock.patch('tripleoclient.utils.prompt_user_for_confirmation',
                 return_value=False)
@@ -121,6 +124,8 @@ class TestDeleteNode(fakes.TestDeleteNode):
         parsed_args = self.check_parser(self.cmd, arglist, verifylist)
         self.cmd.take_action(parsed_args)
 
+    @mock.patch('tripleoclient.workflows.tripleo_baremetal.'
+                'TripleoUnprovision', autospec=True)
     @mock.patch('tripleoclient.utils.get_key')
     @mock.patch('tripleoclient.utils.get_default_working_dir')
     @mock.patch('heatclient.common.event_utils.get_events',
@@ -133,7 +138,9 @@ class TestDeleteNode(fakes.TestDeleteNode):
                                               mock_playbook,
                                               mock_get_events,
                                               mock_dir,
-                                              mock_key):
+                                              mock_key,
+                                              mock_unprovision):
+        unprovision = mock_unprovision.return_value
 
         bm_yaml = [{
             'name': 'Compute',
@@ -251,35 +258,72 @@ class TestDeleteNode(fakes.TestDeleteNode):
                     "ANSIBLE_PRIVATE_KEY_FILE":
                     "/home/stack/.ssh/id_rsa_tripleo"
                 }
-            ),
-            mock.call(
-                inventory='localhost,',
-                playbook='cli-overcloud-node-unprovision.yaml',
-                verbosity=mock.ANY,
-                workdir=mock.ANY,
-                playbook_dir='/usr/share/ansible/tripleo-playbooks',
-                extra_vars={
-                    'stack_name': 'overcast',
-                    'baremetal_deployment': [{
-                        'count': 5,
-                        'instances': [{
-                            'hostname': 'overcast-compute-0',
-                            'name': 'baremetal-2',
-                            'provisioned': False
-                        }], 'name': 'Compute'
-                    }, {
-                        'count': 2,
-                        'instances': [{
-                            'hostname': 'overcast-controller-1',
-                            'name': 'baremetal-1',
-                            'provisioned': False
-                        }],
-                        'name': 'Controller'
-                    }],
-                    'prompt': False
-                },
             )
         ])
+        self.assertEqual(2, mock_playbook.call_count)
+        plan = [
+            {
+                'hostname': 'overcast-controller-1',
+                'name': 'baremetal-1',
+                'id': 'aaaa'
+            }, {
+                'hostname': 'overcast-compute-0',
+                'name': 'baremetal-2',
+                'id': 'bbbb'
+            }
+        ]
+        mock_unprovision.assert_called_once_with(
+            'overcast', concurrency=20, timeout=90 * 60,
+            manage_network_ports=False)
+        unprovision.record_plan.assert_called_once_with(plan)
+        unprovision.unprovision.assert_called_once_with(plan)
+
+    @mock.patch('tripleoclient.workflows.tripleo_baremetal.'
+                'TripleoUnprovision', autospec=True)
+    @mock.patch('tripleoclient.utils.get_key')
+    @mock.patch('tripleoclient.utils.get_default_working_dir')
+    @mock.patch('tripleoclient.utils.run_ansible_playbook',
+                autospec=True)
+    @mock.patch('tripleoclient.utils.tempfile')
+    def test_node_delete_baremetal_deployment_cached_plan(
+            self, mock_tempfile, mock_playbook, mock_dir, mock_key,
+            mock_unprovision):
+        unprovision = mock_unprovision.return_value
+        plan = [{'hostname': 'overcast-compute-0',
+                 'name': 'baremetal-2',
+                 'id': 'bbbb'}]
+
+        tmp = tempfile.mkdtemp()
+        mock_tempfile.mkdtemp.side_effect = [tmp, tempfile.mkdtemp()]
+        mock_dir.return_value = "/home/stack/overcloud-deploy"
+        with open(os.path.join(tmp, 'unprovision_confirm.json'), 'w') as f:
+            f.write(json.dumps({'instances': plan}))
+
+        with tempfile.NamedTemporaryFile(mode='w') as inp:
+            yaml.dump([{'name': 'Compute', 'count': 0}], inp,
+                      encoding='utf-8')
+            inp.flush()
+            argslist = ['--baremetal-deployment', inp.name, '--stack',
+                        'overcast', '--concurrency', '4', '--network-ports',
+                        '--yes']
+            verifylist = [
+                ('stack', 'overcast'),
+                ('concurrency', 4),
+                ('network_ports', True),
+                ('baremetal_deployment', inp.name)
+            ]
+            parsed_args = self.check_parser(self.cmd, argslist, verifylist)
+            self.cmd.take_action(parsed_args)
+
+        mock_unprovision.assert_called_once_with(
+            'overcast', concurrency=4, timeout=240 * 60,
+            manage_network_ports=True)
+        unprovision.record_plan.assert_called_once_with(plan)
+        unprovision.unprovision.assert_called_once_with(plan)
+        # Planning and the scale playbook only, the plan is not recomputed
+        self.assertEqual(
+            ['cli-overcloud-node-unprovision.yaml', 'scale_playbook.yaml'],
+            [c[1]['playbook'] for c in mock_playbook.call_args_list])
 
     @mock.patch('tripleoclient.utils.run_ansible_playbook',
                 autospec=True)
@@ -410,6 +454,7 @@ class TestProvideNode(fakes.TestOvercloudNode):
                                           mock_bm):
 
         mock_conn.return_value = mock_bm
+        mock_connect.return_value = mock_bm
         mock_bm.baremetal = mock_bm
 
         mock_bm.baremetal.nodes.side_effect = [
@@ -431,6 +476,7 @@ class TestProvideNode(fakes.TestOvercloudNode):
         node_id = 'node_uuid1'
 
         mock_conn.return_value = mock_bm
+        mock_connect.return_value = mock_bm
         mock_bm.baremetal = mock_bm
         mock_bm.baremetal.get_node.side_effect = [
             self.fake_baremetal_node]
@@ -450,6 +496,7 @@ class TestProvideNode(fakes.TestOvercloudNode):
         verifylist = [('node_uuids', [node_id1, node_id2])]
 
         mock_conn.return_value = mock_bm
+        mock_connect.return_value = mock_bm
         mock_bm.baremetal = mock_bm
         mock_bm.baremetal.get_node.side_effect = [
             self.fake_baremetal_node,
@@ -508,6 +555,7 @@ class TestCleanNode(fakes.TestOvercloudNode):
                                                         mock_conf,
                                                         mock_bm):
         mock_conn.return_value = mock_bm
+        mock_connect.return_value = mock_bm
         mock_bm.baremetal = mock_bm
         mock_bm.baremetal.nodes.return_value = iter([
             self.fake_baremetal_node
@@ -523,6 +571,7 @@ class TestCleanNode(fakes.TestOvercloudNode):
                                                      mock_connect, mock_conf,
                                                      mock_bm):
         mock_conn.return_value = mock_bm
+        mock_connect.return_value = mock_bm
         mock_bm.baremetal = mock_bm
         mock_bm.baremetal.nodes.side_effect = [
             iter([self.fake_baremetal_node]),
@@ -542,6 +591,7 @@ class TestCleanNode(fakes.TestOvercloudNode):
                                          mock_connect, mock_conf,
                                          mock_bm):
         mock_conn.return_value = mock_bm
+        mock_connect.return_value = mock_bm
         mock_bm.baremetal = mock_bm
         nodes = ['node_uuid1', 'node_uuid2']
         parsed_args = self.check_parser(self.cmd,
@@ -555,6 +605,7 @@ class TestCleanNode(fakes.TestOvercloudNode):
                                       mock_connect, mock_conf,
                                       mock_bm):
         mock_conn.return_value = mock_bm
+        mock_connect.return_value = mock_bm
         mock_bm.baremetal = mock_bm
 
         nodes = ['node_uuid1', 'node_uuid2']
@@ -749,6 +800,7 @@ class TestConfigureNode(fakes.TestOvercloudNode):
                                             mock_connect, mock_conf,
                                             mock_bm):
         mock_conn.return_value = mock_bm
+        mock_connect.return_value = mock_bm
         mock_bm.baremetal = mock_bm
         mock_bm.baremetal.nodes.side_effect = [
             iter([self.fake_baremetal_node]),
@@ -762,6 +814,7 @@ class TestConfigureNode(fakes.TestOvercloudNode):
                                        mock_connect, mock_conf,
                                        mock_bm):
         mock_conn.return_value = mock_bm
+        mock_connect.return_value = mock_bm
         mock_bm.baremetal = mock_bm
         argslist = ['node_uuid1', 'node_uuid2']
         verifylist = [('node_uuids', ['node_uuid1', 'node_uuid2'])]
@@ -790,6 +843,7 @@ class TestConfigureNode(fakes.TestOvercloudNode):
                                       mock_connect, mock_conf,
                                       mock_bm):
         mock_conn.return_value = mock_bm
+        mock_connect.return_value = mock_bm
         mock_bm.baremetal = mock_bm
         mock_bm.baremetal_introspection = mock_bm
 
@@ -815,6 +869,7 @@ class TestConfigureNode(fakes.TestOvercloudNode):
                                             mock_connect, mock_conf,
                                             mock_bm):
         mock_conn.return_value = mock_bm
+        mock_connect.return_value = mock_bm
         mock_bm.baremetal = mock_bm
         mock_bm.baremetal.nodes.side_effect = [
             iter([self.fake_baremetal_node]),
@@ -829,6 +884,7 @@ class TestConfigureNode(fakes.TestOvercloudNode):
                                    mock_connect, mock_conf,
                                    mock_bm):
         mock_conn.return_value = mock_bm
+        mock_connect.return_value = mock_bm
         mock_bm.baremetal = mock_bm
         mock_bm.baremetal_introspection = mock_bm
 
@@ -851,6 +907,25 @@ class TestConfigureNode(fakes.TestOvercloudNode):
         parsed_args = self.check_parser(self.cmd, argslist, verifylist)
         self.cmd.take_action(parsed_args)
 
+    def test_configure_dry_run(self, mock_conn, mock_connect, mock_conf,
+                               mock_bm):
+        argslist = ['node_id', '--dry-run', '--concurrency', '5']
+        verifylist = [('node_uuids', ['node_id']),
+                      ('dry_run', True),
+                      ('concurrency', 5)]
+
+        parsed_args = self.check_parser(self.cmd, argslist, verifylist)
+        with mock.patch.object(tb, 'TripleoConfigure',
+                               autospec=True) as mock_configure:
+            self.cmd.take_action(parsed_args)
+        mock_configure.assert_called_once_with(
+            kernel_name=mock.ANY, ramdisk_name=mock.ANY,
+            instance_boot_option=None, boot_mode=None, root_device=None,
+            root_device_minimum_size=4, overwrite_root_device_hints=False,
+            concurrency=5, dry_run=True)
+        mock_configure.return_value.configure.assert_called_once_with(
+            node_uuids=['node_id'])
+
     @mock.patch('tripleoclient.workflows.baremetal.'
                 '_apply_root_device_strategy')
     def test_configure_specified_node_with_all_arguments(
@@ -858,6 +933,7 @@ class TestConfigureNode(fakes.TestOvercloudNode):
             mock_connect, mock_conf,
             mock_bm):
         mock_conn.return_value = mock_bm
+        mock_connect.return_value = mock_bm
         mock_bm.baremetal = mock_bm
         mock_bm.baremetal_introspection = mock_bm
 
@@ -954,6 +1030,7 @@ class TestDiscoverNode(fakes.TestOvercloudNode):
                               mock_connect, mock_conf,
                               mock_bm):
         mock_conn.return_value = mock_bm
+        mock_connect.return_value = mock_bm
         mock_bm.baremetal = mock_bm
         mock_bm.baremetal.get_node.side_effect = [
             self.fake_baremetal_node,
@@ -979,7 +1056,20 @@ class TestDiscoverNode(fakes.TestOvercloudNode):
                       ('instance_boot_option', 'netboot')]
 
         parsed_args = self.check_parser(self.cmd, argslist, verifylist)
-        self.cmd.take_action(parsed_args)
+        # The pre-introspection validations are enabled in hiera
+        mock_subproc.return_value = ('true\n', '')
+        with mock.patch(
+                'tripleoclient.workflows.baremetal.ValidationActions',
+                autospec=True) as mock_validations, \
+                mock.patch.object(tb, 'TripleoIntrospect',
+                                  autospec=True) as mock_introspect:
+            self.cmd.take_action(parsed_args)
+        mock_validations.return_value.run_validations.assert_called_once_with(
+            inventory='undercloud', group=['pre-introspection'],
+            validations_dir=mock.ANY)
+        mock_introspect.assert_called_once_with(
+            concurrency=10, node_timeout=1200, max_retries=1,
+            retry_timeout=120, verbosity=0)
 
 
 class TestExtractProvisionedNode(test_utils.TestCommand):
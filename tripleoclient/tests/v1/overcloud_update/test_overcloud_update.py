@@ -15,6 +15,7 @@
 
 from unittest import mock
 
+from osc_lib import exceptions as oscexc
 from osc_lib.tests.utils import ParserException
 from tripleoclient import constants
 from tripleoclient import exceptions
@@ -136,3 +137,64 @@ class TestOvercloudUpdateRun(fakes.TestOvercloudUpdateRun):
         ]
         self.assertRaises(ParserException, lambda: self.check_parser(
             self.cmd, argslist, verifylist))
+
+    @mock.patch('tripleoclient.utils.run_rolling_batches', autospec=True)
+    @mock.patch('tripleoclient.utils.plan_host_batches', autospec=True)
+    @mock.patch('tripleoclient.utils.get_default_working_dir',
+                return_value='/home/fake/overcloud-deploy/overcloud')
+    @mock.patch('tripleoclient.utils.get_key', return_value='/fake/key')
+    @mock.patch('tripleoclient.utils.ensure_run_as_normal_user')
+    @mock.patch('tripleoclient.utils.run_ansible_playbook', autospec=True)
+    def test_update_batches(self, mock_run, mock_usercheck, mock_key,
+                            mock_wd, mock_plan, mock_rolling):
+        argslist = ['--limit', 'Compute', '--yes', '--batch-size', '10',
+                    '--parallel-batches', '2', '--max-fail-percentage', '5']
+        verifylist = [
+            ('limit', 'Compute'),
+            ('batch_size', 10),
+            ('parallel_batches', 2),
+            ('max_fail_percentage', 5),
+        ]
+        parsed_args = self.check_parser(self.cmd, argslist, verifylist)
+        mock_plan.return_value = [('Compute', ['compute-0', 'compute-1'])]
+        self.cmd.take_action(parsed_args)
+
+        ansible_dir = '/home/fake/overcloud-deploy/overcloud/' \
+            'config-download/overcloud'
+        mock_plan.assert_called_once_with(
+            ansible_dir + '/tripleo-ansible-inventory.yaml', 'Compute', 10,
+            stack='overcloud')
+        mock_rolling.assert_called_once_with(
+            mock_plan.return_value, mock.ANY,
+            state_file='/home/fake/overcloud-deploy/overcloud/'
+                       'tripleo-overcloud-update-run-state.json',
+            signature={'playbook': constants.MINOR_UPDATE_PLAYBOOKS,
+                       'tags': None, 'skip_tags': None},
+            parallel=2, max_fail_percentage=5, logger=self.cmd.log)
+        mock_run.assert_not_called()
+
+        # each batch limits the playbook run to its hosts
+        handler = mock.Mock()
+        run_batch = mock_rolling.call_args[0][1]
+        with mock.patch('tripleoclient.utils.TempDirs', autospec=True):
+            run_batch(['compute-0', 'compute-1'], handler)
+        self.assertEqual('compute-0,compute-1',
+                         mock_run.call_args[1]['limit_hosts'])
+        self.assertIs(handler, mock_run.call_args[1]['event_handler'])
+
+    @mock.patch('tripleoclient.utils.run_rolling_batches', autospec=True)
+    @mock.patch('tripleoclient.utils.ensure_run_as_normal_user')
+    @mock.patch('tripleoclient.utils.run_ansible_playbook', autospec=True)
+    def test_update_batches_invalid_options(self, mock_run, mock_usercheck,
+                                            mock_rolling):
+        for option, value in (('--parallel-batches', '0'),
+                              ('--parallel-batches', '-2'),
+                              ('--max-fail-percentage', '-1'),
+                              ('--max-fail-percentage', '101')):
+            argslist = ['--limit', 'Compute', '--yes', '--batch-size', '10',
+                        option, value]
+            parsed_args = self.check_parser(self.cmd, argslist, [])
+            self.assertRaises(oscexc.CommandError,
+                              self.cmd.take_action, parsed_args)
+        mock_run.assert_not_called()
+        mock_rolling.assert_not_called()
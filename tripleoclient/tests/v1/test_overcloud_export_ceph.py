@@ -65,3 +65,29 @@ class TestOvercloudExportCeph(utils.TestCommand):
                             'overcloud-deploy', 'dcn0', 'config-download')
         mock_export_ceph.assert_called_once_with('dcn0', 'openstack', path)
         self.assertEqual(data, mock_safe_dump.call_args[0][0])
+
+    @mock.patch('os.path.exists')
+    @mock.patch('yaml.safe_dump')
+    @mock.patch('tripleoclient.export.export_cephs')
+    def test_export_ceph_stacks(self, mock_export_cephs,
+                                mock_safe_dump,
+                                mock_exists):
+        argslist = ['--stack', 'dcn0,dcn1', '--config-download-dir', '/foo',
+                    '--concurrency', '2']
+        verifylist = [('stack', 'dcn0,dcn1'), ('concurrency', 2)]
+        parsed_args = self.check_parser(self.cmd, argslist, verifylist)
+        mock_exists.return_value = False
+        mock_export_cephs.return_value = [{'cluster': 'dcn0'},
+                                          {'cluster': 'dcn1'}]
+
+        with mock.patch('builtins.open', self.mock_open):
+            self.cmd.take_action(parsed_args)
+        mock_export_cephs.assert_called_once_with(
+            ['dcn0', 'dcn1'], 'openstack', ['/foo', '/foo'], max_workers=2,
+            working_dirs=[
+                os.path.join(os.path.expanduser('~'), 'overcloud-deploy',
+                             stack) for stack in ('dcn0', 'dcn1')])
+        self.assertEqual(
+            {'parameter_defaults': {'CephExternalMultiConfig': [
+                {'cluster': 'dcn0'}, {'cluster': 'dcn1'}]}},
+            mock_safe_dump.call_args[0][0])
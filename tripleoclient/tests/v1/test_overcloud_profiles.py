@@ -144,7 +144,10 @@ class TestListProfiles(test_plugin.TestPluginV1):
              ('uuid3', self.nodes[2].name, 'available', 'compute',
               'compute, control'),
              ('uuid4', self.nodes[3].name, 'available', 'compute', '')],
-            result[1])
+            list(result[1]))
+        self.bm_client.node.list.assert_called_once_with(
+            maintenance=False, fields=overcloud_profiles.NODE_FIELDS,
+            limit=overcloud_profiles.PAGE_SIZE, marker=None)
 
     def test_all(self):
         parsed_args = self.check_parser(self.cmd, ['--all'], [('all', True)])
@@ -163,4 +166,21 @@ class TestListProfiles(test_plugin.TestPluginV1):
               'No hypervisor record'),
              ('uuid7', self.nodes[6].name, 'active', None, '',
               'Maintenance')],
-            result[1])
+            list(result[1]))
+
+    @mock.patch.object(overcloud_profiles, 'PAGE_SIZE', 3)
+    def test_list_paged(self):
+        self.bm_client.node.list.side_effect = [
+            self.nodes[:3], self.nodes[3:6], self.nodes[6:]]
+        parsed_args = self.check_parser(self.cmd, ['--all'], [('all', True)])
+        result = self.cmd.take_action(parsed_args)
+        self.bm_client.node.list.assert_not_called()
+        self.assertEqual(['uuid%d' % i for i in range(1, 8)],
+                         [row[0] for row in result[1]])
+        self.bm_client.node.list.assert_has_calls([
+            mock.call(maintenance=None, fields=overcloud_profiles.NODE_FIELDS,
+                      limit=3, marker=None),
+            mock.call(maintenance=None, fields=overcloud_profiles.NODE_FIELDS,
+                      limit=3, marker='uuid3'),
+            mock.call(maintenance=None, fields=overcloud_profiles.NODE_FIELDS,
+                      limit=3, marker='uuid6')])
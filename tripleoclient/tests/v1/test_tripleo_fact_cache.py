@@ -0,0 +1,80 @@
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+#
+
+import os
+from unittest import mock
+
+from osc_lib import exceptions as oscexc
+import yaml
+
+from tripleoclient.tests import base
+from tripleoclient.v1 import tripleo_fact_cache
+
+
+class TestWarmFactCache(base.TestCommand):
+
+    def setUp(self):
+        super(TestWarmFactCache, self).setUp()
+        self.cmd = tripleo_fact_cache.WarmFactCache(self.app, None)
+        self.cmd.app_args = mock.Mock(verbose_level=1)
+        self.inventory = os.path.join(self.temp_homedir, 'inventory.yaml')
+        with open(self.inventory, 'w') as f:
+            f.write('{}')
+
+    @mock.patch('tripleoclient.utils.get_key', return_value='/key')
+    @mock.patch('tripleoclient.utils.run_ansible_playbook', autospec=True)
+    def test_warm(self, mock_playbook, mock_key):
+        def _check_playbook(playbook, **kwargs):
+            with open(playbook) as f:
+                self.assertEqual(tripleo_fact_cache.WARM_PLAYBOOK,
+                                 yaml.safe_load(f))
+        mock_playbook.side_effect = _check_playbook
+
+        parsed_args = self.check_parser(
+            self.cmd,
+            ['--inventory', self.inventory, '--limit', 'Compute',
+             '--forks', '50'],
+            [('inventory', self.inventory), ('limit_hosts', 'Compute'),
+             ('forks', 50), ('refresh', False)])
+        self.cmd.take_action(parsed_args)
+
+        mock_playbook.assert_called_once_with(
+            playbook=mock.ANY,
+            inventory=self.inventory,
+            workdir=mock.ANY,
+            ssh_user='tripleo-admin',
+            key='/key',
+            limit_hosts='Compute',
+            forks=50,
+            verbosity=mock.ANY,
+            gathering_policy='smart',
+            reproduce_command=False)
+        mock_key.assert_called_once_with('overcloud')
+
+    @mock.patch('tripleoclient.utils.get_key', return_value='/key')
+    @mock.patch('tripleoclient.utils.run_ansible_playbook', autospec=True)
+    def test_warm_refresh(self, mock_playbook, mock_key):
+        parsed_args = self.check_parser(
+            self.cmd, ['--inventory', self.inventory, '--refresh'],
+            [('refresh', True)])
+        self.cmd.take_action(parsed_args)
+        self.assertEqual('implicit',
+                         mock_playbook.call_args[1]['gathering_policy'])
+
+    @mock.patch('tripleoclient.utils.run_ansible_playbook', autospec=True)
+    def test_warm_missing_inventory(self, mock_playbook):
+        parsed_args = self.check_parser(self.cmd, ['--stack', 'foo'],
+                                        [('stack', 'foo')])
+        self.assertRaises(oscexc.CommandError, self.cmd.take_action,
+                          parsed_args)
+        mock_playbook.assert_not_called()
@@ -13,6 +13,8 @@
 #   under the License.
 #
 
+import fixtures
+import os
 from unittest import mock
 
 from osc_lib import exceptions as osc_lib_exc
@@ -317,31 +319,51 @@ class TestOvercloudCephSpec(fakes.FakePlaybookExecution):
         self.cmd = overcloud_ceph.OvercloudCephSpec(self.app,
                                                     app_args)
 
-    @mock.patch('tripleoclient.utils.TempDirs', autospect=True)
-    @mock.patch('os.path.abspath', autospect=True)
-    @mock.patch('os.path.exists', autospect=True)
-    @mock.patch('tripleoclient.utils.run_ansible_playbook', autospec=True)
-    def test_overcloud_ceph_spec(self, mock_playbook, mock_abspath,
-                                 mock_path_exists, mock_tempdirs):
-        arglist = ['deployed-metal.yaml', '--yes',
+    @mock.patch('tripleoclient.utils.generate_ceph_spec', autospec=True)
+    def test_overcloud_ceph_spec(self, mock_generate):
+        tmp = self.useFixture(fixtures.TempDir()).path
+        with open(os.path.join(tmp, 'deployed-metal.yaml'), 'w') as f:
+            f.write('parameter_defaults: {}\n')
+        with open(os.path.join(tmp, 'roles_data.yaml'), 'w') as f:
+            f.write('[]\n')
+        with open(os.path.join(tmp, 'osd_spec.yaml'), 'w') as f:
+            f.write('data_devices:\n  paths: [/dev/vdb]\n')
+        with open(os.path.join(tmp, 'tripleo-ansible-inventory.yaml'),
+                  'w') as f:
+            f.write('{}\n')
+        mock_generate.return_value = []
+        arglist = [os.path.join(tmp, 'deployed-metal.yaml'), '--yes',
                    '--stack', 'overcloud',
-                   '--roles-data', 'roles_data.yaml',
-                   '--osd-spec', 'osd_spec.yaml',
-                   '--output', 'ceph_spec.yaml']
+                   '--working-dir', tmp,
+                   '--roles-data', os.path.join(tmp, 'roles_data.yaml'),
+                   '--osd-spec', os.path.join(tmp, 'osd_spec.yaml'),
+                   '--output', os.path.join(tmp, 'ceph_spec.yaml')]
         parsed_args = self.check_parser(self.cmd, arglist, [])
         self.cmd.take_action(parsed_args)
-        mock_playbook.assert_called_once_with(
-            playbook='cli-deployed-ceph.yaml',
-            inventory=mock.ANY,
-            workdir=mock.ANY,
-            playbook_dir=mock.ANY,
-            verbosity=3,
-            tags='ceph_spec',
-            reproduce_command=False,
-            extra_vars={
-                "baremetal_deployed_path": mock.ANY,
-                'tripleo_roles_path': mock.ANY,
-                'osd_spec_path': mock.ANY,
-                'ceph_spec_path': mock.ANY,
-            }
-        )
+        mock_generate.assert_called_once_with(
+            os.path.join(tmp, 'ceph_spec.yaml'),
+            os.path.join(tmp, 'roles_data.yaml'),
+            os.path.join(tmp, 'deployed-metal.yaml'),
+            os.path.join(tmp, 'tripleo-ansible-inventory.yaml'),
+            osd_spec={'data_devices': {'paths': ['/dev/vdb']}},
+            crush_hierarchy=None)
+
+    @mock.patch('tripleoclient.utils.generate_standalone_ceph_spec',
+                autospec=True)
+    @mock.patch('tripleoclient.utils.get_hostname', return_value='host0')
+    def test_overcloud_ceph_spec_standalone(self, mock_hostname,
+                                            mock_generate):
+        tmp = self.useFixture(fixtures.TempDir()).path
+        mock_generate.return_value = []
+        arglist = ['--standalone', '--yes',
+                   '--working-dir', tmp,
+                   '--mon-ip', '192.168.24.1',
+                   '--roles-data', os.path.join(tmp, 'roles_data.yaml'),
+                   '--output', os.path.join(tmp, 'ceph_spec.yaml')]
+        with open(os.path.join(tmp, 'roles_data.yaml'), 'w') as f:
+            f.write('[]\n')
+        parsed_args = self.check_parser(self.cmd, arglist, [])
+        self.cmd.take_action(parsed_args)
+        mock_generate.assert_called_once_with(
+            os.path.join(tmp, 'ceph_spec.yaml'), '192.168.24.1',
+            osd_spec=None)
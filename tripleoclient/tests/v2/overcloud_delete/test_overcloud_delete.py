@@ -46,17 +46,21 @@ class TestDeleteOvercloud(deploy_fakes.TestDeployOvercloud):
 
         self.cmd.take_action(parsed_args)
 
-        mock_run_playbook.assert_called_once_with(
-            ['cli-cleanup-ipa.yml', 'cli-overcloud-delete.yaml'],
-            constants.ANSIBLE_INVENTORY.format('overcast'),
-            mock.ANY,
-            constants.ANSIBLE_TRIPLEO_PLAYBOOKS,
-            extra_vars={
-                "stack_name": "overcast",
-                "heat_stack_delete": True
-            },
-            verbosity=3,
-        )
+        mock_run_playbook.assert_has_calls([
+            mock.call(
+                [playbook],
+                constants.ANSIBLE_INVENTORY.format('overcast'),
+                workdir=mock.ANY,
+                playbook_dir=constants.ANSIBLE_TRIPLEO_PLAYBOOKS,
+                extra_vars={
+                    "stack_name": "overcast",
+                    "heat_stack_delete": True
+                },
+                verbosity=3,
+            ) for playbook in ('cli-cleanup-ipa.yml',
+                               'cli-overcloud-delete.yaml')
+        ])
+        self.assertEqual(mock_run_playbook.call_count, 2)
 
     @mock.patch("tripleoclient.utils.run_ansible_playbook", autospec=True)
     @mock.patch('os.chdir', autospec=True)
@@ -79,7 +83,7 @@ class TestDeleteOvercloud(deploy_fakes.TestDeployOvercloud):
             parsed_args = self.check_parser(self.cmd, arglist, verifylist)
             self.cmd.take_action(parsed_args)
 
-            mock_run_playbook.assert_called_with(
+            mock_run_playbook.assert_any_call(
                 'cli-overcloud-node-unprovision.yaml',
                 'localhost,',
                 mock.ANY,
@@ -93,7 +97,7 @@ class TestDeleteOvercloud(deploy_fakes.TestDeployOvercloud):
                 },
                 verbosity=3,
             )
-            self.assertEqual(mock_run_playbook.call_count, 2)
+            self.assertEqual(mock_run_playbook.call_count, 3)
 
     @mock.patch('tripleoclient.utils.TempDirs', autospect=True)
     @mock.patch('os.path.abspath', autospect=True)
@@ -125,7 +129,7 @@ class TestDeleteOvercloud(deploy_fakes.TestDeployOvercloud):
                 "network_data_path": '/test/network_data_v2.yaml'
             }
         )
-        self.assertEqual(mock_run_playbook.call_count, 2)
+        self.assertEqual(mock_run_playbook.call_count, 3)
 
     def test_no_confirmation(self):
         arglist = ["overcast", ]
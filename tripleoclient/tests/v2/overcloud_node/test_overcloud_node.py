@@ -26,6 +26,7 @@ from osc_lib.tests import utils as test_utils
 from tripleoclient import constants
 from tripleoclient.tests.v2.overcloud_node import fakes
 from tripleoclient.v2 import overcloud_node
+from tripleoclient.workflows import baremetal
 from tripleoclient.workflows import tripleo_baremetal as tb
 
 
@@ -105,6 +106,21 @@ class TestImportNode(fakes.TestOvercloudNode):
                                          ('provide', False)])
         self.cmd.take_action(parsed_args)
 
+    def test_import_concurrency(self,
+                                mock_conn,
+                                mock_connect,
+                                mock_conf,
+                                mock_bm,
+                                mock_playbook):
+        parsed_args = self.check_parser(self.cmd,
+                                        [self.json_file.name,
+                                         '--concurrency', '5'],
+                                        [('concurrency', 5)])
+        self.cmd.take_action(parsed_args)
+        baremetal.register_or_update.assert_called_once_with(
+            self.app.client_manager, nodes_json=mock.ANY,
+            instance_boot_option=None, boot_mode=None, concurrency=5)
+
     def test_import_and_introspect(self,
                                    mock_conn,
                                    mock_connect,
@@ -116,19 +132,11 @@ class TestImportNode(fakes.TestOvercloudNode):
                                          '--introspect'],
                                         [('introspect', True),
                                          ('provide', False)])
-        self.cmd.take_action(parsed_args)
-        mock_playbook.assert_called_once_with(
-            workdir=mock.ANY,
-            playbook=mock.ANY,
-            inventory=mock.ANY,
-            playbook_dir=constants.ANSIBLE_TRIPLEO_PLAYBOOKS,
-            verbosity=mock.ANY,
-            extra_vars={
-                'node_uuids': ['MOCK_NODE_UUID'],
-                'run_validations': False,
-                'concurrency': 20
-            }
-        )
+        with mock.patch.object(tb.TripleoIntrospect, 'introspect',
+                               autospec=True) as mock_introspect:
+            self.cmd.take_action(parsed_args)
+        mock_introspect.assert_called_once_with(mock.ANY, ['MOCK_NODE_UUID'])
+        mock_playbook.assert_not_called()
 
     def test_import_and_provide(self,
                                 mock_conn,
@@ -142,6 +150,7 @@ class TestImportNode(fakes.TestOvercloudNode):
                                         [('introspect', False),
                                          ('provide', True)])
         mock_conn.return_value = mock_bm
+        mock_connect.return_value = mock_bm
         mock_bm.baremetal = mock_bm
         mock_bm.baremetal_introspection = mock_bm
         mock_bm.baremetal.get_node.side_effect = [
@@ -163,25 +172,18 @@ class TestImportNode(fakes.TestOvercloudNode):
                                         [('introspect', True),
                                          ('provide', True)])
         mock_conn.return_value = mock_bm
+        mock_connect.return_value = mock_bm
         mock_bm.baremetal = mock_bm
         mock_bm.baremetal_introspection = mock_bm
         mock_bm.baremetal.get_node.side_effect = [
             self.fake_baremetal_node,
             self.fake_baremetal_node2]
 
-        self.cmd.take_action(parsed_args)
-        mock_playbook.assert_called_with(
-            workdir=mock.ANY,
-            playbook=mock.ANY,
-            inventory=mock.ANY,
-            playbook_dir=constants.ANSIBLE_TRIPLEO_PLAYBOOKS,
-            verbosity=mock.ANY,
-            extra_vars={
-                'node_uuids': ['MOCK_NODE_UUID'],
-                'run_validations': False,
-                'concurrency': 20
-            }
-        )
+        with mock.patch.object(tb.TripleoIntrospect, 'introspect',
+                               autospec=True) as mock_introspect:
+            self.cmd.take_action(parsed_args)
+        mock_introspect.assert_called_once_with(mock.ANY, ['MOCK_NODE_UUID'])
+        mock_playbook.assert_not_called()
 
     def test_import_with_netboot(self,
                                  mock_conn,
@@ -244,22 +246,16 @@ class TestIntrospectNode(fakes.TestOvercloudNode):
         parsed_args = self.check_parser(self.cmd,
                                         ['--all-manageable'],
                                         [('all_manageable', True)])
-        self.cmd.take_action(parsed_args)
-        mock_playbook.assert_called_once_with(
-            workdir=mock.ANY,
-            playbook=mock.ANY,
-            inventory=mock.ANY,
-            playbook_dir=constants.ANSIBLE_TRIPLEO_PLAYBOOKS,
-            verbosity=mock.ANY,
-            extra_vars={
-                'node_uuids': [],
-                'run_validations': False,
-                'concurrency': 20,
-                'node_timeout': 1200,
-                'max_retries': 1,
-                'retry_timeout': 120,
-            }
-        )
+        self.baremetal.node.list.return_value = [
+            mock.Mock(uuid='node1', provision_state='manageable',
+                      maintenance=False),
+            mock.Mock(uuid='node2', provision_state='available',
+                      maintenance=False),
+        ]
+        with mock.patch.object(tb.TripleoIntrospect, 'introspect',
+                               autospec=True) as mock_introspect:
+            self.cmd.take_action(parsed_args)
+        mock_introspect.assert_called_once_with(mock.ANY, ['node1'])
 
     def test_introspect_all_manageable_nodes_with_provide(self,
                                                           mock_conn,
@@ -273,6 +269,7 @@ class TestIntrospectNode(fakes.TestOvercloudNode):
                                          ('provide', True)])
         tb.TripleoProvide.provide = mock.MagicMock()
         mock_conn.return_value = mock_bm
+        mock_connect.return_value = mock_bm
         mock_bm.baremetal = mock_bm
         mock_bm.baremetal.nodes.side_effect = [
             iter([self.fake_baremetal_node,
@@ -283,22 +280,10 @@ class TestIntrospectNode(fakes.TestOvercloudNode):
 
         expected_nodes = ['4e540e11-1366-4b57-85d5-319d168d98a1',
                           '9070e42d-1ad7-4bd0-b868-5418bc9c7176']
-        self.cmd.take_action(parsed_args)
-        mock_playbook.assert_called_with(
-            workdir=mock.ANY,
-            playbook='cli-baremetal-introspect.yaml',
-            inventory=mock.ANY,
-            playbook_dir=constants.ANSIBLE_TRIPLEO_PLAYBOOKS,
-            verbosity=mock.ANY,
-            extra_vars={
-                'node_uuids': [],
-                'run_validations': False,
-                'concurrency': 20,
-                'node_timeout': 1200,
-                'max_retries': 1,
-                'retry_timeout': 120,
-            }
-        )
+        with mock.patch.object(tb.TripleoIntrospect, 'introspect',
+                               autospec=True) as mock_introspect:
+            self.cmd.take_action(parsed_args)
+        mock_introspect.assert_called_once_with(mock.ANY, [])
 
         tb.TripleoProvide.provide.assert_called_with(
             expected_nodes)
@@ -313,22 +298,15 @@ class TestIntrospectNode(fakes.TestOvercloudNode):
         parsed_args = self.check_parser(self.cmd,
                                         nodes,
                                         [('node_uuids', nodes)])
-        self.cmd.take_action(parsed_args)
-        mock_playbook.assert_called_once_with(
-            workdir=mock.ANY,
-            playbook='cli-baremetal-introspect.yaml',
-            inventory=mock.ANY,
-            playbook_dir=constants.ANSIBLE_TRIPLEO_PLAYBOOKS,
-            verbosity=mock.ANY,
-            extra_vars={
-                'node_uuids': nodes,
-                'run_validations': False,
-                'concurrency': 20,
-                'node_timeout': 1200,
-                'max_retries': 1,
-                'retry_timeout': 120,
-            }
-        )
+        with mock.patch.object(tb, 'TripleoIntrospect',
+                               autospec=True) as mock_introspect:
+            self.cmd.take_action(parsed_args)
+        mock_introspect.assert_called_once_with(
+            concurrency=20, node_timeout=1200, max_retries=1,
+            retry_timeout=120, verbosity=mock.ANY)
+        mock_introspect.return_value.introspect.assert_called_once_with(
+            nodes)
+        mock_playbook.assert_not_called()
 
     def test_introspect_nodes_with_provide(self,
                                            mock_conn,
@@ -344,14 +322,18 @@ class TestIntrospectNode(fakes.TestOvercloudNode):
                                          ('provide', True)])
         tb.TripleoProvide.provide = mock.MagicMock()
         mock_conn.return_value = mock_bm
+        mock_connect.return_value = mock_bm
         mock_bm.baremetal = mock_bm
         mock_bm.baremetal_introspection = mock_bm
         mock_bm.baremetal.get_node.side_effect = [
             self.fake_baremetal_node,
             self.fake_baremetal_node2]
 
-        self.cmd.take_action(parsed_args)
+        with mock.patch.object(tb.TripleoIntrospect, 'introspect',
+                               autospec=True) as mock_introspect:
+            self.cmd.take_action(parsed_args)
 
+        mock_introspect.assert_called_once_with(mock.ANY, nodes)
         tb.TripleoProvide.provide.assert_called_with(
             nodes=nodes
         )
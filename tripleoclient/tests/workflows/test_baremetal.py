@@ -20,8 +20,10 @@ from oslo_concurrency import processutils
 from oslo_utils import units
 
 from tripleoclient import exceptions
+from tripleoclient.tests import base
 from tripleoclient.tests import fakes
 from tripleoclient.workflows import baremetal
+from tripleoclient.workflows import tripleo_baremetal as tb
 
 
 class TestBaremetalWorkflows(fakes.FakePlaybookExecution):
@@ -96,17 +98,73 @@ class TestBaremetalWorkflows(fakes.FakePlaybookExecution):
             instance_boot_option='local'
         ), [mock.ANY])
 
-    def test_introspect_success(self):
-        baremetal.introspect(self.app.client_manager, node_uuids=[],
+    @mock.patch('oslo_concurrency.processutils.execute',
+                return_value=('true\n', ''))
+    @mock.patch('tripleoclient.workflows.baremetal.ValidationActions',
+                autospec=True)
+    @mock.patch.object(tb, 'TripleoIntrospect', autospec=True)
+    def test_introspect_success(self, mock_introspect, mock_validations,
+                                mock_execute):
+        mock_validations.return_value.run_validations.return_value = [
+            {'Validations': 'check-ram', 'Status': 'PASSED'}]
+        baremetal.introspect(self.app.client_manager, node_uuids=['node1'],
                              run_validations=True, concurrency=20,
                              node_timeout=1200, max_retries=1,
                              retry_timeout=120)
-
-    def test_introspect_manageable_nodes_success(self):
+        mock_execute.assert_called_once_with(
+            'sudo', 'hiera', 'tripleo_validations_enabled')
+        mock_validations.return_value.run_validations.assert_called_once_with(
+            inventory='undercloud', group=['pre-introspection'],
+            validations_dir=mock.ANY)
+        mock_introspect.assert_called_once_with(
+            concurrency=20, node_timeout=1200, max_retries=1,
+            retry_timeout=120, verbosity=0)
+        mock_introspect.return_value.introspect.assert_called_once_with(
+            ['node1'])
+
+    @mock.patch('oslo_concurrency.processutils.execute',
+                return_value=('true\n', ''))
+    @mock.patch('tripleoclient.workflows.baremetal.ValidationActions',
+                autospec=True)
+    @mock.patch.object(tb, 'TripleoIntrospect', autospec=True)
+    def test_introspect_validations_failed(self, mock_introspect,
+                                           mock_validations, mock_execute):
+        mock_validations.return_value.run_validations.return_value = [
+            {'Validations': 'check-ram', 'Status': 'FAILED'},
+            {'Validations': None, 'Status': 'FAILED'}]
+        self.assertRaisesRegex(
+            exceptions.IntrospectionError, 'check-ram, None',
+            baremetal.introspect, self.app.client_manager,
+            node_uuids=['node1'], run_validations=True, concurrency=20)
+        mock_introspect.assert_not_called()
+
+    @mock.patch('oslo_concurrency.processutils.execute',
+                return_value=('nil\n', ''))
+    @mock.patch('tripleoclient.workflows.baremetal.ValidationActions',
+                autospec=True)
+    @mock.patch.object(tb, 'TripleoIntrospect', autospec=True)
+    def test_introspect_validations_disabled(self, mock_introspect,
+                                             mock_validations, mock_execute):
+        baremetal.introspect(self.app.client_manager, node_uuids=['node1'],
+                             run_validations=True, concurrency=20)
+        mock_validations.assert_not_called()
+        mock_introspect.return_value.introspect.assert_called_once_with(
+            ['node1'])
+
+    @mock.patch.object(tb, 'TripleoIntrospect', autospec=True)
+    def test_introspect_manageable_nodes_success(self, mock_introspect):
+        self.baremetal.node.list.return_value = [
+            mock.Mock(uuid='node1', provision_state='manageable',
+                      maintenance=False),
+            mock.Mock(uuid='node2', provision_state='manageable',
+                      maintenance=True),
+        ]
         baremetal.introspect_manageable_nodes(
             self.app.client_manager, run_validations=False, concurrency=20,
             node_timeout=1200, max_retries=1, retry_timeout=120,
         )
+        mock_introspect.return_value.introspect.assert_called_once_with(
+            ['node1'])
 
     def test_run_instance_boot_option(self):
         result = baremetal._configure_boot(
@@ -428,3 +486,113 @@ class TestBaremetalWorkflows(fakes.FakePlaybookExecution):
                                              '-p', '623', '-U', 'admin',
                                              '-f', mock.ANY, 'power', 'status',
                                              attempts=2)
+
+
+class TestRegisterOrUpdate(base.TestCase):
+
+    def setUp(self):
+        super(TestRegisterOrUpdate, self).setUp()
+        self.clients = mock.Mock()
+        self.client = self.clients.baremetal
+        self.existing = mock.Mock(uuid='existing', driver='ipmi',
+                                  driver_info={'ipmi_address': '10.0.0.1'},
+                                  provision_state='manageable')
+        self.created = mock.Mock(uuid='created', provision_state='enroll')
+        self.client.port.list.return_value = [
+            mock.Mock(address='00:0b:d0:69:7e:58', node_uuid='existing')]
+        self.client.node.create.return_value = self.created
+        self.client.node.update.return_value = self.existing
+        self.client.node.validate.return_value = mock.Mock(
+            power={'result': True})
+        self.nodes_json = [
+            {'pm_type': 'ipmi', 'pm_addr': '10.0.0.1', 'name': 'node-0',
+             'ports': [{'address': '00:0b:d0:69:7e:58'}]},
+            {'pm_type': 'ipmi', 'pm_addr': '10.0.0.2', 'name': 'node-1',
+             'ports': [{'address': '00:0b:d0:69:7e:59'}]},
+        ]
+
+    def _listing(self, state, target=None, error=None):
+        return [mock.Mock(uuid='created', provision_state=state,
+                          target_provision_state=target, last_error=error)]
+
+    def test_register_or_update(self):
+        self.client.node.list.side_effect = [
+            [self.existing],
+            self._listing('verifying', 'manageable'),
+            self._listing('manageable'),
+        ]
+
+        nodes = baremetal.register_or_update(
+            self.clients, self.nodes_json, instance_boot_option='local',
+            poll_interval=0)
+
+        self.assertEqual([self.existing, self.created], nodes)
+        # one listing to index the nodes and their ports, one per poll
+        self.client.node.list.assert_any_call(detail=True, limit=0)
+        self.client.port.list.assert_called_once_with(
+            fields=['address', 'node_uuid'], limit=0)
+        self.assertEqual(3, self.client.node.list.call_count)
+        self.client.node.update.assert_called_once_with('existing', [
+            {'path': '/name', 'value': 'node-0', 'op': 'add'},
+            {'path': '/properties/capabilities',
+             'value': 'boot_option:local', 'op': 'add'},
+            {'path': '/driver_info/ipmi_address', 'value': '10.0.0.1',
+             'op': 'add'},
+        ])
+        self.client.node.create.assert_called_once_with(
+            driver='ipmi', name='node-1', resource_class='baremetal',
+            properties={'capabilities': 'boot_option:local'},
+            driver_info={'ipmi_address': '10.0.0.2'})
+        self.client.port.create.assert_called_once_with(
+            address='00:0b:d0:69:7e:59', physical_network='ctlplane',
+            local_link_connection=None, node_uuid='created')
+        self.client.node.set_provision_state.assert_called_once_with(
+            node_uuid='created', state='manage')
+
+    def test_register_or_update_failures(self):
+        self.client.node.create.side_effect = Exception('Conflict')
+        self.client.node.list.return_value = [self.existing]
+
+        self.assertRaisesRegex(
+            exceptions.RegisterOrUpdateError,
+            r'Failed to register nodes: node-1 \(Conflict\)',
+            baremetal.register_or_update, self.clients, self.nodes_json,
+            poll_interval=0)
+        self.client.node.update.assert_called_once_with('existing', mock.ANY)
+        self.client.node.set_provision_state.assert_not_called()
+
+    def test_register_or_update_several_candidates(self):
+        self.client.node.list.return_value = [self.existing]
+        # the MAC address of one node and the BMC address of the other
+        self.nodes_json[1]['pm_addr'] = '10.0.0.1'
+        self.nodes_json[1]['ports'] = [{'address': '00:0B:D0:69:7E:58'}]
+        self.client.port.list.return_value.append(
+            mock.Mock(address='00:0b:d0:69:7e:58', node_uuid='other'))
+
+        self.assertRaisesRegex(
+            exceptions.RegisterOrUpdateError, 'Several candidates',
+            baremetal.register_or_update, self.clients, self.nodes_json,
+            poll_interval=0)
+        self.client.node.create.assert_not_called()
+
+    def test_register_or_update_verification_failed(self):
+        self.client.node.list.side_effect = [
+            [self.existing],
+            self._listing('enroll', error='Invalid credentials'),
+        ]
+
+        self.assertRaisesRegex(
+            exceptions.RegisterOrUpdateError, 'created .Invalid credentials',
+            baremetal.register_or_update, self.clients, self.nodes_json,
+            poll_interval=0)
+
+    def test_register_or_update_timeout(self):
+        self.client.node.list.side_effect = [
+            [self.existing],
+            self._listing('verifying', 'manageable'),
+        ]
+
+        self.assertRaisesRegex(
+            exceptions.RegisterOrUpdateError, 'created .Timeout after 0s',
+            baremetal.register_or_update, self.clients, self.nodes_json,
+            timeout=0, poll_interval=0)
@@ -12,6 +12,7 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import git
 import os
 import shutil
 import tempfile
@@ -193,3 +194,91 @@ class TestDeploymentWorkflows(utils.TestCommand):
             # Verify old config-download dir symlink points to new dir
             self.assertEqual(os.path.join(new, stack),
                              os.path.realpath(old_cd_dir))
+
+
+class TestSnapshotDir(utils.TestCommand):
+
+    def setUp(self):
+        super(TestSnapshotDir, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.repo = git.Repo.init(self.directory)
+        with self.repo.config_writer() as writer:
+            writer.set_value('user', 'name', 'test')
+            writer.set_value('user', 'email', 'test@example.com')
+        self._write('.gitignore', '*.tar.gz\n')
+        self._write('a.yaml', 'a')
+        self.repo.git.add('.')
+        self.repo.git.commit('-m', 'initial')
+
+    def _write(self, name, content):
+        path = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def _count(self):
+        return len(list(self.repo.iter_commits('HEAD')))
+
+    def test_snapshot_amends(self):
+        self._write('host_vars/b.yaml', 'b')
+        self._write('export.tar.gz', 'ignored')
+        deployment.snapshot_dir(self.directory, gc=None)
+        self.assertEqual(1, self._count())
+        files = self.repo.git.ls_files().splitlines()
+        self.assertEqual(['.gitignore', 'a.yaml', 'host_vars/b.yaml'], files)
+
+        # Incremental: modify and remove tracked files
+        self._write('a.yaml', 'changed')
+        os.unlink(os.path.join(self.directory, 'host_vars/b.yaml'))
+        deployment.snapshot_dir(self.directory, gc=None)
+        self.assertEqual(1, self._count())
+        self.assertEqual(['.gitignore', 'a.yaml'],
+                         self.repo.git.ls_files().splitlines())
+        self.assertFalse(self.repo.is_dirty(untracked_files=False))
+
+    def test_snapshot_unchanged_tree(self):
+        deployment.snapshot_dir(self.directory, gc=None)
+        head = self.repo.head.commit.hexsha
+        with mock.patch.object(git.cmd.Git, 'execute') as mock_execute:
+            deployment.snapshot_dir(self.directory, gc=None)
+            mock_execute.assert_not_called()
+        self.assertEqual(head, self.repo.head.commit.hexsha)
+
+    def test_snapshot_rewritten_identical_content(self):
+        deployment.snapshot_dir(self.directory, gc=None)
+        head = self.repo.head.commit.hexsha
+        # config-download rewrites every file with a new mtime
+        self._write('a.yaml', 'a')
+        self._write('.gitignore', '*.tar.gz\n')
+        with mock.patch.object(git.cmd.Git, 'execute') as mock_execute:
+            deployment.snapshot_dir(self.directory, gc=None)
+            mock_execute.assert_not_called()
+        self.assertEqual(head, self.repo.head.commit.hexsha)
+
+    def test_snapshot_incremental_add(self):
+        for i in range(4):
+            self._write('host_vars/h%d.yaml' % i, str(i))
+        deployment.snapshot_dir(self.directory, gc=None)
+        self._write('host_vars/h0.yaml', 'changed')
+        self._write('export.tar.gz', 'ignored')
+        with mock.patch.object(git.Repo, 'ignored',
+                               autospec=True,
+                               return_value=['export.tar.gz']) as ignored:
+            deployment.snapshot_dir(self.directory, gc=None)
+        ignored.assert_called_once_with(
+            mock.ANY, 'export.tar.gz', 'host_vars/h0.yaml')
+        self.assertEqual('changed',
+                         self.repo.git.show('HEAD:host_vars/h0.yaml'))
+        self.assertNotIn('export.tar.gz', self.repo.git.ls_files())
+
+    def test_snapshot_keep(self):
+        for i in range(4):
+            self._write('a.yaml', str(i))
+            deployment.snapshot_dir(self.directory, keep=2, gc=None)
+        self.assertEqual(2, self._count())
+        self.assertEqual('3', self.repo.git.show('HEAD:a.yaml'))
+        self.assertEqual('2', self.repo.git.show('HEAD~1:a.yaml'))
+
+    def test_snapshot_missing_dir(self):
+        deployment.snapshot_dir(os.path.join(self.directory, 'missing'))
@@ -16,6 +16,7 @@ from unittest import mock
 
 from osc_lib.tests import utils
 
+from tripleoclient.tests.benchmarks import fakes
 from tripleoclient.workflows import parameters
 
 
@@ -157,3 +158,49 @@ class TestParameterWorkflows(utils.TestCommand):
             **workflow_input
         )
         self.assertEqual(params, {"parameter_defaults": {}})
+
+    def test_analyze_parameters(self):
+        stack_data = {
+            'environment_parameters': {
+                'ComputeFoo': 1,
+                'Compute': 'RoleSpecific',
+                'Unused': True,
+                'label': 'x',
+            },
+            'heat_resource_tree': {
+                'parameters': {
+                    'ComputeFoo': {'name': 'ComputeFoo'},
+                    'Compute': {'name': 'Compute'},
+                    'label': {'name': 'label'},
+                    'RoleSpecific': {'name': 'RoleSpecific',
+                                     'tags': ['role_specific']},
+                },
+                'resources': {
+                    'r1': {'parameter_groups': [
+                        {'label': 'deprecated', 'parameters': ['Old']}]},
+                    'r2': {'parameter_groups': [
+                        {'label': 'other', 'parameters': ['New']}]},
+                    'r3': {},
+                },
+            },
+        }
+        deprecated, unused, invalid = parameters._analyze_parameters(
+            stack_data, ['Compute', 'ComputeHCI', 'Controller'])
+        self.assertEqual(
+            [{'label': 'deprecated', 'parameters': ['Old']}], deprecated)
+        self.assertEqual(['Unused'], unused)
+        self.assertEqual(['RoleSpecific', 'RoleSpecific'], invalid)
+
+    def test_analyze_parameters_large_tree(self):
+        stack_data, role_list = fakes.make_parameter_tree(50, 500, 5000)
+        deprecated, unused, invalid = parameters._analyze_parameters(
+            stack_data, role_list)
+        self.assertEqual(500, len(deprecated))
+        self.assertEqual({'label': 'deprecated', 'parameters': ['Old0']},
+                         deprecated[0])
+        self.assertEqual(['Role%dUnused' % r for r in range(50)], unused)
+        # RoleN counts once per role name containing it, Role1 to Role4
+        # are also part of the names of the ten roles Role10 to Role49
+        self.assertEqual(90, len(invalid))
+        self.assertEqual(11, invalid.count('Role1RoleSpecific'))
+        self.assertEqual(1, invalid.count('Role49RoleSpecific'))
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import contextlib
+import io
+from unittest import mock
+
+from openstack import exceptions as sdk_exc
+from oslo_utils import units
+
+from tripleoclient import exceptions
+from tripleoclient.tests import base
+from tripleoclient.workflows import tripleo_baremetal as tb
+
+
+class TestTripleoConfigure(base.TestCase):
+
+    def setUp(self):
+        super(TestTripleoConfigure, self).setUp()
+        self.conn = mock.Mock()
+        get_conn = mock.patch('tripleoclient.utils.get_sdk_connection',
+                              return_value=self.conn)
+        get_conn.start()
+        self.addCleanup(get_conn.stop)
+        self.nodes = {
+            'aaaa': mock.Mock(id='aaaa', properties={}, driver_info={}),
+            # already configured
+            'bbbb': mock.Mock(
+                id='bbbb',
+                properties={'capabilities': 'boot_option:local'},
+                driver_info={'deploy_kernel': 'kernel',
+                             'deploy_ramdisk': 'ramdisk',
+                             'rescue_kernel': 'kernel',
+                             'rescue_ramdisk': 'ramdisk'}),
+        }
+        self.conn.baremetal.find_node.side_effect = (
+            lambda uuid, ignore_missing: self.nodes[uuid])
+        self.conn.baremetal_introspection.get_introspection_data.\
+            return_value = {'inventory': {'disks': [
+                {'name': '/dev/sda', 'size': 11 * units.Gi, 'wwn': 'wwn0'},
+                {'name': '/dev/sdb', 'size': 21 * units.Gi, 'wwn': 'wwn1'},
+            ]}}
+
+    def _configure(self, concurrency=2, **kwargs):
+        return tb.TripleoConfigure(kernel_name='kernel',
+                                   ramdisk_name='ramdisk',
+                                   instance_boot_option='local',
+                                   concurrency=concurrency, **kwargs)
+
+    def test_configure(self):
+        self._configure().configure(['aaaa', 'bbbb'])
+        self.conn.baremetal.patch_node.assert_called_once_with(
+            self.nodes['aaaa'], [
+                {'op': 'add', 'path': '/properties/capabilities',
+                 'value': 'boot_option:local'},
+                {'op': 'add', 'path': '/driver_info/deploy_ramdisk',
+                 'value': 'ramdisk'},
+                {'op': 'add', 'path': '/driver_info/deploy_kernel',
+                 'value': 'kernel'},
+                {'op': 'add', 'path': '/driver_info/rescue_ramdisk',
+                 'value': 'ramdisk'},
+                {'op': 'add', 'path': '/driver_info/rescue_kernel',
+                 'value': 'kernel'},
+            ])
+
+    def test_configure_root_device(self):
+        self._configure(root_device='largest').configure(['bbbb'])
+        self.conn.baremetal.patch_node.assert_called_once_with(
+            self.nodes['bbbb'], [
+                {'op': 'add', 'path': '/properties/root_device',
+                 'value': {'wwn': 'wwn1'}},
+                {'op': 'add', 'path': '/properties/local_gb', 'value': 20},
+            ])
+
+    def test_configure_dry_run(self):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            self._configure(dry_run=True).configure(['aaaa', 'bbbb'])
+        self.conn.baremetal.patch_node.assert_not_called()
+        self.assertIn("Node aaaa: /driver_info/deploy_kernel: None -> "
+                      "'kernel'", stdout.getvalue())
+        self.assertIn('Node bbbb: no change', stdout.getvalue())
+
+    def test_configure_failure(self):
+        self.nodes['aaaa'].properties = {'capabilities': 'boot_option:local'}
+        self.conn.baremetal_introspection.get_introspection_data.\
+            return_value = {'inventory': {}}
+        self.conn.baremetal.find_node.side_effect = [
+            self.nodes['aaaa'], sdk_exc.ResourceNotFound('Not found')]
+
+        self.assertRaisesRegex(
+            exceptions.NodeConfigurationError,
+            r'2 of 2 nodes: aaaa \(Malformed.*\), bbbb \(Not found\)',
+            self._configure(root_device='largest', concurrency=1).configure,
+            ['aaaa', 'bbbb'])
+        self.conn.baremetal.patch_node.assert_not_called()
+
+    def test_configure_partial_failure(self):
+        def find_node(uuid, ignore_missing):
+            if uuid == 'cccc':
+                raise sdk_exc.ResourceNotFound('Not found')
+            return self.nodes[uuid]
+        self.conn.baremetal.find_node.side_effect = find_node
+
+        self.assertRaisesRegex(
+            exceptions.NodeConfigurationError,
+            r'1 of 3 nodes: cccc \(Not found\)',
+            self._configure().configure, ['aaaa', 'bbbb', 'cccc'])
+        self.conn.baremetal.patch_node.assert_called_once_with(
+            self.nodes['aaaa'], mock.ANY)
+
+
+class TestTripleoUnprovision(base.TestCase):
+
+    def setUp(self):
+        super(TestTripleoUnprovision, self).setUp()
+        self.conn = mock.Mock()
+        get_conn = mock.patch('tripleoclient.utils.get_sdk_connection',
+                              return_value=self.conn)
+        get_conn.start()
+        self.addCleanup(get_conn.stop)
+        self.unprovision = tb.TripleoUnprovision('overcloud', concurrency=2,
+                                                 verbosity=0)
+        self.plan = [
+            {'hostname': 'compute-0', 'name': 'node-0', 'id': 'aaaa'},
+            {'hostname': 'compute-1', 'name': 'node-1', 'id': 'bbbb'},
+        ]
+
+    def _node(self, node_id, state='active', extra=None):
+        return mock.Mock(id=node_id, provision_state=state,
+                         instance_id='instance-' + node_id,
+                         extra=extra or {})
+
+    def test_unprovision(self):
+        nodes = {
+            'aaaa': self._node(
+                'aaaa', extra={'metalsmith_created_ports': ['port-a']}),
+            'bbbb': self._node('bbbb'),
+        }
+        self.conn.baremetal.get_node.side_effect = nodes.get
+        self.conn.baremetal.list_node_vifs.side_effect = (
+            lambda node: ['port-' + node.id[0]])
+
+        self.unprovision.unprovision(self.plan)
+
+        # The tagged network ports are kept unless explicitly requested
+        self.conn.network.ports.assert_not_called()
+        self.conn.network.delete_port.assert_called_once_with(
+            'port-a', ignore_missing=True)
+        self.conn.baremetal.patch_node.assert_called_once_with(
+            nodes['aaaa'],
+            [{'op': 'remove', 'path': '/extra/metalsmith_created_ports'}])
+        self.conn.baremetal.set_node_provision_state.assert_has_calls([
+            mock.call(nodes['aaaa'], 'deleted', wait=True, timeout=1200),
+            mock.call(nodes['bbbb'], 'deleted', wait=True, timeout=1200),
+        ], any_order=True)
+
+    def test_unprovision_network_ports(self):
+        unprovision = tb.TripleoUnprovision('overcloud', concurrency=2,
+                                            verbosity=0,
+                                            manage_network_ports=True)
+        self.conn.baremetal.get_node.side_effect = self._node
+        self.conn.baremetal.list_node_vifs.return_value = []
+        self.conn.network.ports.return_value = [mock.Mock(id='net-port')]
+
+        unprovision.unprovision(self.plan)
+
+        self.conn.network.ports.assert_has_calls([
+            mock.call(tags=['tripleo_stack_name=overcloud',
+                            'tripleo_hostname=compute-0']),
+            mock.call(tags=['tripleo_stack_name=overcloud',
+                            'tripleo_hostname=compute-1']),
+        ], any_order=True)
+        self.assertEqual([mock.call('net-port'), mock.call('net-port')],
+                         self.conn.network.delete_port.call_args_list)
+
+    def test_unprovision_changed_node(self):
+        nodes = {'aaaa': self._node('aaaa'), 'bbbb': self._node('bbbb')}
+        self.conn.baremetal.get_node.side_effect = nodes.get
+        self.conn.baremetal.list_node_vifs.return_value = []
+        self.unprovision.record_plan(self.plan)
+
+        # bbbb got deployed again after the plan was computed
+        nodes['bbbb'] = self._node('bbbb')
+        nodes['bbbb'].instance_id = 'another-instance'
+        self.assertRaisesRegex(exceptions.NodeUnprovisionError,
+                               'compute-1$',
+                               self.unprovision.unprovision, self.plan)
+        self.conn.baremetal.set_node_provision_state.assert_called_once_with(
+            nodes['aaaa'], 'deleted', wait=True, timeout=1200)
+
+    def test_record_plan_missing_node(self):
+        self.conn.baremetal.get_node.side_effect = sdk_exc.ResourceNotFound
+        self.unprovision.record_plan(self.plan)
+        self.assertEqual({'aaaa': None, 'bbbb': None},
+                         self.unprovision._planned)
+
+    def test_unprovision_failure(self):
+        self.conn.baremetal.get_node.return_value = self._node('aaaa')
+        self.conn.baremetal.list_node_vifs.side_effect = [
+            ValueError('unexpected'), []]
+        self.conn.baremetal.set_node_provision_state.side_effect = [
+            sdk_exc.ResourceFailure]
+
+        self.assertRaises(exceptions.NodeUnprovisionError,
+                          self.unprovision.unprovision, self.plan)
+        self.assertEqual(
+            1, self.conn.baremetal.set_node_provision_state.call_count)
+
+
+class TestTripleoIntrospect(base.TestCase):
+
+    def setUp(self):
+        super(TestTripleoIntrospect, self).setUp()
+        self.conn = mock.Mock()
+        get_conn = mock.patch('tripleoclient.utils.get_sdk_connection',
+                              return_value=self.conn)
+        get_conn.start()
+        self.addCleanup(get_conn.stop)
+
+        # A clock only moving forward when sleeping
+        self.now = 0
+        self.sleeps = []
+
+        def sleep(seconds):
+            self.sleeps.append(seconds)
+            self.now += seconds
+
+        for name, side_effect in (('monotonic', lambda: self.now),
+                                  ('sleep', sleep)):
+            patcher = mock.patch.object(tb.time, name,
+                                        side_effect=side_effect)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.conn.baremetal.get_node.side_effect = (
+            lambda uuid: self._node(uuid, 'manageable'))
+
+    def _node(self, uuid, state, target=None, error=None):
+        return mock.Mock(id=uuid, provision_state=state,
+                         target_provision_state=target, last_error=error,
+                         power_state='power off', reservation=None)
+
+    def _listings(self, *states):
+        """Return the node listings of each poll, from {uuid: state}"""
+        return [[self._node(uuid, *(s if isinstance(s, tuple) else (s,)))
+                 for uuid, s in listing.items()] for listing in states]
+
+    def test_introspect(self):
+        self.conn.baremetal.nodes.side_effect = self._listings(
+            {'aaaa': ('inspecting', 'manageable')},
+            {'aaaa': 'manageable'},
+            {'bbbb': 'inspect wait'},
+            {'bbbb': 'manageable', 'cccc': 'active'},
+        )
+        introspect = tb.TripleoIntrospect(concurrency=1, poll_interval=5,
+                                          verbosity=0)
+
+        self.assertEqual(['aaaa', 'bbbb'],
+                         introspect.introspect(['aaaa', 'bbbb']))
+        self.conn.baremetal.set_node_provision_state.assert_has_calls([
+            mock.call(mock.ANY, 'inspect', wait=False),
+            mock.call(mock.ANY, 'inspect', wait=False),
+        ])
+        self.assertEqual(4, self.conn.baremetal.nodes.call_count)
+        self.conn.baremetal.nodes.assert_called_with(
+            fields=['uuid', 'provision_state', 'target_provision_state',
+                    'last_error'])
+        self.conn.baremetal.set_node_power_state.assert_not_called()
+        self.assertEqual([5, 5, 5, 5], self.sleeps)
+
+    def test_introspect_prepare(self):
+        node = self._node('aaaa', 'inspect failed')
+        node.power_state = 'power on'
+        node.reservation = 'conductor'
+        self.conn.baremetal.get_node.side_effect = None
+        self.conn.baremetal.get_node.return_value = node
+        self.conn.baremetal.wait_for_node_reservation.return_value = node
+        self.conn.baremetal.nodes.side_effect = self._listings(
+            {'aaaa': 'manageable'})
+        introspect = tb.TripleoIntrospect(retry_timeout=60, verbosity=0)
+
+        introspect.introspect(['aaaa'])
+        self.conn.baremetal.wait_for_node_reservation.assert_called_once_with(
+            node, timeout=60)
+        self.conn.baremetal.set_node_power_state.assert_called_once_with(
+            node, 'power off', wait=True, timeout=60)
+
+    def test_introspect_retry(self):
+        self.conn.baremetal.nodes.side_effect = self._listings(
+            {'aaaa': ('inspect failed', None, 'boom')},
+            {'aaaa': ('inspect failed', None, 'boom')},
+            {'aaaa': 'manageable'},
+        )
+        introspect = tb.TripleoIntrospect(max_retries=2, retry_timeout=15,
+                                          poll_interval=10, verbosity=0)
+
+        self.assertEqual(['aaaa'], introspect.introspect(['aaaa']))
+        self.assertEqual(
+            3, self.conn.baremetal.set_node_provision_state.call_count)
+        # poll, backoff of 10s, poll, backoff capped to 15s, poll
+        self.assertEqual([10, 10, 10, 15, 10], self.sleeps)
+
+    def test_introspect_failure(self):
+        self.conn.baremetal.nodes.side_effect = self._listings(
+            {'aaaa': 'manageable',
+             'bbbb': ('inspect failed', None, 'boom')},
+            {'bbbb': ('inspect failed', None, 'boom again')},
+        )
+        introspect = tb.TripleoIntrospect(poll_interval=0, verbosity=0)
+
+        self.assertRaisesRegex(exceptions.IntrospectionError,
+                               r'1 of 2 nodes: bbbb \(boom again\)',
+                               introspect.introspect, ['aaaa', 'bbbb'])
+
+    def test_introspect_wrong_state(self):
+        self.conn.baremetal.get_node.side_effect = (
+            lambda uuid: self._node(uuid, 'active'))
+        introspect = tb.TripleoIntrospect(max_retries=3, verbosity=0)
+
+        self.assertRaisesRegex(exceptions.IntrospectionError, 'active',
+                               introspect.introspect, ['aaaa'])
+        self.assertEqual(1, self.conn.baremetal.get_node.call_count)
+        self.conn.baremetal.set_node_provision_state.assert_not_called()
+        self.conn.baremetal.nodes.assert_not_called()
+
+    def test_introspect_start_failure(self):
+        self.conn.baremetal.set_node_provision_state.side_effect = [
+            sdk_exc.ConflictException, None]
+        self.conn.baremetal.nodes.side_effect = self._listings(
+            {'aaaa': 'manageable'})
+        introspect = tb.TripleoIntrospect(poll_interval=0, verbosity=0)
+
+        self.assertEqual(['aaaa'], introspect.introspect(['aaaa']))
+        self.assertEqual(
+            2, self.conn.baremetal.set_node_provision_state.call_count)
+
+    def test_introspect_timeout(self):
+        self.conn.baremetal.nodes.side_effect = self._listings(
+            {'aaaa': ('inspect wait', 'manageable')},
+            {'aaaa': ('inspect wait', 'manageable')},
+        )
+        introspect = tb.TripleoIntrospect(node_timeout=15, max_retries=0,
+                                          poll_interval=10, verbosity=0)
+
+        self.assertRaisesRegex(exceptions.IntrospectionError, 'Timeout',
+                               introspect.introspect, ['aaaa'])
+        self.conn.baremetal.set_node_provision_state.assert_called_with(
+            'aaaa', 'abort')
+
+    def test_introspect_no_nodes(self):
+        introspect = tb.TripleoIntrospect(verbosity=0)
+        self.assertRaises(exceptions.NoNodeFound,
+                          introspect.introspect, [])
@@ -0,0 +1,219 @@
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+#
+
+"""Local tracing of the phases of long running tripleoclient commands"""
+
+import contextlib
+import functools
+import inspect
+import json
+import os
+import resource
+import threading
+import time
+
+from prettytable import PrettyTable
+
+# Tracer receiving the spans, set while a Tracer is entered
+_ACTIVE = None
+_ACTIVE_LOCK = threading.Lock()
+
+
+class Span(object):
+    """A timed phase of a trace
+
+    Times are in seconds, the start is a time.perf_counter value. The CPU
+    time covers this process and its reaped children, e.g. ansible-playbook.
+    The peak RSS values are the high water marks, in KiB, of this process
+    and of its children when the span ended.
+    """
+
+    def __init__(self, name, depth, args=None):
+        self.name = name
+        self.depth = depth
+        self.args = dict(args or {})
+        self.tid = threading.get_ident()
+        self.start = time.perf_counter()
+        self.wall = None
+        self.cpu = None
+        self.max_rss = None
+        self.children_max_rss = None
+        self.error = None
+        self._cpu = _cpu_time()
+
+    def finish(self, error=None):
+        self.wall = time.perf_counter() - self.start
+        self.cpu = _cpu_time() - self._cpu
+        self.max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.children_max_rss = resource.getrusage(
+            resource.RUSAGE_CHILDREN).ru_maxrss
+        if error is not None:
+            self.error = '{}: {}'.format(type(error).__name__, error)
+
+    def to_event(self, pid):
+        """Return the span as a complete event of the Chrome trace format"""
+        args = dict(self.args, cpu_s=round(self.cpu, 6),
+                    max_rss_kb=self.max_rss,
+                    children_max_rss_kb=self.children_max_rss)
+        if self.error:
+            args['error'] = self.error
+        return {
+            'name': self.name,
+            'cat': 'tripleoclient',
+            'ph': 'X',
+            'ts': int(self.start * 1e6),
+            'dur': int(self.wall * 1e6),
+            'pid': pid,
+            'tid': self.tid,
+            'args': args,
+        }
+
+
+def _cpu_time():
+    times = os.times()
+    return (times.user + times.system +
+            times.children_user + times.children_system)
+
+
+class Tracer(object):
+    """Collect the spans of a command while entered
+
+    Only one tracer is active at a time, spans opened outside of it with
+    span() are not recorded.
+
+    :param name: Name of the root span
+    :type name: String
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.spans = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._previous = None
+        self._root = None
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def open(self, name, args=None):
+        stack = self._stack()
+        span = Span(name, len(stack), args)
+        stack.append(span)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def close(self, span, error=None):
+        span.finish(error)
+        stack = self._stack()
+        if span in stack:
+            stack.remove(span)
+
+    def __enter__(self):
+        global _ACTIVE
+        with _ACTIVE_LOCK:
+            self._previous = _ACTIVE
+            _ACTIVE = self
+        self._root = self.open(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        global _ACTIVE
+        self.close(self._root, exc_value)
+        with _ACTIVE_LOCK:
+            _ACTIVE = self._previous
+            self._previous = None
+
+    def export(self, path):
+        """Write the finished spans to path in the Chrome trace format
+
+        The file can be loaded in chrome://tracing or https://ui.perfetto.dev
+        """
+        pid = os.getpid()
+        with self._lock:
+            events = [s.to_event(pid) for s in self.spans
+                      if s.wall is not None]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return path
+
+    def summary(self):
+        """Return a table of the finished spans in start order"""
+        table = PrettyTable(['Phase', 'Wall (s)', 'CPU (s)',
+                             'Peak RSS (MiB)', 'Children peak RSS (MiB)'])
+        table.align['Phase'] = 'l'
+        with self._lock:
+            spans = sorted((s for s in self.spans if s.wall is not None),
+                           key=lambda s: s.start)
+        for s in spans:
+            name = '  ' * s.depth + s.name
+            if s.error:
+                name += ' (failed)'
+            table.add_row([name, '%.1f' % s.wall, '%.1f' % s.cpu,
+                           '%.0f' % (s.max_rss / 1024.0),
+                           '%.0f' % (s.children_max_rss / 1024.0)])
+        return table
+
+
+def get_tracer():
+    """Return the active Tracer or None"""
+    return _ACTIVE
+
+
+@contextlib.contextmanager
+def span(name, **args):
+    """Time the enclosed block as a span of the active tracer
+
+    Does nothing when no tracer is active.
+
+    :param name: Name of the span
+    :type name: String
+
+    :param args: Attributes recorded with the span
+    """
+    tracer = _ACTIVE
+    if tracer is None:
+        yield None
+        return
+    s = tracer.open(name, args)
+    try:
+        yield s
+    except BaseException as e:
+        tracer.close(s, e)
+        raise
+    tracer.close(s)
+
+
+def traced(name):
+    """Decorate a function to run it in a span
+
+    :param name: Name of the span, formatted with the arguments of the
+                 function, e.g. 'ansible-playbook {playbook}'
+    :type name: String
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _ACTIVE is None:
+                return func(*args, **kwargs)
+            bound = signature.bind_partial(*args, **kwargs)
+            with span(name.format(**bound.arguments)):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -16,7 +16,9 @@
 import collections
 from collections import abc as collections_abc
 
+from concurrent import futures
 import configparser
+import copy
 import csv
 import datetime
 import errno
@@ -41,11 +43,10 @@ import sys
 import tarfile
 import tempfile
 import textwrap
+import threading
 import time
 import yaml
 
-from ansible.parsing.dataloader import DataLoader
-from ansible.inventory.manager import InventoryManager
 from heatclient.common import event_utils
 from heatclient.common import template_utils
 from heatclient.common import utils as heat_utils
@@ -71,7 +72,9 @@ from tripleo_common.utils import stack as stack_utils
 from tripleo_common import update
 from tripleoclient import constants
 from tripleoclient import exceptions
+from tripleoclient import fact_cache
 from tripleoclient import heat_launcher
+from tripleoclient import tracing
 
 import warnings
 warnings.simplefilter("ignore", UserWarning)
@@ -243,214 +246,40 @@ def playbook_verbosity(self):
     return self.app_args.verbose_level
 
 
-def run_ansible_playbook(playbook, inventory, workdir, playbook_dir=None,
-                         connection='smart', output_callback='tripleo_dense',
-                         ssh_user='root', key=None, module_path=None,
-                         limit_hosts=None, tags=None, skip_tags=None,
-                         verbosity=0, quiet=False, extra_vars=None,
-                         extra_vars_file=None, plan='overcloud',
+def prepare_fact_cache(facts):
+    """Create the fact cache, move legacy facts into it and prune it
+
+    :param facts: Fact cache returned by fact_cache.get_fact_cache
+    """
+    makedirs(facts.path)
+    try:
+        if facts.plugin != 'jsonfile':
+            facts.migrate_jsonfile()
+        pruned = facts.prune()
+    finally:
+        facts.close()
+    if pruned:
+        LOG.debug('Pruned {} expired entries from the fact cache'.format(
+            pruned))
+
+
+def ansible_playbook_env(workdir, facts=None, connection='smart',
+                         output_callback='tripleo_dense', ssh_user='root',
+                         key=None, module_path=None, plan='overcloud',
                          gathering_policy='smart', extra_env_variables=None,
-                         parallel_run=False,
                          callback_whitelist=constants.ANSIBLE_CWL,
-                         ansible_cfg=None, ansible_timeout=30,
-                         reproduce_command=True,
-                         timeout=None, forks=None):
-    """Simple wrapper for ansible-playbook.
-
-    :param playbook: Playbook filename.
-    :type playbook: String
-
-    :param inventory: Either proper inventory file, or a coma-separated list.
-    :type inventory: String
-
-    :param workdir: Location of the working directory.
-    :type workdir: String
-
-    :param playbook_dir: Location of the playbook directory.
-                         (defaults to workdir).
-    :type playbook_dir: String
-
-    :param connection: Connection type (local, smart, etc).
-    :type connection: String
-
-    :param output_callback: Callback for output format. Defaults to
-                            "tripleo_dense".
-    :type output_callback: String
-
-    :param callback_whitelist: Comma separated list of callback plugins.
-                               Defaults to
-                               "tripleo_dense,tripleo_profile_tasks,
-                               tripleo_states".
-                               Custom output_callback is also whitelisted.
-    :type callback_whitelist: String
-
-    :param ssh_user: User for the ssh connection.
-    :type ssh_user: String
-
-    :param key: Private key to use for the ssh connection.
-    :type key: String
+                         ansible_cfg=None, ansible_timeout=30, forks=None):
+    """Return the environment run_ansible_playbook passes to ansible-runner
 
-    :param module_path: Location of the ansible module and library.
-    :type module_path: String
-
-    :param limit_hosts: Limit the execution to the hosts.
-    :type limit_hosts: String
-
-    :param tags: Run specific tags.
-    :type tags: String
-
-    :param skip_tags: Skip specific tags.
-    :type skip_tags: String
-
-    :param verbosity: Verbosity level for Ansible execution.
-    :type verbosity: Integer
-
-    :param quiet: Disable all output (Defaults to False)
-    :type quiet: Boolean
-
-    :param extra_vars: Set additional variables as a Dict or the absolute
-                       path of a JSON or YAML file type.
-    :type extra_vars: Either a Dict or the absolute path of JSON or YAML
-
-    :param extra_vars_file: Set additional ansible variables using an
-                            extravar file.
-    :type extra_vars_file: Dictionary
-
-    :param plan: Plan name (Defaults to "overcloud").
-    :type plan: String
-
-    :param gathering_policy: This setting controls the default policy of
-                             fact gathering ('smart', 'implicit', 'explicit').
-    :type gathering_facts: String
-
-    :param extra_env_variables: Dict option to extend or override any of the
-                                default environment variables.
-    :type extra_env_variables: Dict
-
-    :param parallel_run: Isolate playbook execution when playbooks are to be
-                         executed with multi-processing.
-    :type parallel_run: Boolean
-
-    :param ansible_cfg: Path to an ansible configuration file. One will be
-                        generated in the artifact path if this option is None.
-    :type ansible_cfg: String
-
-    :param ansible_timeout: Timeout for ansible connections.
-    :type ansible_timeout: int
-
-    :param reproduce_command: Enable or disable option to reproduce ansible
-                              commands upon failure. This option will produce
-                              a bash script that can reproduce a failing
-                              playbook command which is helpful for debugging
-                              and retry purposes.
-    :type reproduce_command: Boolean
+    The ansible.cfg file is written in workdir unless one is given or set
+    in the environment. The arguments have the same meaning as the
+    run_ansible_playbook ones.
 
-    :param timeout: Timeout for ansible to finish playbook execution (minutes).
-    :type timeout: int
+    :returns: Dict
     """
-
-    def _playbook_check(play):
-        if not os.path.exists(play):
-            play = os.path.join(playbook_dir, play)
-            if not os.path.exists(play):
-                raise RuntimeError('No such playbook: {}'.format(play))
-        LOG.debug('Ansible playbook {} found'.format(play))
-        return play
-
-    def _inventory(inventory):
-        if inventory:
-            if isinstance(inventory, str):
-                # check is file path
-                if os.path.exists(inventory):
-                    return inventory
-            elif isinstance(inventory, dict):
-                inventory = yaml.safe_dump(
-                    inventory,
-                    default_flow_style=False
-                )
-            inv_file = ansible_runner.utils.dump_artifact(
-                inventory,
-                workdir,
-                constants.ANSIBLE_HOSTS_FILENAME)
-            os.chmod(inv_file, 0o600)
-            return inv_file
-
-    def _running_ansible_msg(playbook, timeout=None):
-        if timeout and timeout > 0:
-            return ('Running Ansible playbook with timeout %sm: %s,' %
-                    (timeout, playbook))
-        return ('Running Ansible playbook: %s,' % playbook)
-
-    if not playbook_dir:
-        playbook_dir = workdir
-
-    # Ensure that the ansible-runner env exists
-    runner_env = os.path.join(workdir, 'env')
-    makedirs(runner_env)
-
-    if extra_vars_file:
-        runner_extra_vars = os.path.join(runner_env, 'extravars')
-        with open(runner_extra_vars, 'w') as f:
-            f.write(yaml.safe_dump(extra_vars_file, default_flow_style=False))
-
-    if timeout and timeout > 0:
-        settings_file = os.path.join(runner_env, 'settings')
-        timeout_value = timeout * 60
-        if os.path.exists(settings_file):
-            with open(settings_file, 'r') as f:
-                settings_object = yaml.safe_load(f.read())
-                settings_object['job_timeout'] = timeout_value
-        else:
-            settings_object = {'job_timeout': timeout_value}
-
-        with open(settings_file, 'w') as f:
-            f.write(yaml.safe_dump(settings_object, default_flow_style=False))
-
-    if isinstance(playbook, (list, set)):
-        verified_playbooks = [_playbook_check(play=i) for i in playbook]
-        playbook = os.path.join(workdir, 'tripleo-multi-playbook.yaml')
-        with open(playbook, 'w') as f:
-            f.write(
-                yaml.safe_dump(
-                    [{'import_playbook': i} for i in verified_playbooks],
-                    default_flow_style=False
-                )
-            )
-
-        LOG.info(
-            _running_ansible_msg(playbook, timeout) +
-            ' multi-playbook execution: {}'
-            ' Working directory: {},'
-            ' Playbook directory: {}'.format(
-                verified_playbooks,
-                workdir,
-                playbook_dir
-            )
-        )
-    else:
-        playbook = _playbook_check(play=playbook)
-        LOG.info(
-            _running_ansible_msg(playbook, timeout) +
-            ' Working directory: {},'
-            ' Playbook directory: {}'.format(
-                workdir,
-                playbook_dir
-            )
-        )
-
-    if limit_hosts:
-        LOG.info(
-            'Running ansible with the following limit: {}'.format(
-                limit_hosts
-            )
-        )
+    if facts is None:
+        facts = fact_cache.get_fact_cache()
     cwd = os.getcwd()
-    ansible_fact_path = os.path.join(
-        os.path.expanduser('~'),
-        '.tripleo',
-        'fact_cache'
-    )
-    makedirs(ansible_fact_path)
 
     if output_callback not in callback_whitelist.split(','):
         callback_whitelist = ','.join([callback_whitelist, output_callback])
@@ -567,7 +396,11 @@ def run_ansible_playbook(playbook, inventory, workdir, playbook_dir=None,
     env['ANSIBLE_RETRY_FILES_ENABLED'] = False
     env['ANSIBLE_HOST_KEY_CHECKING'] = False
     env['ANSIBLE_TRANSPORT'] = connection
-    env['ANSIBLE_CACHE_PLUGIN_TIMEOUT'] = 7200
+    env['ANSIBLE_CACHE_PLUGIN_TIMEOUT'] = facts.timeout
+    if facts.plugin != 'jsonfile':
+        env['ANSIBLE_CACHE_PLUGIN'] = facts.plugin
+        env['ANSIBLE_CACHE_PLUGIN_CONNECTION'] = facts.path
+        env['ANSIBLE_CACHE_PLUGINS'] = fact_cache.PLUGIN_DIR
 
     # Set var handling for better performance
     env['ANSIBLE_INJECT_FACT_VARS'] = False
@@ -610,23 +443,255 @@ def run_ansible_playbook(playbook, inventory, workdir, playbook_dir=None,
             LOG.error(msg)
             raise SystemError(msg)
         else:
-            env.update(extra_env_variables)
+            env.update(extra_env_variables)
+
+    if 'ANSIBLE_CONFIG' not in env and not ansible_cfg:
+        ansible_cfg = os.path.join(workdir, 'ansible.cfg')
+        config = configparser.ConfigParser()
+        if os.path.isfile(ansible_cfg):
+            config.read(ansible_cfg)
+
+        if 'defaults' not in config.sections():
+            config.add_section('defaults')
+
+        config.set('defaults', 'internal_poll_interval', '0.01')
+        with open(ansible_cfg, 'w') as f:
+            config.write(f)
+        env['ANSIBLE_CONFIG'] = ansible_cfg
+    elif 'ANSIBLE_CONFIG' not in env and ansible_cfg:
+        env['ANSIBLE_CONFIG'] = ansible_cfg
+
+    return env
+
+
+@tracing.traced('ansible-playbook {playbook}')
+def run_ansible_playbook(playbook, inventory, workdir, playbook_dir=None,
+                         connection='smart', output_callback='tripleo_dense',
+                         ssh_user='root', key=None, module_path=None,
+                         limit_hosts=None, tags=None, skip_tags=None,
+                         verbosity=0, quiet=False, extra_vars=None,
+                         extra_vars_file=None, plan='overcloud',
+                         gathering_policy='smart', extra_env_variables=None,
+                         parallel_run=False,
+                         callback_whitelist=constants.ANSIBLE_CWL,
+                         ansible_cfg=None, ansible_timeout=30,
+                         reproduce_command=True,
+                         timeout=None, forks=None, event_handler=None,
+                         ansible_env=None):
+    """Simple wrapper for ansible-playbook.
+
+    :param playbook: Playbook filename.
+    :type playbook: String
+
+    :param inventory: Either proper inventory file, or a coma-separated list.
+    :type inventory: String
+
+    :param workdir: Location of the working directory.
+    :type workdir: String
+
+    :param playbook_dir: Location of the playbook directory.
+                         (defaults to workdir).
+    :type playbook_dir: String
+
+    :param connection: Connection type (local, smart, etc).
+    :type connection: String
+
+    :param output_callback: Callback for output format. Defaults to
+                            "tripleo_dense".
+    :type output_callback: String
+
+    :param callback_whitelist: Comma separated list of callback plugins.
+                               Defaults to
+                               "tripleo_dense,tripleo_profile_tasks,
+                               tripleo_states".
+                               Custom output_callback is also whitelisted.
+    :type callback_whitelist: String
+
+    :param ssh_user: User for the ssh connection.
+    :type ssh_user: String
+
+    :param key: Private key to use for the ssh connection.
+    :type key: String
+
+    :param module_path: Location of the ansible module and library.
+    :type module_path: String
+
+    :param limit_hosts: Limit the execution to the hosts.
+    :type limit_hosts: String
+
+    :param tags: Run specific tags.
+    :type tags: String
+
+    :param skip_tags: Skip specific tags.
+    :type skip_tags: String
+
+    :param verbosity: Verbosity level for Ansible execution.
+    :type verbosity: Integer
+
+    :param quiet: Disable all output (Defaults to False)
+    :type quiet: Boolean
+
+    :param extra_vars: Set additional variables as a Dict or the absolute
+                       path of a JSON or YAML file type.
+    :type extra_vars: Either a Dict or the absolute path of JSON or YAML
+
+    :param extra_vars_file: Set additional ansible variables using an
+                            extravar file.
+    :type extra_vars_file: Dictionary
+
+    :param plan: Plan name (Defaults to "overcloud").
+    :type plan: String
+
+    :param gathering_policy: This setting controls the default policy of
+                             fact gathering ('smart', 'implicit', 'explicit').
+    :type gathering_facts: String
+
+    :param extra_env_variables: Dict option to extend or override any of the
+                                default environment variables.
+    :type extra_env_variables: Dict
+
+    :param parallel_run: Isolate playbook execution when playbooks are to be
+                         executed with multi-processing.
+    :type parallel_run: Boolean
+
+    :param ansible_cfg: Path to an ansible configuration file. One will be
+                        generated in the artifact path if this option is None.
+    :type ansible_cfg: String
+
+    :param ansible_timeout: Timeout for ansible connections.
+    :type ansible_timeout: int
+
+    :param reproduce_command: Enable or disable option to reproduce ansible
+                              commands upon failure. This option will produce
+                              a bash script that can reproduce a failing
+                              playbook command which is helpful for debugging
+                              and retry purposes.
+    :type reproduce_command: Boolean
+
+    :param timeout: Timeout for ansible to finish playbook execution (minutes).
+    :type timeout: int
+
+    :param event_handler: Callable invoked with every ansible-runner event.
+    :type event_handler: Function
+
+    :param ansible_env: Environment returned by ansible_playbook_env. When
+                        set, the environment and ansible.cfg are not
+                        computed again, the options used to build them are
+                        ignored and the fact cache is expected to be
+                        prepared with prepare_fact_cache.
+    :type ansible_env: Dict
+    """
+
+    def _playbook_check(play):
+        if not os.path.exists(play):
+            play = os.path.join(playbook_dir, play)
+            if not os.path.exists(play):
+                raise RuntimeError('No such playbook: {}'.format(play))
+        LOG.debug('Ansible playbook {} found'.format(play))
+        return play
+
+    def _inventory(inventory):
+        if inventory:
+            if isinstance(inventory, str):
+                # check is file path
+                if os.path.exists(inventory):
+                    return inventory
+            elif isinstance(inventory, dict):
+                inventory = yaml.safe_dump(
+                    inventory,
+                    default_flow_style=False
+                )
+            inv_file = ansible_runner.utils.dump_artifact(
+                inventory,
+                workdir,
+                constants.ANSIBLE_HOSTS_FILENAME)
+            os.chmod(inv_file, 0o600)
+            return inv_file
+
+    def _running_ansible_msg(playbook, timeout=None):
+        if timeout and timeout > 0:
+            return ('Running Ansible playbook with timeout %sm: %s,' %
+                    (timeout, playbook))
+        return ('Running Ansible playbook: %s,' % playbook)
+
+    if not playbook_dir:
+        playbook_dir = workdir
+
+    # Ensure that the ansible-runner env exists
+    runner_env = os.path.join(workdir, 'env')
+    makedirs(runner_env)
+
+    if extra_vars_file:
+        runner_extra_vars = os.path.join(runner_env, 'extravars')
+        with open(runner_extra_vars, 'w') as f:
+            f.write(yaml.safe_dump(extra_vars_file, default_flow_style=False))
+
+    if timeout and timeout > 0:
+        settings_file = os.path.join(runner_env, 'settings')
+        timeout_value = timeout * 60
+        if os.path.exists(settings_file):
+            with open(settings_file, 'r') as f:
+                settings_object = yaml.safe_load(f.read())
+                settings_object['job_timeout'] = timeout_value
+        else:
+            settings_object = {'job_timeout': timeout_value}
 
-    if 'ANSIBLE_CONFIG' not in env and not ansible_cfg:
-        ansible_cfg = os.path.join(workdir, 'ansible.cfg')
-        config = configparser.ConfigParser()
-        if os.path.isfile(ansible_cfg):
-            config.read(ansible_cfg)
+        with open(settings_file, 'w') as f:
+            f.write(yaml.safe_dump(settings_object, default_flow_style=False))
 
-        if 'defaults' not in config.sections():
-            config.add_section('defaults')
+    if isinstance(playbook, (list, set)):
+        verified_playbooks = [_playbook_check(play=i) for i in playbook]
+        playbook = os.path.join(workdir, 'tripleo-multi-playbook.yaml')
+        with open(playbook, 'w') as f:
+            f.write(
+                yaml.safe_dump(
+                    [{'import_playbook': i} for i in verified_playbooks],
+                    default_flow_style=False
+                )
+            )
 
-        config.set('defaults', 'internal_poll_interval', '0.01')
-        with open(ansible_cfg, 'w') as f:
-            config.write(f)
-        env['ANSIBLE_CONFIG'] = ansible_cfg
-    elif 'ANSIBLE_CONFIG' not in env and ansible_cfg:
-        env['ANSIBLE_CONFIG'] = ansible_cfg
+        LOG.info(
+            _running_ansible_msg(playbook, timeout) +
+            ' multi-playbook execution: {}'
+            ' Working directory: {},'
+            ' Playbook directory: {}'.format(
+                verified_playbooks,
+                workdir,
+                playbook_dir
+            )
+        )
+    else:
+        playbook = _playbook_check(play=playbook)
+        LOG.info(
+            _running_ansible_msg(playbook, timeout) +
+            ' Working directory: {},'
+            ' Playbook directory: {}'.format(
+                workdir,
+                playbook_dir
+            )
+        )
+
+    if limit_hosts:
+        LOG.info(
+            'Running ansible with the following limit: {}'.format(
+                limit_hosts
+            )
+        )
+    facts = fact_cache.get_fact_cache()
+    ansible_fact_path = facts.path
+
+    if ansible_env is None:
+        prepare_fact_cache(facts)
+        ansible_env = ansible_playbook_env(
+            workdir=workdir, facts=facts, connection=connection,
+            output_callback=output_callback, ssh_user=ssh_user, key=key,
+            module_path=module_path, plan=plan,
+            gathering_policy=gathering_policy,
+            extra_env_variables=extra_env_variables,
+            callback_whitelist=callback_whitelist, ansible_cfg=ansible_cfg,
+            ansible_timeout=ansible_timeout, forks=forks)
+    env = dict(ansible_env)
+    get_uid = int(os.getenv('SUDO_UID', os.getuid()))
 
     command_path = None
     with TempDirs(chdir=False) as ansible_artifact_path:
@@ -641,7 +706,7 @@ def run_ansible_playbook(playbook, inventory, workdir, playbook_dir=None,
             'quiet': quiet,
             'extravars': extra_vars,
             'fact_cache': ansible_fact_path,
-            'fact_cache_type': 'jsonfile',
+            'fact_cache_type': facts.plugin,
             'artifact_dir': ansible_artifact_path,
             'rotate_artifacts': 256
         }
@@ -668,7 +733,11 @@ def run_ansible_playbook(playbook, inventory, workdir, playbook_dir=None,
         #                  made available to us, this line should be removed.
         runner_config.env['ANSIBLE_STDOUT_CALLBACK'] = \
             r_opts['envvars']['ANSIBLE_STDOUT_CALLBACK']
-        runner = ansible_runner.Runner(config=runner_config)
+        if event_handler:
+            runner = ansible_runner.Runner(config=runner_config,
+                                           event_handler=event_handler)
+        else:
+            runner = ansible_runner.Runner(config=runner_config)
 
         if reproduce_command:
             command_path = os.path.join(
@@ -733,6 +802,283 @@ def run_ansible_playbook(playbook, inventory, workdir, playbook_dir=None,
             playbook))
 
 
+# Native implementations of localhost-only playbooks keyed by playbook name
+LOCAL_PLAYBOOK_ACTIONS = {}
+
+
+def local_playbook_action(playbook):
+    """Register a native implementation of a localhost-only playbook
+
+    The decorated function is called with the playbook extra vars and any
+    context passed to run_local_playbook. It returns True when the work
+    was done, or False to have the playbook run through ansible-runner.
+    """
+    def decorator(func):
+        LOCAL_PLAYBOOK_ACTIONS[playbook] = func
+        return func
+    return decorator
+
+
+def run_local_playbook(playbook, workdir, extra_vars=None, context=None,
+                       session=None, **kwargs):
+    """Run a localhost-only playbook, in-process when possible.
+
+    :param playbook: Playbook filename.
+    :type playbook: String
+
+    :param workdir: Location of the working directory.
+    :type workdir: String
+
+    :param extra_vars: Variables passed to the playbook and to the native
+                       implementation.
+    :type extra_vars: Dict
+
+    :param context: Additional keyword arguments for the native
+                    implementation only.
+    :type context: Dict
+
+    :param session: Session running the playbook when it has to be run by
+                    Ansible.
+    :type session: PlaybookSession
+
+    All other keyword arguments are passed to run_ansible_playbook when
+    the playbook has to be run by Ansible.
+    """
+    action = LOCAL_PLAYBOOK_ACTIONS.get(playbook)
+    if action is not None:
+        try:
+            handled = action(extra_vars or {}, **(context or {}))
+        except Exception as e:
+            LOG.warning('Native execution of %s failed, falling back to '
+                        'ansible: %s', playbook, e)
+            handled = False
+        if handled:
+            LOG.info('Native execution success. playbook: %s', playbook)
+            return
+
+    run = session.run if session else run_ansible_playbook
+    run(playbook=playbook,
+        inventory='localhost,',
+        workdir=workdir,
+        extra_vars=extra_vars,
+        **kwargs)
+
+
+def _has_recursive_acl(path, user, perms='rwx'):
+    """Check every entry below path has a named user ACL with perms"""
+    output = subprocess.check_output(
+        ['getfacl', '-R', '-p', '--absolute-names', '--', path],
+        stderr=subprocess.DEVNULL, universal_newlines=True)
+    entry = 'user:{}:{}'.format(user, perms)
+    for block in output.split('\n\n'):
+        lines = [line.split('\t')[0].strip() for line in block.splitlines()]
+        if not any(line.startswith('# file:') for line in lines):
+            continue
+        if entry not in lines:
+            return False
+    return True
+
+
+@local_playbook_action('cli-grant-local-access.yaml')
+def _grant_local_access(extra_vars):
+    """Check the required access to the whole path is already granted
+
+    The playbook grants rwx ACLs to the execution user and to
+    tripleo-admin. Granting access needs privilege escalation, so only the
+    case where nothing has to change is handled natively.
+    """
+    if extra_vars.get('execution_user') != getpass.getuser():
+        return False
+    access_path = extra_vars.get('access_path')
+    if not access_path or not os.path.isdir(access_path):
+        return False
+    dir_mode = os.R_OK | os.W_OK | os.X_OK
+    if not os.access(access_path, dir_mode):
+        return False
+    for root, dirs, files in os.walk(access_path):
+        for name in dirs:
+            if not os.access(os.path.join(root, name), dir_mode):
+                return False
+        for name in files:
+            path = os.path.join(root, name)
+            if (not os.path.islink(path) and
+                    not os.access(path, os.R_OK | os.W_OK)):
+                return False
+    return _has_recursive_acl(access_path, 'tripleo-admin')
+
+
+@local_playbook_action('cli-undercloud-get-horizon-url.yaml')
+def _get_horizon_url(extra_vars, working_dir=None):
+    """Write the Horizon URL from the saved EndpointMap stack output"""
+    if not working_dir:
+        return False
+    endpoint_map = get_stack_saved_output_item('EndpointMap', working_dir)
+    horizon_url = (endpoint_map or {}).get('HorizonPublic', {}).get('uri')
+    if not horizon_url:
+        return False
+    output_file = extra_vars['horizon_url_output_file']
+    makedirs(os.path.dirname(output_file))
+    with open(output_file, 'w') as f:
+        f.write(horizon_url)
+    return True
+
+
+class PlaybookSession(object):
+    """Run the playbooks of a command from one prepared ansible environment.
+
+    >>> session = PlaybookSession(workdir=path, verbosity=1)
+    >>> session.run('first.yaml', inventory='localhost,')
+    >>> session.run('second.yaml', inventory='localhost,', workdir=other)
+
+    The fact cache is pruned once, before the first playbook of the
+    session, and the ansible environment and ansible.cfg are prepared once
+    per working directory and set of environment options. The outcome of
+    each playbook is recorded in the results attribute.
+
+    A with block is only needed when no workdir is given, it removes the
+    temporary working directory used instead.
+    """
+
+    # run_ansible_playbook options used to compute the environment
+    _ENV_OPTIONS = ('connection', 'output_callback', 'ssh_user', 'key',
+                    'module_path', 'plan', 'gathering_policy',
+                    'extra_env_variables', 'callback_whitelist',
+                    'ansible_cfg', 'ansible_timeout', 'forks')
+
+    def __init__(self, workdir=None, **defaults):
+        """Create a playbook session.
+
+        :param workdir: Default working directory, a temporary directory is
+                        used when not set.
+        :type workdir: String
+
+        All other keyword arguments are run_ansible_playbook defaults
+        applied to every playbook of the session.
+        """
+        self.workdir = workdir
+        self.defaults = defaults
+        self.results = collections.OrderedDict()
+        self._envs = {}
+        self._facts = None
+        self._tmp = None
+
+    def __enter__(self):
+        if not self.workdir:
+            self._tmp = TempDirs(dir_prefix='tripleo-session')
+            self.workdir = self._tmp.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._tmp:
+            self._tmp.__exit__(exc_type, exc_value, traceback)
+
+    @staticmethod
+    def _label(playbook):
+        if isinstance(playbook, (list, set)):
+            return ','.join(playbook)
+        return playbook
+
+    def _env(self, options):
+        """Return the cached environment for a set of options"""
+        if self._facts is None:
+            self._facts = fact_cache.get_fact_cache()
+            prepare_fact_cache(self._facts)
+        env_options = dict((k, options[k]) for k in self._ENV_OPTIONS
+                           if k in options)
+        key = json.dumps([options['workdir'], env_options], sort_keys=True,
+                         default=str)
+        if key not in self._envs:
+            makedirs(options['workdir'])
+            self._envs[key] = ansible_playbook_env(
+                workdir=options['workdir'], facts=self._facts,
+                **env_options)
+        return self._envs[key]
+
+    def run(self, playbook, **kwargs):
+        """Run a playbook, as run_ansible_playbook does."""
+        options = dict(self.defaults)
+        options.update(kwargs)
+        options.setdefault('workdir', self.workdir)
+        label = self._label(playbook)
+        try:
+            run_ansible_playbook(playbook=playbook,
+                                 ansible_env=self._env(options),
+                                 **options)
+        except Exception:
+            self.results[label] = 'failed'
+            raise
+        self.results[label] = 'successful'
+
+
+def run_phase_graph(phases, max_workers=None, logger=LOG):
+    """Run named phases concurrently, honouring their dependencies.
+
+    A phase starts as soon as all the phases it depends on have finished.
+    Once a phase fails no new phase is started, the running ones are
+    waited for and the first error is raised again.
+
+    :param phases: Phase name mapped to a (callable, dependencies) tuple,
+                   where dependencies is an iterable of phase names.
+    :type phases: Dictionary
+
+    :param max_workers: Maximum number of phases running at once, defaults
+                        to the number of phases.
+    :type max_workers: Integer
+
+    :param logger: Logger receiving the phase timings.
+    :type logger: Logger
+
+    :returns: Dictionary of phase name mapped to its duration in seconds,
+              in completion order.
+    """
+    for name, (unused, deps) in phases.items():
+        unknown = set(deps) - set(phases)
+        if unknown:
+            raise ValueError(
+                'Phase {} depends on unknown phase(s): {}'.format(
+                    name, ', '.join(sorted(unknown))))
+
+    def _timed(name, func):
+        start = time.monotonic()
+        logger.info('Phase %s started', name)
+        func()
+        elapsed = time.monotonic() - start
+        logger.info('Phase %s finished in %.1f seconds', name, elapsed)
+        return elapsed
+
+    timings = collections.OrderedDict()
+    pending = dict(phases)
+    running = {}
+    error = None
+    with futures.ThreadPoolExecutor(
+            max_workers=max_workers or max(len(phases), 1)) as executor:
+        while pending or running:
+            if error is None:
+                for name, (func, deps) in list(pending.items()):
+                    if all(dep in timings for dep in deps):
+                        running[executor.submit(_timed, name, func)] = name
+                        del pending[name]
+            if not running:
+                if error is None:
+                    raise ValueError(
+                        'Phase dependency cycle between: {}'.format(
+                            ', '.join(sorted(pending))))
+                break
+            done, unused = futures.wait(
+                running, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    timings[name] = future.result()
+                except Exception as e:
+                    logger.error('Phase %s failed: %s', name, e)
+                    if error is None:
+                        error = e
+    if error is not None:
+        raise error
+    return timings
+
+
 def convert(data):
     """Recursively converts dictionary keys,values to strings."""
     if isinstance(data, str):
@@ -1345,8 +1691,34 @@ def node_add_capabilities(bm_client, node, **updated):
     return caps
 
 
+def _index_node_profiles(bm_nodes, free_node_caps):
+    """Build profile indexes for the nodes in a single pass.
+
+    :returns: tuple of two dicts. The first maps a profile to the nodes
+              already having it, the second maps a profile to the
+              available nodes without a profile that declare a
+              ``<profile>_profile`` capability. Node order is preserved.
+    """
+    assigned = collections.defaultdict(list)
+    candidates = collections.defaultdict(list)
+    suffix = '_profile'
+    for uu, caps in free_node_caps.items():
+        profile = caps.get('profile')
+        assigned[profile].append(uu)
+        if profile:
+            continue
+        if bm_nodes[uu].provision_state != 'available':
+            continue
+        for key, value in caps.items():
+            if (key.endswith(suffix) and len(key) > len(suffix) and
+                    str(value).lower() in ('1', 'true')):
+                candidates[key[:-len(suffix)]].append(uu)
+    return assigned, candidates
+
+
 def assign_and_verify_profiles(bm_client, flavors,
-                               assign_profiles=False, dry_run=False):
+                               assign_profiles=False, dry_run=False,
+                               concurrency=constants.PROFILE_ASSIGN_WORKERS):
     """Assign and verify profiles for given flavors.
 
     :param bm_client: ironic client instance
@@ -1354,6 +1726,7 @@ def assign_and_verify_profiles(bm_client, flavors,
     :param assign_profiles: whether to allow assigning profiles to nodes
     :param dry_run: whether to skip applying actual changes (only makes sense
                     if assign_profiles is True)
+    :param concurrency: maximum number of concurrent ironic node updates
     :returns: tuple (errors count, warnings count)
     """
     log = logging.getLogger(__name__ + ".assign_and_verify_profiles")
@@ -1368,6 +1741,10 @@ def assign_and_verify_profiles(bm_client, flavors,
     # create a pool of unprocessed nodes and record their capabilities
     free_node_caps = {uu: node_get_capabilities(node)
                       for uu, node in bm_nodes.items()}
+    profile_index, candidate_index = _index_node_profiles(bm_nodes,
+                                                          free_node_caps)
+    # list of (node uuid, profile) to save on the nodes
+    plan = []
 
     # TODO(dtantsur): use command-line arguments to specify the order in
     # which profiles are processed (might matter for assigning profiles)
@@ -1394,8 +1771,8 @@ def assign_and_verify_profiles(bm_client, flavors,
         profile_flavor_used = True
 
         # first collect nodes with known profiles
-        assigned_nodes = [uu for uu, caps in free_node_caps.items()
-                          if caps.get('profile') == profile]
+        assigned_nodes = [uu for uu in profile_index.get(profile, [])
+                          if uu in free_node_caps]
         required_count = scale - len(assigned_nodes)
 
         if required_count < 0:
@@ -1406,15 +1783,8 @@ def assign_and_verify_profiles(bm_client, flavors,
         elif required_count > 0 and assign_profiles:
             # find more nodes by checking XXX_profile capabilities that are
             # set by ironic-inspector or manually
-            capability = '%s_profile' % profile
-            more_nodes = [
-                uu for uu, caps in free_node_caps.items()
-                # use only nodes without a know profile
-                if not caps.get('profile') and
-                caps.get(capability, '').lower() in ('1', 'true') and
-                # do not assign profiles for active nodes
-                bm_nodes[uu].provision_state == 'available'
-            ][:required_count]
+            more_nodes = [uu for uu in candidate_index.get(profile, [])
+                          if uu in free_node_caps][:required_count]
             assigned_nodes.extend(more_nodes)
             required_count -= len(more_nodes)
 
@@ -1424,10 +1794,7 @@ def assign_and_verify_profiles(bm_client, flavors,
             # save profile for newly assigned nodes, but only if we
             # succeeded in finding enough of them
             if not required_count and not node_caps.get('profile'):
-                node = bm_nodes[uu]
-                if not dry_run:
-                    node_add_capabilities(bm_client, node, profile=profile)
-                log.info('Node %s was assigned profile %s', uu, profile)
+                plan.append((uu, profile))
             else:
                 log.debug('Node %s has profile %s', uu, profile)
 
@@ -1443,6 +1810,29 @@ def assign_and_verify_profiles(bm_client, flavors,
                 profile)
             predeploy_errors += 1
 
+    if plan and dry_run:
+        print(_('Profile assignment plan (dry run):'))
+        for uu, profile in plan:
+            print('  {} -> {}'.format(uu, profile))
+    elif plan:
+        workers = max(1, min(len(plan), concurrency))
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            future_to_node = {
+                executor.submit(node_add_capabilities, bm_client,
+                                bm_nodes[uu], profile=profile): (uu, profile)
+                for uu, profile in plan
+            }
+            for future in futures.as_completed(future_to_node):
+                uu, profile = future_to_node[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    log.error('Error: failed to assign profile %s to '
+                              'node %s: %s', profile, uu, e)
+                    predeploy_errors += 1
+                else:
+                    log.info('Node %s was assigned profile %s', uu, profile)
+
     nodes_without_profile = [uu for uu, caps in free_node_caps.items()
                              if not caps.get('profile')]
     if nodes_without_profile and profile_flavor_used:
@@ -1844,8 +2234,47 @@ def update_working_dir_defaults(working_dir, args):
         copy_to_wd(working_dir, file, stack_name, 'vips')
 
 
+# Validation results of build_stack_data keyed by the digest of its inputs
+_STACK_DATA_CACHE = {}
+
+
+def _stack_data_digest(template, files, env_files):
+    digest = hashlib.sha256()
+    for item in (template, files, env_files):
+        digest.update(json.dumps(item, sort_keys=True,
+                                 default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
 def build_stack_data(clients, stack_name, template,
-                     files, env_files):
+                     files, env_files, cache_dir=None):
+    """Validate the templates with Heat and flatten the resource tree
+
+    Results are memoized by a digest of the template, files and
+    environment files so an unchanged template set does not trigger
+    another nested validation. When cache_dir is given the latest result
+    is also persisted there and reused by subsequent runs.
+    """
+    key = _stack_data_digest(template, files, env_files)
+    if key in _STACK_DATA_CACHE:
+        return _STACK_DATA_CACHE[key]
+
+    cache_file = None
+    if cache_dir:
+        cache_file = os.path.join(
+            cache_dir,
+            constants.WD_DEFAULT_STACK_DATA_CACHE_FILE_NAME.format(
+                stack_name))
+        try:
+            with open(cache_file, 'r') as f:
+                cached = json.load(f)
+            if cached.get('digest') == key:
+                LOG.debug('Using cached stack data from %s', cache_file)
+                _STACK_DATA_CACHE[key] = cached['stack_data']
+                return cached['stack_data']
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
     orchestration_client = clients.orchestration
     fields = {
         'template': template,
@@ -1863,6 +2292,16 @@ def build_stack_data(clients, stack_name, template,
         stack_utils._flat_it(flattened, 'Root', result)
         stack_data['heat_resource_tree'] = flattened
 
+        _STACK_DATA_CACHE.clear()
+        _STACK_DATA_CACHE[key] = stack_data
+        if cache_file:
+            try:
+                with open(cache_file, 'w') as f:
+                    json.dump({'digest': key, 'stack_data': stack_data}, f)
+            except (IOError, OSError) as e:
+                LOG.warning('Unable to write stack data cache %s: %s',
+                            cache_file, e)
+
     return stack_data
 
 
@@ -2772,7 +3211,21 @@ def launch_heat(launcher=None, restore_db=False, heat_type='pod'):
     _heat_pid = 0
     if launcher.heat_type == 'native':
         _heat_pid = os.fork()
-    if _heat_pid == 0:
+    if launcher.heat_type == 'pod':
+        # The database and message bus are probed concurrently
+        timings = run_phase_graph({
+            'check database': (launcher.check_database, []),
+            'check message bus': (launcher.check_message_bus, []),
+            'heat db sync': (lambda: launcher.heat_db_sync(restore_db),
+                             ['check database', 'check message bus']),
+            'launch heat': (launcher.launch_heat, ['heat db sync']),
+        })
+        LOG.info('Heat launched: %s', ', '.join(
+            '{} {:.1f}s'.format(name, elapsed)
+            for name, elapsed in timings.items()))
+    elif _heat_pid == 0:
+        # NOTE: The native launcher execs heat-all from the forked child,
+        # which must not start any thread.
         launcher.check_database()
         launcher.check_message_bus()
         launcher.heat_db_sync(restore_db)
@@ -2795,6 +3248,27 @@ def test_heat_api_port(heat_api_socket, host, port):
     heat_api_socket.connect((host, port))
 
 
+def parse_heat_tuning(tuning_strings, node_count=None):
+    """Parse --heat-tuning values into ephemeral Heat tuning overrides
+
+    :param tuning_strings: key=value or YAML/JSON strings
+    :type tuning_strings: list of strings
+    :param node_count: number of overcloud nodes, used unless the
+                       node_count setting is given explicitly
+    :type node_count: int
+    :returns: dict of overrides for heat_launcher.get_heat_tuning
+    """
+    tuning = parse_extra_vars(tuning_strings or [])
+    if node_count and 'node_count' not in tuning:
+        tuning['node_count'] = node_count
+    try:
+        heat_launcher.get_heat_tuning(tuning)
+    except (TypeError, ValueError) as e:
+        raise oscexc.CommandError(
+            _('Invalid heat tuning {}: {}').format(tuning, e))
+    return tuning
+
+
 def get_heat_launcher(heat_type, *args, **kwargs):
     if heat_type == 'native':
         return heat_launcher.HeatNativeLauncher(*args, **kwargs)
@@ -2820,9 +3294,82 @@ def get_default_working_dir(stack):
         "overcloud-deploy", stack)
 
 
-def get_ctlplane_attrs():
+# Authenticated openstacksdk connections shared process wide, per cloud
+_SDK_CONNECTIONS = {}
+_SDK_CONNECTIONS_LOCK = threading.Lock()
+
+
+def _tune_connection_pool(conn, pool_size):
+    """Resize the HTTP connection pools of an openstacksdk connection
+
+    The adapter class mounted by keystoneauth is kept so its socket
+    options still apply, only the pool sizes are raised so concurrent
+    workflows do not discard connections to the same endpoint.
+    """
+    session = getattr(conn, 'session', None)
+    requests_session = getattr(session, 'session', None)
+    if requests_session is None:
+        return
+    for prefix in ('https://', 'http://'):
+        adapter = requests_session.adapters.get(prefix)
+        if adapter is None:
+            continue
+        requests_session.mount(prefix, type(adapter)(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size))
+
+
+def get_sdk_connection(cloud='undercloud',
+                       pool_size=constants.SDK_CONNECTION_POOL_SIZE):
+    """Return the shared openstacksdk connection of a cloud
+
+    clouds.yaml is read and Keystone is authenticated only the first time
+    a cloud is requested, later callers reuse the same session and token.
+
+    :param cloud: Name of the cloud in clouds.yaml
+    :type cloud: String
+
+    :param pool_size: Size of the HTTP connection pool per endpoint
+    :type pool_size: Integer
+
+    :returns: openstack.connection.Connection
+    """
+    with _SDK_CONNECTIONS_LOCK:
+        conn = _SDK_CONNECTIONS.get(cloud)
+        if conn is None:
+            conn = openstack.connect(cloud=cloud)
+            _tune_connection_pool(conn, pool_size)
+            _SDK_CONNECTIONS[cloud] = conn
+        return conn
+
+
+def clear_sdk_connections():
+    """Close and forget the shared openstacksdk connections
+
+    The results memoized from them, like get_ctlplane_attrs, are dropped
+    as well.
+    """
+    with _SDK_CONNECTIONS_LOCK:
+        for conn in _SDK_CONNECTIONS.values():
+            try:
+                conn.close()
+            except Exception as e:
+                LOG.debug('Failed to close connection: %s', e)
+        _SDK_CONNECTIONS.clear()
+        _CTLPLANE_ATTRS.clear()
+
+
+# Attributes of the subnets fetched by get_ctlplane_attrs
+CTLPLANE_SUBNET_FIELDS = ('id', 'name', 'cidr', 'gateway_ip', 'host_routes',
+                          'dns_nameservers', 'ip_version')
+
+# get_ctlplane_attrs result memoized until clear_sdk_connections
+_CTLPLANE_ATTRS = {}
+
+
+def _fetch_ctlplane_attrs():
     try:
-        conn = openstack.connect('undercloud')
+        conn = get_sdk_connection('undercloud')
     except openstack.exceptions.ConfigException:
         return dict()
 
@@ -2842,8 +3389,13 @@ def get_ctlplane_attrs():
         'tags': network.tags,
     })
 
+    # A single list call for all the subnets, ordered as on the network
+    subnets = {subnet.id: subnet for subnet in conn.network.subnets(
+        network_id=network.id, fields=list(CTLPLANE_SUBNET_FIELDS))}
     for subnet_id in network.subnet_ids:
-        subnet = conn.network.get_subnet(subnet_id)
+        subnet = subnets.get(subnet_id)
+        if subnet is None:
+            continue
         net_attributes_map['subnets'].update({
             subnet.name: {
                 'name': subnet.name,
@@ -2858,6 +3410,24 @@ def get_ctlplane_attrs():
     return net_attributes_map
 
 
+def get_ctlplane_attrs():
+    """Return the attributes of the undercloud ctlplane network and subnets
+
+    The network is looked up once per process, later calls return a copy
+    of the first result.
+
+    :returns: dict with 'network' and 'subnets' keys, empty when the
+              undercloud or its ctlplane network is unavailable
+    """
+    with _SDK_CONNECTIONS_LOCK:
+        attrs = _CTLPLANE_ATTRS.get('undercloud')
+    if attrs is None:
+        attrs = _fetch_ctlplane_attrs()
+        with _SDK_CONNECTIONS_LOCK:
+            attrs = _CTLPLANE_ATTRS.setdefault('undercloud', attrs)
+    return copy.deepcopy(attrs)
+
+
 def cleanup_host_entry(entry):
     # remove any tab or space excess
     entry_stripped = re.sub('[ \t]+', ' ', str(entry).rstrip())
@@ -3233,17 +3803,324 @@ def get_parameter_file(path):
     return file_data
 
 
+class InventoryIndex(object):
+    """Index of a static YAML Ansible inventory
+
+    Holds group to hosts and host to vars mappings built directly from the
+    YAML data, so membership checks do not need the Ansible inventory
+    machinery.
+    """
+
+    _GROUP_KEYS = frozenset(['hosts', 'children', 'vars'])
+
+    def __init__(self, data):
+        self.groups = {}
+        self.hostvars = {}
+        self._children = {}
+        for name, group in data.items():
+            self._add_group(name, group)
+        # Every host belongs to the implicit "all" group
+        self.groups.setdefault('all', {}).update(
+            (host, None) for host in self.hostvars)
+        self._resolved = {}
+
+    @classmethod
+    def is_static(cls, data):
+        """Return True if data looks like a static YAML inventory"""
+        if not isinstance(data, dict) or not data:
+            return False
+        for group in data.values():
+            if group is None:
+                continue
+            if not isinstance(group, dict) or not cls._GROUP_KEYS.issuperset(
+                    group):
+                return False
+        return True
+
+    def _add_group(self, name, group):
+        group = group or {}
+        hosts = self.groups.setdefault(name, {})
+        for host, host_vars in (group.get('hosts') or {}).items():
+            hosts[host] = None
+            self.hostvars.setdefault(host, {}).update(host_vars or {})
+        children = self._children.setdefault(name, [])
+        for child, child_group in (group.get('children') or {}).items():
+            children.append(child)
+            self._add_group(child, child_group)
+
+    def _group_hosts(self, name, seen=None):
+        if name in self._resolved:
+            return self._resolved[name]
+        seen = seen or set()
+        seen.add(name)
+        hosts = dict(self.groups.get(name, {}))
+        for child in self._children.get(name, []):
+            if child not in seen:
+                hosts.update(self._group_hosts(child, seen))
+        self._resolved[name] = hosts
+        return hosts
+
+    def __contains__(self, host):
+        return host in self.hostvars
+
+    def has_pattern(self, pattern):
+        return pattern in self.groups or pattern in self.hostvars
+
+    def children(self, group):
+        """Return the names of the direct child groups of a group"""
+        return list(self._children.get(group, []))
+
+    def get_hosts(self, pattern):
+        """Return the host names of a group, or the host itself"""
+        if pattern in self.groups:
+            return list(self._group_hosts(pattern))
+        if pattern in self.hostvars:
+            return [pattern]
+        return []
+
+
+# Inventory indexes keyed by path, with the mtime and size they were built at
+_INVENTORY_INDEX_CACHE = {}
+
+
+def get_inventory_index(inventory_file):
+    """Return a cached InventoryIndex for a static YAML inventory file
+
+    None is returned for inventories which can not be indexed natively,
+    such as scripts, directories or INI files.
+
+    :param inventory_file: Ansible inventory file
+    :type inventory_file: String
+    :returns: InventoryIndex or None
+    """
+    path = os.path.abspath(inventory_file)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not os.path.isfile(path) or os.access(path, os.X_OK):
+        return None
+
+    signature = (st.st_mtime_ns, st.st_size)
+    cached = _INVENTORY_INDEX_CACHE.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    try:
+        with open(path, 'r') as f:
+            data = yaml.safe_load(f)
+    except (IOError, yaml.YAMLError):
+        return None
+    index = None
+    if InventoryIndex.is_static(data):
+        index = InventoryIndex(data)
+    _INVENTORY_INDEX_CACHE[path] = (signature, index)
+    return index
+
+
 def parse_ansible_inventory(inventory_file, group):
     """ Retrieve a list of hosts from a defined ansible inventory file.
+
+    Static YAML inventories are read natively, other inventories and
+    complex host patterns are handled by the Ansible inventory manager.
+
     :param inventory: Ansible inventory file
     :param group: The group to return hosts from, default will be 'all'
-    :return: list of hosts in the inventory matching the pattern
+    :return: list of host names in the inventory matching the pattern
     """
 
+    index = get_inventory_index(inventory_file)
+    if index is not None and index.has_pattern(group):
+        return index.get_hosts(group)
+
+    from ansible.inventory.manager import InventoryManager
+    from ansible.parsing.dataloader import DataLoader
+
     inventory = InventoryManager(loader=DataLoader(),
                                  sources=[inventory_file])
 
-    return(inventory.get_hosts(pattern=group))
+    return [str(host) for host in inventory.get_hosts(pattern=group)]
+
+
+def plan_host_batches(inventory_file, limit, batch_size, stack='overcloud'):
+    """Partition the hosts matched by a limit into batches per role.
+
+    Roles are the child groups of the stack group in the inventory, hosts
+    outside of them are batched under the 'ungrouped' role. Batches never
+    mix roles and keep the inventory order.
+
+    :param inventory_file: Ansible inventory file
+    :type inventory_file: String
+
+    :param limit: Comma, colon or space separated host patterns.
+    :type limit: String
+
+    :param batch_size: Maximum number of hosts per batch.
+    :type batch_size: Integer
+
+    :param stack: Stack name, used to find the role groups.
+    :type stack: String
+
+    :returns: List of (role, hosts) tuples
+    """
+    if batch_size < 1:
+        raise ValueError('The batch size must be a positive integer')
+    index = get_inventory_index(inventory_file)
+    patterns = [i.strip() for i in re.split(',| |:', limit or 'all') if i]
+    if index is not None and all(index.has_pattern(i) for i in patterns):
+        hosts = collections.OrderedDict()
+        for pattern in patterns:
+            hosts.update((host, None) for host in index.get_hosts(pattern))
+        hosts = list(hosts)
+    else:
+        hosts = parse_ansible_inventory(inventory_file,
+                                        playbook_limit_parse(limit or 'all'))
+
+    host_roles = {}
+    if index is not None:
+        for role in reversed(index.children(stack)):
+            host_roles.update((host, role) for host in index.get_hosts(role))
+    roles = collections.OrderedDict()
+    for host in hosts:
+        roles.setdefault(host_roles.get(host, 'ungrouped'), []).append(host)
+
+    batches = []
+    for role, role_hosts in roles.items():
+        for i in range(0, len(role_hosts), batch_size):
+            batches.append((role, role_hosts[i:i + batch_size]))
+    return batches
+
+
+def run_rolling_batches(batches, run_batch, state_file=None, signature=None,
+                        parallel=1, max_fail_percentage=0, logger=LOG):
+    """Run host batches, resuming from the last persisted state.
+
+    run_batch is called with the hosts of a batch and an ansible-runner
+    event handler collecting the failed hosts, and is expected to raise
+    when the batch fails. Up to parallel batches run at once. When the
+    failed hosts exceed max_fail_percentage of all the planned hosts no
+    new batch is started and DeploymentError is raised.
+
+    The completed batches are recorded in state_file after each batch, so
+    a later run with the same batches and signature skips them. The file
+    is removed once every batch succeeded.
+
+    :param batches: List of (role, hosts) tuples from plan_host_batches.
+    :type batches: List
+
+    :param run_batch: Callable running one batch.
+    :type run_batch: Function
+
+    :param state_file: Path of the JSON state file, state is not
+                       persisted when not set.
+    :type state_file: String
+
+    :param signature: JSON serializable description of the run, a saved
+                      state is only reused if it matches.
+    :type signature: Object
+
+    :param parallel: Maximum number of batches running at once.
+    :type parallel: Integer
+
+    :param max_fail_percentage: Tolerated percentage of failed hosts.
+    :type max_fail_percentage: Integer
+
+    :param logger: Logger receiving the batch progress.
+    :type logger: Logger
+
+    :returns: Set of the failed hosts which were tolerated.
+    """
+    if parallel < 1:
+        raise ValueError('The number of parallel batches must be a positive '
+                         'integer')
+    batches = [[role, list(hosts)] for role, hosts in batches]
+    completed = set()
+    if state_file and os.path.exists(state_file):
+        with open(state_file, 'r') as f:
+            state = json.load(f)
+        if (state.get('signature') == signature and
+                state.get('batches') == batches):
+            completed.update(state.get('completed', []))
+            logger.info('Resuming from %s, %d of %d batches already '
+                        'completed', state_file, len(completed),
+                        len(batches))
+
+    def _save():
+        if not state_file:
+            return
+        tmp_file = state_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({'signature': signature,
+                       'batches': batches,
+                       'completed': sorted(completed)}, f)
+        os.replace(tmp_file, state_file)
+
+    def _run(index, failed):
+        def _event_handler(event):
+            data = event.get('event_data', {})
+            if (event.get('event') in ('runner_on_failed',
+                                       'runner_on_unreachable') and
+                    not data.get('ignore_errors') and data.get('host')):
+                failed.add(data['host'])
+            return True
+
+        start = time.monotonic()
+        run_batch(batches[index][1], _event_handler)
+        return time.monotonic() - start
+
+    total_hosts = sum(len(hosts) for unused, hosts in batches) or 1
+    pending = [i for i in range(len(batches)) if i not in completed]
+    done_hosts = sum(len(batches[i][1]) for i in completed)
+    failed_hosts = set()
+    running = {}
+    aborted = False
+    with futures.ThreadPoolExecutor(max_workers=max(parallel, 1)) as executor:
+        while pending or running:
+            while pending and not aborted and len(running) < parallel:
+                index = pending.pop(0)
+                role, hosts = batches[index]
+                logger.info('Batch %d/%d (%s: %s) started', index + 1,
+                            len(batches), role, ','.join(hosts))
+                failed = set()
+                future = executor.submit(_run, index, failed)
+                running[future] = (index, failed)
+            if not running:
+                break
+            done, unused = futures.wait(
+                running, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                index, failed = running.pop(future)
+                role, hosts = batches[index]
+                try:
+                    elapsed = future.result()
+                except Exception as e:
+                    # Without host level events the whole batch failed
+                    failed_hosts.update(failed or hosts)
+                    logger.error('Batch %d/%d (%s) failed on %s: %s',
+                                 index + 1, len(batches), role,
+                                 ','.join(sorted(failed or hosts)), e)
+                    if (len(failed_hosts) * 100 >
+                            max_fail_percentage * total_hosts):
+                        aborted = True
+                    continue
+                completed.add(index)
+                done_hosts += len(hosts)
+                _save()
+                logger.info('Batch %d/%d (%s) completed in %.1f seconds, '
+                            '%d/%d hosts done', index + 1, len(batches),
+                            role, elapsed, done_hosts, total_hosts)
+
+    if aborted:
+        raise exceptions.DeploymentError(
+            'Stopping after failures on {} of {} hosts: {}'.format(
+                len(failed_hosts), total_hosts,
+                ', '.join(sorted(failed_hosts))))
+    if failed_hosts:
+        logger.warning('Tolerated failures on hosts: %s',
+                       ', '.join(sorted(failed_hosts)))
+    elif state_file and os.path.exists(state_file):
+        os.remove(state_file)
+    return failed_hosts
 
 
 def save_stack_outputs(heat, stack, working_dir):
@@ -3432,6 +4309,212 @@ def standalone_ceph_inventory(working_dir):
     return path
 
 
+def _load_ceph_spec_input(path, what):
+    with open(path, 'r') as stream:
+        try:
+            return yaml.safe_load(stream)
+        except yaml.YAMLError as exc:
+            raise RuntimeError(
+                "Unable to load the %s %s: %s" % (what, path, exc))
+
+
+def get_ceph_roles_to_services(roles_data_path):
+    """Map each role to its TripleO services deploying a Ceph daemon
+    :param roles_data_path: the path to a roles_data.yaml file
+    :return: dict, e.g. {'Controller': ['CephMon', 'CephMgr'],
+                         'CephStorage': ['CephOSD'], 'Compute': []}
+    """
+    roles = _load_ceph_spec_input(roles_data_path, 'roles data file')
+    roles_to_services = {}
+    try:
+        for role in roles:
+            services = []
+            for service in role.get('ServicesDefault') or []:
+                short = service.replace('OS::TripleO::Services::', '')
+                if short in constants.CEPH_SPEC_SERVICE_MAP:
+                    services.append(short)
+            roles_to_services[role['name']] = services
+    except (KeyError, TypeError, AttributeError):
+        raise RuntimeError(
+            'Unable to extract the name or ServicesDefault list from '
+            'roles data file: %s' % roles_data_path)
+    return roles_to_services
+
+
+def get_ceph_roles_to_hosts(baremetal_env_path, roles):
+    """Map each role to its hosts in a deployed baremetal environment
+    :param baremetal_env_path: the environment file written by
+                               'openstack overcloud node provision'
+    :param roles: the role names to look up
+    :return: dict, e.g. {'Controller': ['oc0-controller-0'],
+                         'CephStorage': ['oc0-ceph-0', 'oc0-ceph-1']}
+    """
+    env = _load_ceph_spec_input(baremetal_env_path,
+                                'baremetal environment file')
+    try:
+        params = env['parameter_defaults']
+        name_map = params['HostnameMap']
+    except (KeyError, TypeError):
+        raise RuntimeError(
+            'The expected HostnameMap and RoleHostnameFormat are not '
+            'defined in data file: %s' % baremetal_env_path)
+
+    roles_to_hosts = {}
+    for role in roles:
+        host_fmt = params.get(role + 'HostnameFormat')
+        if not host_fmt:
+            roles_to_hosts[role] = []
+            continue
+        pattern = re.compile(host_fmt.replace('%stackname%', '.*')
+                             .replace('-%index%', ''))
+        roles_to_hosts[role] = [hostname for name, hostname
+                                in name_map.items() if pattern.match(name)]
+    return roles_to_hosts
+
+
+def get_ceph_hosts_to_ips(inventory_path, roles):
+    """Map the hosts of each role group of an inventory to their address
+    :param inventory_path: the path to a tripleo-ansible-inventory.yaml file
+    :param roles: the role names whose groups are read
+    :return: dict, e.g. {'oc0-controller-0': '192.168.24.23'}
+    """
+    inventory = _load_ceph_spec_input(inventory_path, 'inventory')
+    hosts_to_ips = {}
+    for group, content in inventory.items():
+        if group not in roles:
+            continue
+        # role groups usually only hold an overcloud_<role> child group
+        if 'children' in content and 'hosts' not in content:
+            content = inventory[next(iter(content['children']))]
+        for host, host_vars in (content.get('hosts') or {}).items():
+            hosts_to_ips[host] = host_vars['ansible_host']
+    return hosts_to_ips
+
+
+def get_ceph_spec_labels(hosts_to_ips, roles_to_services, roles_to_hosts,
+                         service_types=('mon', 'mgr', 'osd')):
+    """Return the Ceph labels of each host from the services of its roles
+    :param hosts_to_ips: dict from get_ceph_hosts_to_ips
+    :param roles_to_services: dict from get_ceph_roles_to_services
+    :param roles_to_hosts: dict from get_ceph_roles_to_hosts
+    :param (service_types): the Ceph daemons to place
+    :return: dict, e.g. {'oc0-controller-0': ['mon', '_admin', 'mgr'],
+                         'oc0-ceph-0': ['osd']}
+    """
+    host_roles = collections.defaultdict(list)
+    for role, hosts in roles_to_hosts.items():
+        for host in hosts:
+            host_roles[host].append(role)
+
+    labels = {}
+    for host in hosts_to_ips:
+        labels[host] = []
+        for role in host_roles[host]:
+            for service in roles_to_services.get(role, []):
+                for daemon in constants.CEPH_SPEC_SERVICE_MAP[service]:
+                    if daemon in service_types:
+                        labels[host].append(daemon)
+                    if daemon == 'mon':
+                        labels[host].append('_admin')
+    return labels
+
+
+def build_ceph_specs(hosts_to_ips, labels, service_types=('mon', 'mgr', 'osd'),
+                     osd_spec=None, crush_hierarchy=None):
+    """Build the host and service entries of a Ceph spec
+    :param hosts_to_ips: dict mapping each host to its address
+    :param labels: dict mapping each host to its Ceph labels
+    :param (service_types): the Ceph daemons to place
+    :param (osd_spec): dict describing the OSDs, all devices by default
+    :param (crush_hierarchy): dict mapping hosts to their crush location
+    :return: list of the spec entries
+    """
+    crush_hierarchy = crush_hierarchy or {}
+    specs = []
+    for host, addr in hosts_to_ips.items():
+        if not labels[host]:
+            continue
+        spec = {'service_type': 'host', 'addr': addr, 'hostname': host,
+                'labels': sorted(set(labels[host]))}
+        location = crush_hierarchy.get(host)
+        if location and isinstance(location, dict):
+            invalid = set(location) - set(constants.CEPH_SPEC_CRUSH_LOCATIONS)
+            if invalid:
+                raise RuntimeError(
+                    'Invalid crush location keys %s for host %s'
+                    % (', '.join(sorted(invalid)), host))
+            spec['location'] = location
+        specs.append(spec)
+
+    for daemon in service_types:
+        hosts = [host for host, host_labels in labels.items()
+                 if daemon in host_labels]
+        if daemon == 'osd':
+            spec = {'service_type': 'osd',
+                    'service_name': 'osd.default_drive_group',
+                    'service_id': 'default_drive_group'}
+            spec.update(osd_spec or constants.CEPH_SPEC_DEFAULT_OSD_SPEC)
+        else:
+            spec = {'service_type': daemon, 'service_name': daemon,
+                    'service_id': daemon}
+        if hosts:
+            spec['placement'] = {'hosts': hosts}
+        specs.append(spec)
+    return specs
+
+
+def write_ceph_spec(specs, path):
+    """Write specs as the documents of a multi document YAML file"""
+    with open(path, 'w') as f:
+        for spec in specs:
+            f.write('---\n')
+            f.write(yaml.safe_dump(spec, default_flow_style=False))
+
+
+def generate_ceph_spec(output_path, roles_data_path, baremetal_env_path,
+                       inventory_path, osd_spec=None, crush_hierarchy=None):
+    """Write the Ceph spec of the hosts deployed by 'overcloud node provision'
+
+    The labels of each host come from the Ceph services of its role in
+    roles_data_path, its role from the hostname formats of
+    baremetal_env_path and its address from inventory_path.
+
+    :param output_path: the path of the Ceph spec to write
+    :param roles_data_path: the path to a roles_data.yaml file
+    :param baremetal_env_path: the path to a deployed baremetal environment
+    :param inventory_path: the path to a tripleo-ansible-inventory.yaml file
+    :param (osd_spec): dict describing the OSDs, all devices by default
+    :param (crush_hierarchy): dict mapping hosts to their crush location
+    :return: list of the spec entries
+    """
+    roles_to_services = get_ceph_roles_to_services(roles_data_path)
+    roles_to_hosts = get_ceph_roles_to_hosts(baremetal_env_path,
+                                             roles_to_services)
+    hosts_to_ips = get_ceph_hosts_to_ips(inventory_path, roles_to_services)
+    labels = get_ceph_spec_labels(hosts_to_ips, roles_to_services,
+                                  roles_to_hosts)
+    specs = build_ceph_specs(hosts_to_ips, labels, osd_spec=osd_spec,
+                             crush_hierarchy=crush_hierarchy)
+    write_ceph_spec(specs, output_path)
+    return specs
+
+
+def generate_standalone_ceph_spec(output_path, mon_ip, osd_spec=None):
+    """Write the Ceph spec of a standalone deployment on the local host
+    :param output_path: the path of the Ceph spec to write
+    :param mon_ip: the address of the Ceph monitor
+    :param (osd_spec): dict describing the OSDs, all devices by default
+    :return: list of the spec entries
+    """
+    hostname = socket.gethostname()
+    service_types = ('osd', 'mon', 'mgr')
+    labels = {hostname: list(service_types) + ['_admin']}
+    specs = build_ceph_specs({hostname: mon_ip}, labels,
+                             service_types=service_types, osd_spec=osd_spec)
+    write_ceph_spec(specs, output_path)
+    return specs
+
+
 def process_ceph_daemons(daemon_path):
     """Load the ceph daemons related extra_vars and return the associated dict
     :param daemon_path: the path where the daemon definition is stored
@@ -14,8 +14,13 @@
 #
 
 import argparse
+import datetime
+import functools
+import json
 import logging
 import os
+import threading
+import time
 import yaml
 
 from osc_lib.command import command
@@ -27,6 +32,36 @@ from tripleoclient import utils
 LOG = logging.getLogger(__name__ + ".BackupOvercloud")
 
 
+def _wave(value):
+    """Parse a GROUP[:CONCURRENCY] backup wave"""
+    group, _, concurrency = value.partition(':')
+    try:
+        concurrency = int(concurrency or 1)
+    except ValueError:
+        concurrency = 0
+    if not group or concurrency < 1:
+        raise argparse.ArgumentTypeError(
+            _('%s is not a valid wave, use GROUP or GROUP:CONCURRENCY '
+              'with a positive CONCURRENCY') % value)
+    return group, concurrency
+
+
+def _archive_size(folder, host, since):
+    """Return the size of the files written for host in the backup folder
+    since a timestamp, None when the folder is not local
+    """
+    path = os.path.join(folder, host)
+    if not os.path.isdir(path):
+        return None
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            st = os.stat(os.path.join(root, name))
+            if st.st_mtime >= since:
+                size += st.st_size
+    return size
+
+
 class BackupOvercloud(command.Command):
     """Backup the Overcloud"""
 
@@ -108,6 +143,30 @@ class BackupOvercloud(command.Command):
                    "to pass this and other variables.")
         )
 
+        parser.add_argument(
+            '--wave',
+            dest='waves',
+            action='append',
+            type=_wave,
+            metavar='<group[:concurrency]>',
+            help=_("Back up the hosts of an inventory group as a wave, "
+                   "running the backup on up to concurrency hosts of the "
+                   "group at once. Defaults to one host at a time, which "
+                   "is required for the waves holding controllers or Ceph "
+                   "monitors. Can be specified multiple times, the waves "
+                   "run in order. "
+                   "i.e. --wave Controller --wave Compute:5")
+        )
+
+        parser.add_argument(
+            '--manifest',
+            default=None,
+            help=_("Path of the JSON manifest recording the duration, "
+                   "status and archive size of each host backed up in "
+                   "waves. Defaults to: overcloud-backup-manifest-"
+                   "<timestamp>.json in the current directory.")
+        )
+
         parser.add_argument(
             '--extra-vars',
             default=None,
@@ -212,6 +271,9 @@ class BackupOvercloud(command.Command):
            parsed_args.init is None):
 
             LOG.debug(_('Starting Overcloud Backup'))
+            if parsed_args.waves:
+                self._run_backup_waves(parsed_args, extra_vars)
+                return
             self._run_ansible_playbook(
                               playbook='cli-overcloud-backup.yaml',
                               inventory=parsed_args.inventory,
@@ -220,6 +282,122 @@ class BackupOvercloud(command.Command):
                               extra_vars=extra_vars
                               )
 
+    @staticmethod
+    def _host_group(host):
+        return 'tripleo_backup_{}'.format(host.replace('-', '_'))
+
+    def _run_backup_waves(self, parsed_args, extra_vars):
+        """Backup the nodes wave after wave.
+
+        The backup playbook runs once per host, on up to the concurrency of
+        the wave at once. Each run targets an inventory group holding only
+        its host, as the playbook requires every host of its target group
+        to be reachable. The controllers and the Ceph monitors are backed
+        up one at a time, so their quorum is never lost.
+        """
+
+        index = utils.get_inventory_index(parsed_args.inventory)
+        if index is None:
+            raise RuntimeError(
+                _('Backup waves need a static YAML inventory, {} is not '
+                  'one').format(parsed_args.inventory))
+        waves = []
+        for group, concurrency in parsed_args.waves:
+            hosts = index.get_hosts(group)
+            if not hosts:
+                raise RuntimeError(
+                    _('There is no host in the {} group of the '
+                      'inventory').format(group))
+            waves.append((group, concurrency, hosts))
+
+        quorum_hosts = set(index.get_hosts(extra_vars.get(
+            'tripleo_controller_group_name', 'Controller')))
+        quorum_hosts.update(index.get_hosts('ceph_mon'))
+        for group, concurrency, hosts in waves:
+            if concurrency > 1 and quorum_hosts.intersection(hosts):
+                raise RuntimeError(
+                    _('The {} wave holds controller or Ceph monitor hosts, '
+                      'which are backed up one at a time to keep their '
+                      'quorum').format(group))
+
+        with open(parsed_args.inventory, 'r') as f:
+            inventory_data = yaml.safe_load(f)
+        for group, concurrency, hosts in waves:
+            for host in hosts:
+                inventory_data[self._host_group(host)] = {
+                    'hosts': {host: {}}}
+
+        folder = extra_vars.get(
+            'tripleo_backup_and_restore_shared_storage_folder',
+            constants.OVERCLOUD_BACKUP_SHARED_FOLDER)
+        started = datetime.datetime.now()
+        manifest_file = parsed_args.manifest or os.path.abspath(
+            constants.OVERCLOUD_BACKUP_MANIFEST_FILE_NAME.format(
+                started.strftime('%Y%m%d%H%M%S')))
+        manifest = {
+            'inventory': os.path.abspath(parsed_args.inventory),
+            'started': started.isoformat(),
+            'waves': [{'group': group, 'concurrency': concurrency,
+                       'hosts': hosts}
+                      for group, concurrency, hosts in waves],
+            'nodes': [],
+        }
+        lock = threading.Lock()
+
+        with utils.TempDirs(chdir=False) as tmp:
+            inventory = os.path.join(tmp, 'tripleo-backup-inventory.yaml')
+            with open(inventory, 'w') as f:
+                yaml.safe_dump(inventory_data, f, default_flow_style=False)
+
+            def _backup_host(group, hosts, event_handler):
+                host = hosts[0]
+                node = {'host': host, 'group': group,
+                        'started': datetime.datetime.now().isoformat()}
+                since = time.time()
+                start = time.monotonic()
+                try:
+                    with utils.TempDirs(chdir=False) as workdir:
+                        utils.run_ansible_playbook(
+                            playbook='cli-overcloud-backup.yaml',
+                            inventory=inventory,
+                            workdir=workdir,
+                            playbook_dir=constants.ANSIBLE_TRIPLEO_PLAYBOOKS,
+                            tags='bar_create_recover_image',
+                            skip_tags=None,
+                            limit_hosts=host,
+                            verbosity=utils.playbook_verbosity(self=self),
+                            extra_vars=dict(
+                                extra_vars,
+                                tripleo_controller_group_name=(
+                                    self._host_group(host))),
+                            event_handler=event_handler
+                        )
+                    node['status'] = 'success'
+                except Exception:
+                    node['status'] = 'failed'
+                    raise
+                finally:
+                    node['duration'] = round(time.monotonic() - start, 1)
+                    node['archive_size'] = _archive_size(folder, host, since)
+                    with lock:
+                        manifest['nodes'].append(node)
+
+            try:
+                for group, concurrency, hosts in waves:
+                    LOG.info('Backing up the %s wave, %d of %d hosts at '
+                             'once', group, concurrency, len(hosts))
+                    utils.run_rolling_batches(
+                        [(group, [host]) for host in hosts],
+                        functools.partial(_backup_host, group),
+                        parallel=concurrency,
+                        logger=LOG)
+            finally:
+                manifest['duration'] = round(
+                    (datetime.datetime.now() - started).total_seconds(), 1)
+                with open(manifest_file, 'w') as f:
+                    json.dump(manifest, f, indent=2)
+                print('Backup manifest written to {}'.format(manifest_file))
+
     def _run_ansible_playbook(self,
                               playbook,
                               inventory,
@@ -36,6 +36,8 @@ from tripleoclient import command
 from tripleoclient import constants
 from tripleoclient import exceptions
 from tripleoclient import export
+from tripleoclient import heat_launcher
+from tripleoclient import tracing
 from tripleoclient import utils
 from tripleoclient.workflows import deployment
 from tripleoclient.workflows import parameters as workflow_params
@@ -525,6 +527,13 @@ class DeployOvercloud(command.Command):
                 }
             )
 
+    def _playbook_session(self):
+        """Return the session running the playbooks of the deployment"""
+        if getattr(self, 'playbook_session', None) is None:
+            self.playbook_session = utils.PlaybookSession(
+                workdir=self.working_dir)
+        return self.playbook_session
+
     def _provision_networks(self, parsed_args, tht_root, protected_overrides):
         # Parse the network data, if any network have 'ip_subnet' or
         # 'ipv6_subnet' keys this is not a network-v2 format file. In this
@@ -546,7 +555,7 @@ class DeployOvercloud(command.Command):
         }
 
         with utils.TempDirs() as tmp:
-            utils.run_ansible_playbook(
+            self._playbook_session().run(
                 playbook='cli-overcloud-network-provision.yaml',
                 inventory='localhost,',
                 workdir=tmp,
@@ -582,7 +591,7 @@ class DeployOvercloud(command.Command):
         }
 
         with utils.TempDirs() as tmp:
-            utils.run_ansible_playbook(
+            self._playbook_session().run(
                 playbook='cli-overcloud-network-vip-provision.yaml',
                 inventory='localhost,',
                 workdir=tmp,
@@ -595,6 +604,13 @@ class DeployOvercloud(command.Command):
 
         return [output_path]
 
+    def _get_node_count(self, parsed_args):
+        if not parsed_args.baremetal_deployment:
+            return None
+        with open(parsed_args.baremetal_deployment, 'r') as fp:
+            roles = yaml.safe_load(fp) or []
+        return sum(int(role.get('count', 1)) for role in roles)
+
     def setup_ephemeral_heat(self, parsed_args):
         self.log.info("Using ephemeral heat for stack operation")
         self.heat_launcher = utils.get_heat_launcher(
@@ -605,7 +621,10 @@ class DeployOvercloud(command.Command):
                                   'heat-launcher'),
             use_tmp_dir=False,
             rm_heat=parsed_args.rm_heat,
-            skip_heat_pull=parsed_args.skip_heat_pull)
+            skip_heat_pull=parsed_args.skip_heat_pull,
+            tuning=utils.parse_heat_tuning(
+                parsed_args.heat_tuning,
+                node_count=self._get_node_count(parsed_args)))
         self.orchestration_client = utils.launch_heat(self.heat_launcher)
         self.clients.orchestration = self.orchestration_client
 
@@ -1012,6 +1031,17 @@ class DeployOvercloud(command.Command):
             help=_('When --heat-type is pod or container, assume '
                    'the container image has already been pulled ')
         )
+        parser.add_argument(
+            '--heat-tuning',
+            action='append',
+            default=[],
+            metavar='<KEY=VALUE>',
+            help=_('Override a setting of the ephemeral Heat tuning profile '
+                   'derived from the host resources and the number of '
+                   'nodes. Can be given multiple times. Valid keys are '
+                   'node_count, {}.').format(
+                       ', '.join(heat_launcher.HEAT_TUNING_KEYS))
+        )
         parser.add_argument(
             '--disable-protected-resource-types',
             action='store_true',
@@ -1038,6 +1068,32 @@ class DeployOvercloud(command.Command):
         return parser
 
     def take_action(self, parsed_args):
+        tracer = tracing.Tracer('overcloud deploy')
+        try:
+            with tracer:
+                return self._take_action(parsed_args)
+        finally:
+            self._write_trace(tracer, parsed_args)
+
+    def _write_trace(self, tracer, parsed_args, summary=True):
+        working_dir = getattr(self, 'working_dir', None)
+        if tracer is None or not working_dir or parsed_args.dry_run:
+            return
+        try:
+            trace_file = tracer.export(os.path.join(
+                working_dir,
+                constants.WD_DEFAULT_DEPLOY_TRACE_FILE_NAME.format(
+                    parsed_args.stack)))
+            if not summary:
+                return
+            print(tracer.summary(), file=self.app.stdout)
+            print("Deployment trace: {0}".format(trace_file),
+                  file=self.app.stdout)
+        except Exception as e:
+            self.log.error('Exception writing the deployment trace')
+            self.log.error(e)
+
+    def _take_action(self, parsed_args):
         logging.register_options(CONF)
         logging.setup(CONF, '')
         self.log.debug("take_action(%s)" % parsed_args)
@@ -1061,6 +1117,10 @@ class DeployOvercloud(command.Command):
         else:
             self.working_dir = parsed_args.working_dir
         utils.makedirs(self.working_dir)
+        # The playbooks of the deployment share the fact cache maintenance
+        # and, per working directory, the ansible environment
+        self.playbook_session = utils.PlaybookSession(
+            workdir=self.working_dir)
 
         if parsed_args.update_plan_only:
             raise exceptions.DeploymentError(
@@ -1117,10 +1177,12 @@ class DeployOvercloud(command.Command):
                 self.log.info("Stack found, "
                               "will be doing a stack update")
 
-        new_tht_root, user_tht_root = \
-            self.create_template_dirs(parsed_args)
-        created_env_files = self.create_env_files(
-                stack, parsed_args, new_tht_root, user_tht_root)
+        with tracing.span('templates'):
+            new_tht_root, user_tht_root = \
+                self.create_template_dirs(parsed_args)
+        with tracing.span('environment'):
+            created_env_files = self.create_env_files(
+                    stack, parsed_args, new_tht_root, user_tht_root)
 
         if parsed_args.heat_type != 'installed':
             ephemeral_heat = True
@@ -1148,16 +1210,18 @@ class DeployOvercloud(command.Command):
         do_config_download = parsed_args.config_download_only or full_deploy
 
         if ephemeral_heat and do_stack:
-            self.setup_ephemeral_heat(parsed_args)
+            with tracing.span('heat launch'):
+                self.setup_ephemeral_heat(parsed_args)
 
         config_download_dir = parsed_args.output_dir or \
             os.path.join(self.working_dir, "config-download")
 
         try:
             if do_stack:
-                self.deploy_tripleo_heat_templates(
-                    stack, parsed_args, new_tht_root,
-                    user_tht_root, created_env_files)
+                with tracing.span('stack'):
+                    self.deploy_tripleo_heat_templates(
+                        stack, parsed_args, new_tht_root,
+                        user_tht_root, created_env_files)
 
                 stack = utils.get_stack(
                     self.orchestration_client, parsed_args.stack)
@@ -1186,7 +1250,7 @@ class DeployOvercloud(command.Command):
                 playbook = 'cli-config-download.yaml'
                 ansible_work_dir = os.path.join(
                     self.working_dir, os.path.splitext(playbook)[0])
-                utils.run_ansible_playbook(
+                self.playbook_session.run(
                     playbook='cli-config-download.yaml',
                     inventory='localhost,',
                     workdir=ansible_work_dir,
@@ -1216,7 +1280,8 @@ class DeployOvercloud(command.Command):
                 horizon_url = deployment.get_horizon_url(
                     stack=stack.stack_name,
                     heat_type=parsed_args.heat_type,
-                    working_dir=self.working_dir)
+                    working_dir=self.working_dir,
+                    session=self.playbook_session)
                 rc_params = utils.get_rc_params(
                     self.orchestration_client,
                     parsed_args.stack)
@@ -1230,16 +1295,18 @@ class DeployOvercloud(command.Command):
                     self.working_dir)
 
             if do_setup:
-                deployment.get_hosts_and_enable_ssh_admin(
-                    parsed_args.stack,
-                    parsed_args.overcloud_ssh_network,
-                    parsed_args.overcloud_ssh_user,
-                    self.get_key_pair(parsed_args),
-                    parsed_args.overcloud_ssh_port_timeout,
-                    self.working_dir,
-                    verbosity=utils.playbook_verbosity(self=self),
-                    heat_type=parsed_args.heat_type
-                )
+                with tracing.span('ssh admin'):
+                    deployment.get_hosts_and_enable_ssh_admin(
+                        parsed_args.stack,
+                        parsed_args.overcloud_ssh_network,
+                        parsed_args.overcloud_ssh_user,
+                        self.get_key_pair(parsed_args),
+                        parsed_args.overcloud_ssh_port_timeout,
+                        self.working_dir,
+                        verbosity=utils.playbook_verbosity(self=self),
+                        heat_type=parsed_args.heat_type,
+                        session=self.playbook_session
+                    )
 
             if do_config_download:
                 if parsed_args.config_download_timeout:
@@ -1266,26 +1333,28 @@ class DeployOvercloud(command.Command):
                 deployment.make_config_download_dir(config_download_dir,
                                                     parsed_args.stack)
 
-                deployment.config_download(
-                    self.log,
-                    self.clients,
-                    parsed_args.stack,
-                    parsed_args.overcloud_ssh_network,
-                    config_download_dir,
-                    parsed_args.override_ansible_cfg,
-                    timeout=parsed_args.overcloud_ssh_port_timeout,
-                    verbosity=utils.playbook_verbosity(self=self),
-                    deployment_options=deployment_options,
-                    in_flight_validations=parsed_args.inflight,
-                    deployment_timeout=timeout,
-                    tags=parsed_args.tags,
-                    skip_tags=parsed_args.skip_tags,
-                    limit_hosts=utils.playbook_limit_parse(
-                        limit_nodes=parsed_args.limit
-                    ),
-                    forks=parsed_args.ansible_forks,
-                    denyed_hostnames=utils.get_stack_saved_output_item(
-                        'BlacklistedHostnames', self.working_dir))
+                with tracing.span('config download'):
+                    deployment.config_download(
+                        self.log,
+                        self.clients,
+                        parsed_args.stack,
+                        parsed_args.overcloud_ssh_network,
+                        config_download_dir,
+                        parsed_args.override_ansible_cfg,
+                        timeout=parsed_args.overcloud_ssh_port_timeout,
+                        verbosity=utils.playbook_verbosity(self=self),
+                        deployment_options=deployment_options,
+                        in_flight_validations=parsed_args.inflight,
+                        deployment_timeout=timeout,
+                        tags=parsed_args.tags,
+                        skip_tags=parsed_args.skip_tags,
+                        limit_hosts=utils.playbook_limit_parse(
+                            limit_nodes=parsed_args.limit
+                        ),
+                        forks=parsed_args.ansible_forks,
+                        denyed_hostnames=utils.get_stack_saved_output_item(
+                            'BlacklistedHostnames', self.working_dir),
+                        session=self.playbook_session)
             deployment.set_deployment_status(
                 parsed_args.stack,
                 status=deploy_status,
@@ -1328,16 +1397,18 @@ class DeployOvercloud(command.Command):
                 if (parsed_args.heat_type != 'installed' and
                         parsed_args.config_download):
                     # Create overcloud export
-                    data = export.export_overcloud(
-                        self.orchestration_client,
-                        parsed_args.stack, True, False,
-                        config_download_dir)
-                    export_file = os.path.join(
-                        self.working_dir, "%s-export.yaml" % parsed_args.stack)
-                    # write the exported data
-                    with open(export_file, 'w') as f:
-                        yaml.safe_dump(data, f, default_flow_style=False)
-                        os.chmod(export_file, 0o600)
+                    with tracing.span('export'):
+                        data = export.export_overcloud(
+                            self.orchestration_client,
+                            parsed_args.stack, True, False,
+                            config_download_dir)
+                        export_file = os.path.join(
+                            self.working_dir,
+                            "%s-export.yaml" % parsed_args.stack)
+                        # write the exported data
+                        with open(export_file, 'w') as f:
+                            yaml.safe_dump(data, f, default_flow_style=False)
+                            os.chmod(export_file, 0o600)
             except Exception as e:
                 self.log.error('Exception creating overcloud export.')
                 self.log.error(e)
@@ -1359,17 +1430,24 @@ class DeployOvercloud(command.Command):
                 self.log.error('Exception stopping ephemeral Heat')
                 self.log.error(e)
 
+            # Export the phases traced so far for the archive to include
+            # them, take_action rewrites the complete trace afterwards.
+            self._write_trace(tracing.get_tracer(), parsed_args,
+                              summary=False)
+
             try:
                 if parsed_args.output_dir:
                     ansible_dir = config_download_dir
                 else:
                     ansible_dir = None
-                archive_filename = utils.archive_deploy_artifacts(
-                    self.log, parsed_args.stack, self.working_dir, ansible_dir)
-                utils.create_archive_dir()
-                utils.run_command(
-                    ['sudo', 'cp', archive_filename,
-                     constants.TRIPLEO_ARCHIVE_DIR])
+                with tracing.span('archive'):
+                    archive_filename = utils.archive_deploy_artifacts(
+                        self.log, parsed_args.stack, self.working_dir,
+                        ansible_dir)
+                    utils.create_archive_dir()
+                    utils.run_command(
+                        ['sudo', 'cp', archive_filename,
+                         constants.TRIPLEO_ARCHIVE_DIR])
             except Exception as e:
                 self.log.error('Exception archiving deploy artifacts')
                 self.log.error(e)
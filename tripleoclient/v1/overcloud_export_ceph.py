@@ -19,7 +19,9 @@ from osc_lib.i18n import _
 from osc_lib import utils
 
 from tripleoclient import command
+from tripleoclient import constants
 from tripleoclient import export
+from tripleoclient import utils as oooutils
 
 
 class ExportOvercloudCeph(command.Command):
@@ -67,6 +69,10 @@ class ExportOvercloudCeph(command.Command):
                             help=_('Directory to search for config-download '
                                    'export data. Defaults to $HOME/'
                                    'overcloud-deploy/<stack>/config-download'))
+        parser.add_argument('--concurrency', type=int,
+                            default=constants.CEPH_EXPORT_WORKERS,
+                            help=_('Maximum number of stacks to export '
+                                   'Ceph information from at once.'))
 
         return parser
 
@@ -91,7 +97,7 @@ class ExportOvercloudCeph(command.Command):
                 "File '%s' already exists, not exporting." % output_file)
 
         # extract ceph data for each stack into the cephs list
-        cephs = []
+        config_download_dirs = []
         for stack in stacks:
             if not parsed_args.config_download_dir:
                 config_download_dir = os.path.join(os.environ.get('HOME'),
@@ -100,11 +106,16 @@ class ExportOvercloudCeph(command.Command):
                                                    'config-download')
             else:
                 config_download_dir = parsed_args.config_download_dir
-            self.log.info('Exporting Ceph data from stack %s at %s',
-                          stack, self.now)
-            cephs.append(export.export_ceph(stack,
-                                            parsed_args.cephx,
-                                            config_download_dir))
+            config_download_dirs.append(config_download_dir)
+        self.log.info('Exporting Ceph data from stack(s) %s at %s',
+                      ', '.join(stacks), self.now)
+        cephs = export.export_cephs(
+            stacks,
+            parsed_args.cephx,
+            config_download_dirs,
+            max_workers=parsed_args.concurrency,
+            working_dirs=[oooutils.get_default_working_dir(stack)
+                          for stack in stacks])
         data = {}
         data['parameter_defaults'] = {}
         data['parameter_defaults']['CephExternalMultiConfig'] = cephs
@@ -32,6 +32,7 @@ import yaml
 
 from tripleoclient import command
 from tripleoclient import constants
+from tripleoclient import fact_cache
 from tripleoclient import utils as oooutils
 from tripleoclient.workflows import baremetal
 from tripleoclient.workflows import tripleo_baremetal as tb
@@ -77,6 +78,17 @@ class DeleteNode(command.Command):
                             help=_('Skip yes/no prompt (assume yes).'),
                             default=False,
                             action="store_true")
+        parser.add_argument('--concurrency', type=int,
+                            default=20,
+                            help=_('Maximum number of nodes to unprovision '
+                                   'at once when --baremetal-deployment is '
+                                   'used.'))
+        parser.add_argument('--network-ports',
+                            help=_('Also delete the network ports, and their '
+                                   'fixed IPs, of the deleted nodes when '
+                                   '--baremetal-deployment is used.'),
+                            default=False,
+                            action="store_true")
         return parser
 
     def _nodes_to_delete(self, parsed_args, roles):
@@ -99,6 +111,9 @@ class DeleteNode(command.Command):
             )
             with open(unprovision_confirm) as f:
                 nodes = json.load(f)
+        if isinstance(nodes, dict):
+            nodes = nodes.get('instances') or []
+        self.unprovision_plan = nodes
         if not nodes:
             print('No nodes to unprovision')
             return None, None
@@ -143,6 +158,14 @@ class DeleteNode(command.Command):
                 print(nodes_text)
             else:
                 return
+            # The Ironic state of the planned nodes is recorded so nodes
+            # which changed before the plan is executed are left alone.
+            unprovision = tb.TripleoUnprovision(
+                parsed_args.stack,
+                concurrency=parsed_args.concurrency,
+                timeout=parsed_args.timeout * 60,
+                manage_network_ports=parsed_args.network_ports)
+            unprovision.record_plan(self.unprovision_plan)
         else:
             nodes = parsed_args.nodes
             nodes_text = '\n'.join('- %s' % node for node in nodes)
@@ -182,19 +205,11 @@ class DeleteNode(command.Command):
         )
 
         if parsed_args.baremetal_deployment:
-            with oooutils.TempDirs() as tmp:
-                oooutils.run_ansible_playbook(
-                    playbook='cli-overcloud-node-unprovision.yaml',
-                    inventory='localhost,',
-                    workdir=tmp,
-                    playbook_dir=constants.ANSIBLE_TRIPLEO_PLAYBOOKS,
-                    verbosity=oooutils.playbook_verbosity(self=self),
-                    extra_vars={
-                        "stack_name": parsed_args.stack,
-                        "baremetal_deployment": roles,
-                        "prompt": False,
-                    }
-                )
+            unprovision.unprovision(self.unprovision_plan)
+
+        # The deleted hosts will never be gathered again, drop their facts
+        # instead of leaving them in the cache until they expire.
+        fact_cache.evict_hosts(nodes)
 
 
 class ProvideNode(command.Command):
@@ -333,6 +348,14 @@ class ConfigureNode(command.Command):
                             action='store_true',
                             help=_('Whether to overwrite existing root device '
                                    'hints when --root-device is used.'))
+        parser.add_argument('--concurrency', type=int,
+                            default=20,
+                            help=_('Maximum number of nodes to configure at '
+                                   'once.'))
+        parser.add_argument('--dry-run',
+                            action='store_true',
+                            help=_('Print the changes of each node without '
+                                   'applying them.'))
         parser.add_argument("--verbosity",
                             type=int,
                             default=1,
@@ -350,7 +373,9 @@ class ConfigureNode(command.Command):
                 root_device=parsed_args.root_device,
                 root_device_minimum_size=parsed_args.root_device_minimum_size,
                 overwrite_root_device_hints=(
-                    parsed_args.overwrite_root_device_hints)
+                    parsed_args.overwrite_root_device_hints),
+                concurrency=parsed_args.concurrency,
+                dry_run=parsed_args.dry_run
                 )
 
         if parsed_args.node_uuids:
@@ -397,8 +422,8 @@ class DiscoverNode(command.Command):
                                    '(netboot).'))
         parser.add_argument('--concurrency', type=int,
                             default=20,
-                            help=_('Maximum number of nodes to introspect at '
-                                   'once.'))
+                            help=_('Maximum number of nodes to register or '
+                                   'introspect at once.'))
         parser.add_argument('--node-timeout', type=int,
                             default=1200,
                             help=_('Maximum timeout for node introspection.'))
@@ -443,6 +468,7 @@ class DiscoverNode(command.Command):
             kernel_name=deploy_kernel,
             ramdisk_name=deploy_ramdisk,
             instance_boot_option=parsed_args.instance_boot_option,
+            concurrency=parsed_args.concurrency,
             **kwargs
         )
 
@@ -91,6 +91,10 @@ class MatchProfiles(command.Command):
 
 
 POSTFIX = '_profile'
+# Number of nodes fetched per baremetal API request when listing profiles
+PAGE_SIZE = 100
+NODE_FIELDS = ['uuid', 'name', 'provision_state', 'power_state',
+               'maintenance', 'properties']
 
 
 class ListProfiles(command.Lister):
@@ -110,19 +114,22 @@ class ListProfiles(command.Lister):
         utils.add_deployment_plan_arguments(parser)
         return parser
 
-    def take_action(self, parsed_args):
-        self.log.debug("take_action(%s)" % parsed_args)
-        self.log.warning(DEPRECATION_MSG)
-        bm_client = self.app.client_manager.baremetal
-        compute_client = self.app.client_manager.compute
-
-        hypervisors = {h.hypervisor_hostname: h
-                       for h in compute_client.hypervisors.list()
-                       if h.hypervisor_type == 'ironic'}
-        result = []
-
+    def _iter_nodes(self, bm_client, maintenance):
+        """Page through the nodes fetching only the fields we display"""
+        marker = None
+        while True:
+            page = bm_client.node.list(maintenance=maintenance,
+                                       fields=NODE_FIELDS,
+                                       limit=PAGE_SIZE, marker=marker)
+            for node in page:
+                yield node
+            if len(page) < PAGE_SIZE:
+                break
+            marker = page[-1].uuid
+
+    def _iter_rows(self, parsed_args, bm_client, hypervisors):
         maintenance = None if parsed_args.all else False
-        for node in bm_client.node.list(detail=True, maintenance=maintenance):
+        for node in self._iter_nodes(bm_client, maintenance):
             error = ''
 
             if node.provision_state not in ('active', 'available'):
@@ -133,13 +140,13 @@ class ListProfiles(command.Lister):
                 error = "Maintenance"
             else:
                 try:
-                    hypervisor = hypervisors[node.uuid]
+                    status, state = hypervisors[node.uuid]
                 except KeyError:
                     error = 'No hypervisor record'
                 else:
-                    if hypervisor.status != 'enabled':
+                    if status != 'enabled':
                         error = 'Compute service disabled'
-                    elif hypervisor.state != 'up':
+                    elif state != 'up':
                         error = 'Compute service down'
 
             if error and not parsed_args.all:
@@ -158,10 +165,22 @@ class ListProfiles(command.Lister):
                       profile, ', '.join(possible_profiles))
             if parsed_args.all:
                 record += (error,)
-            result.append(record)
+            yield record
+
+    def take_action(self, parsed_args):
+        self.log.debug("take_action(%s)" % parsed_args)
+        self.log.warning(DEPRECATION_MSG)
+        bm_client = self.app.client_manager.baremetal
+        compute_client = self.app.client_manager.compute
+
+        # index the ironic hypervisors by node uuid, keeping only what
+        # is needed to compute the error column
+        hypervisors = {h.hypervisor_hostname: (h.status, h.state)
+                       for h in compute_client.hypervisors.list()
+                       if h.hypervisor_type == 'ironic'}
 
         cols = ("Node UUID", "Node Name", "Provision State", "Current Profile",
                 "Possible Profiles")
         if parsed_args.all:
             cols += ('Error',)
-        return (cols, result)
+        return (cols, self._iter_rows(parsed_args, bm_client, hypervisors))
@@ -17,6 +17,7 @@ import os
 from oslo_config import cfg
 from oslo_log import log as logging
 
+from osc_lib import exceptions as oscexc
 from osc_lib.i18n import _
 from osc_lib import utils
 
@@ -159,6 +160,33 @@ class UpdateRun(command.Command):
             help=_('The number of Ansible forks to use for the'
                    ' config-download ansible-playbook command.')
         )
+        parser.add_argument(
+            '--batch-size',
+            action='store',
+            default=None,
+            type=int,
+            help=_('Update the nodes matched by --limit in batches of at '
+                   'most this many nodes of the same role. The completed '
+                   'batches are recorded in the working directory so an '
+                   'interrupted run resumes after the last completed '
+                   'batch. By default all nodes are updated at once.')
+        )
+        parser.add_argument(
+            '--parallel-batches',
+            action='store',
+            default=1,
+            type=int,
+            help=_('The number of batches to update at once when '
+                   '--batch-size is set.')
+        )
+        parser.add_argument(
+            '--max-fail-percentage',
+            action='store',
+            default=0,
+            type=int,
+            help=_('The percentage of failed nodes tolerated before no '
+                   'new batch is started when --batch-size is set.')
+        )
         return parser
 
     def take_action(self, parsed_args):
@@ -167,6 +195,13 @@ class UpdateRun(command.Command):
         self.log.debug("take_action(%s)" % parsed_args)
         oooutils.ensure_run_as_normal_user()
 
+        if parsed_args.parallel_batches < 1:
+            raise oscexc.CommandError(
+                "--parallel-batches must be a positive integer")
+        if not 0 <= parsed_args.max_fail_percentage <= 100:
+            raise oscexc.CommandError(
+                "--max-fail-percentage must be between 0 and 100")
+
         if (not parsed_args.yes
             and not oooutils.prompt_user_for_confirmation(
                     constants.UPDATE_PROMPT, self.log)):
@@ -194,21 +229,55 @@ class UpdateRun(command.Command):
         ansible_cfg = os.path.join(ansible_dir, 'ansible.cfg')
         key_file = oooutils.get_key(parsed_args.stack)
 
-        oooutils.run_ansible_playbook(
-            playbook=playbook,
-            inventory=inventory,
-            workdir=ansible_dir,
-            playbook_dir=ansible_dir,
-            skip_tags=parsed_args.skip_tags,
-            tags=parsed_args.tags,
-            ansible_cfg=ansible_cfg,
-            ssh_user='tripleo-admin',
-            limit_hosts=parsed_args.limit,
-            reproduce_command=True,
-            forks=parsed_args.ansible_forks,
-            extra_env_variables={
-                "ANSIBLE_BECOME": True,
-                "ANSIBLE_PRIVATE_KEY_FILE": key_file
-            }
-        )
+        def _run(limit_hosts, workdir=ansible_dir, **kwargs):
+            oooutils.run_ansible_playbook(
+                playbook=playbook,
+                inventory=inventory,
+                workdir=workdir,
+                playbook_dir=ansible_dir,
+                skip_tags=parsed_args.skip_tags,
+                tags=parsed_args.tags,
+                ansible_cfg=ansible_cfg,
+                ssh_user='tripleo-admin',
+                limit_hosts=limit_hosts,
+                reproduce_command=True,
+                forks=parsed_args.ansible_forks,
+                extra_env_variables={
+                    "ANSIBLE_BECOME": True,
+                    "ANSIBLE_PRIVATE_KEY_FILE": key_file
+                },
+                **kwargs
+            )
+
+        if not parsed_args.batch_size:
+            _run(parsed_args.limit)
+            self.log.info("Completed Minor Update Run.")
+            return
+
+        def _run_batch(hosts, event_handler):
+            if parsed_args.parallel_batches <= 1:
+                _run(','.join(hosts), event_handler=event_handler)
+                return
+            # Concurrent ansible-runner executions need their own
+            # private data directory.
+            with oooutils.TempDirs(chdir=False) as tmp:
+                _run(','.join(hosts), workdir=tmp,
+                     event_handler=event_handler)
+
+        batches = oooutils.plan_host_batches(
+            inventory, parsed_args.limit, parsed_args.batch_size,
+            stack=parsed_args.stack)
+        state_file = os.path.join(
+            oooutils.get_default_working_dir(parsed_args.stack),
+            constants.WD_DEFAULT_UPDATE_RUN_STATE_FILE_NAME.format(
+                parsed_args.stack))
+        oooutils.run_rolling_batches(
+            batches, _run_batch,
+            state_file=state_file,
+            signature={'playbook': playbook,
+                       'tags': parsed_args.tags,
+                       'skip_tags': parsed_args.skip_tags},
+            parallel=parsed_args.parallel_batches,
+            max_fail_percentage=parsed_args.max_fail_percentage,
+            logger=self.log)
         self.log.info("Completed Minor Update Run.")
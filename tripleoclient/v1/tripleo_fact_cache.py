@@ -0,0 +1,100 @@
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+#
+
+import logging
+import os
+import yaml
+
+from osc_lib import exceptions as oscexc
+from osc_lib import utils as osc_utils
+from osc_lib.i18n import _
+
+from tripleoclient import command
+from tripleoclient import constants
+from tripleoclient import utils
+
+# Gathers the facts of every host, hosts with valid cached facts are
+# skipped unless the gathering policy forces it.
+WARM_PLAYBOOK = [{
+    'name': 'Warm the fact cache',
+    'hosts': 'all',
+    'strategy': 'free',
+    'gather_facts': True,
+    'any_errors_fatal': False,
+    'tasks': [],
+}]
+
+
+class WarmFactCache(command.Command):
+    """Gather the facts of a deployment into the fact cache ahead of time"""
+
+    log = logging.getLogger(__name__ + ".WarmFactCache")
+
+    def get_parser(self, prog_name):
+        parser = super(WarmFactCache, self).get_parser(prog_name)
+        parser.add_argument('--stack', dest='stack',
+                            help=_('Name or ID of heat stack '
+                                   '(default=Env: OVERCLOUD_STACK_NAME)'),
+                            default=osc_utils.env('OVERCLOUD_STACK_NAME',
+                                                  default='overcloud'))
+        parser.add_argument('--inventory',
+                            help=_('Ansible inventory of the deployment. '
+                                   'Defaults to the inventory in the '
+                                   'config-download directory of the '
+                                   'stack.'))
+        parser.add_argument('--limit', dest='limit_hosts',
+                            help=_('Ansible limit pattern of the hosts '
+                                   'to gather facts for.'))
+        parser.add_argument('--forks', type=int,
+                            help=_('Number of hosts to gather facts from '
+                                   'in parallel.'))
+        parser.add_argument('--ssh-user', dest='ssh_user',
+                            default='tripleo-admin',
+                            help=_('User used to connect to the hosts.'))
+        parser.add_argument('--refresh', action='store_true',
+                            default=False,
+                            help=_('Gather the facts of hosts which '
+                                   'already have valid cached facts too.'))
+        return parser
+
+    def take_action(self, parsed_args):
+        self.log.debug("take_action(%s)" % parsed_args)
+
+        inventory = parsed_args.inventory
+        if not inventory:
+            inventory = os.path.join(
+                utils.get_default_working_dir(parsed_args.stack),
+                'config-download', parsed_args.stack,
+                constants.TRIPLEO_STATIC_INVENTORY)
+        if not os.path.exists(inventory):
+            raise oscexc.CommandError(
+                _('Inventory {} does not exist').format(inventory))
+
+        with utils.TempDirs(chdir=False) as tmp:
+            playbook = os.path.join(tmp, 'warm-fact-cache.yaml')
+            with open(playbook, 'w') as f:
+                yaml.safe_dump(WARM_PLAYBOOK, f, default_flow_style=False)
+            utils.run_ansible_playbook(
+                playbook=playbook,
+                inventory=inventory,
+                workdir=tmp,
+                ssh_user=parsed_args.ssh_user,
+                key=utils.get_key(parsed_args.stack),
+                limit_hosts=parsed_args.limit_hosts,
+                forks=parsed_args.forks,
+                verbosity=utils.playbook_verbosity(self=self),
+                gathering_policy=(
+                    'implicit' if parsed_args.refresh else 'smart'),
+                reproduce_command=False,
+            )
+        print('Fact cache warmed for {}'.format(parsed_args.stack))
@@ -25,6 +25,7 @@ from tripleoclient.constants import (DEFAULT_EPHEMERAL_HEAT_CONTAINER,
                                      DEFAULT_EPHEMERAL_HEAT_API_CONTAINER,
                                      DEFAULT_EPHEMERAL_HEAT_ENGINE_CONTAINER)
 from tripleoclient import exceptions
+from tripleoclient import heat_launcher
 from tripleoclient import utils
 
 
@@ -154,6 +155,17 @@ class LaunchHeat(command.Command):
             help=_('Restore a database dump if it exists '
                    'within the directory specified by --heat-dir')
         )
+        parser.add_argument(
+            '--heat-tuning',
+            action='append',
+            default=[],
+            metavar='<KEY=VALUE>',
+            help=_('Override a setting of the ephemeral Heat tuning profile '
+                   'derived from the host resources. Only used when '
+                   '--heat-type=pod. Can be given multiple times. Valid '
+                   'keys are node_count, {}.').format(
+                       ', '.join(heat_launcher.HEAT_TUNING_KEYS))
+        )
         heat_type_group = parser.add_mutually_exclusive_group()
         heat_type_group.add_argument(
             '--heat-native',
@@ -206,7 +218,8 @@ class LaunchHeat(command.Command):
             False,
             False,
             rm_heat,
-            parsed_args.skip_heat_pull)
+            parsed_args.skip_heat_pull,
+            tuning=utils.parse_heat_tuning(parsed_args.heat_tuning))
 
         if parsed_args.kill:
             if self._kill_heat(parsed_args) != 0:
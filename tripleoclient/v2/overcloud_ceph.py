@@ -16,6 +16,7 @@
 import logging
 import os
 import uuid
+import yaml
 
 from osc_lib import exceptions as oscexc
 from osc_lib.i18n import _
@@ -56,8 +57,7 @@ def arg_parse_common(parser):
 def ceph_hosts_in_inventory(ceph_hosts, ceph_spec, inventory):
     """Raise command error if any ceph_hosts are not in the inventory
     """
-    all_host_objs = oooutils.parse_ansible_inventory(inventory, 'all')
-    all_hosts = list(map(lambda x: str(x), all_host_objs))
+    all_hosts = set(oooutils.parse_ansible_inventory(inventory, 'all'))
     for ceph_host in ceph_hosts['_admin'] + ceph_hosts['non_admin']:
         if ceph_host not in all_hosts:
             raise oscexc.CommandError(
@@ -918,84 +918,85 @@ class OvercloudCephSpec(command.Command):
                 "'openstack overcloud node provision'."
                 % inventory)
 
-        # mandatory extra_vars are now set, add others conditionally
-        extra_vars = {
-            'ceph_spec_path': output_path,
-        }
-
-        # optional paths to pass to playbook
+        # optional paths to pass to the spec generator
         if parsed_args.standalone is None and \
            parsed_args.baremetal_env is None:
             raise oscexc.CommandError(
                 "Either <deployed_baremetal.yaml> "
                 "or --standalone must be used.")
 
+        baremetal_env_path = None
         if parsed_args.baremetal_env:
             baremetal_env_path = os.path.abspath(parsed_args.baremetal_env)
             if not os.path.exists(baremetal_env_path):
                 raise oscexc.CommandError(
                     "Baremetal environment file does not exist:"
                     " %s" % parsed_args.baremetal_env)
-            else:
-                extra_vars['baremetal_deployed_path'] = \
-                    os.path.abspath(parsed_args.baremetal_env)
 
+        roles_data_path = None
         if parsed_args.roles_data:
             if not os.path.exists(parsed_args.roles_data):
                 raise oscexc.CommandError(
                     "Roles Data file not found --roles-data %s."
                     % os.path.abspath(parsed_args.roles_data))
             else:
-                extra_vars['tripleo_roles_path'] = \
-                    os.path.abspath(parsed_args.roles_data)
+                roles_data_path = os.path.abspath(parsed_args.roles_data)
 
         if parsed_args.mon_ip:
             if not oooutils.is_valid_ip(parsed_args.mon_ip):
                 raise oscexc.CommandError(
                     "Invalid IP address '%s' passed to --mon-ip."
                     % parsed_args.mon_ip)
-            else:
-                if parsed_args.standalone:
-                    extra_vars['tripleo_cephadm_first_mon_ip'] = \
-                        parsed_args.mon_ip
-                else:
-                    raise oscexc.CommandError(
-                        "Option --mon-ip may only be "
-                        "used with --standalone")
+            elif not parsed_args.standalone:
+                raise oscexc.CommandError(
+                    "Option --mon-ip may only be "
+                    "used with --standalone")
 
+        osd_spec = None
         if parsed_args.osd_spec:
             if not os.path.exists(parsed_args.osd_spec):
                 raise oscexc.CommandError(
                     "OSD Spec file not found --osd-spec %s."
                     % os.path.abspath(parsed_args.osd_spec))
             else:
-                extra_vars['osd_spec_path'] = \
-                    os.path.abspath(parsed_args.osd_spec)
+                osd_spec = self._load_yaml(parsed_args.osd_spec)
 
+        crush_hierarchy = None
         if parsed_args.crush_hierarchy:
             if not os.path.exists(parsed_args.crush_hierarchy):
                 raise oscexc.CommandError(
                     "Crush Hierarchy Spec file not found --crush-hierarchy %s."
                     % os.path.abspath(parsed_args.crush_hierarchy))
             else:
-                extra_vars['crush_hierarchy_path'] = \
-                    os.path.abspath(parsed_args.crush_hierarchy)
+                crush_hierarchy = self._load_yaml(parsed_args.crush_hierarchy)
 
-        if parsed_args.standalone:
-            spec_playbook = 'cli-standalone-ceph-spec.yaml'
-            tags = ''
-        else:
-            spec_playbook = 'cli-deployed-ceph.yaml'
-            tags = 'ceph_spec'
+        try:
+            if parsed_args.standalone:
+                if not parsed_args.mon_ip:
+                    raise oscexc.CommandError(
+                        "--mon-ip must be provided with --standalone")
+                specs = oooutils.generate_standalone_ceph_spec(
+                    output_path, parsed_args.mon_ip, osd_spec=osd_spec)
+            else:
+                if not baremetal_env_path:
+                    raise oscexc.CommandError(
+                        "<deployed_baremetal.yaml> is required unless "
+                        "--standalone is used.")
+                specs = oooutils.generate_ceph_spec(
+                    output_path, roles_data_path, baremetal_env_path,
+                    inventory, osd_spec=osd_spec,
+                    crush_hierarchy=crush_hierarchy)
+        except (OSError, RuntimeError) as exc:
+            raise oscexc.CommandError(
+                "Unable to generate the Ceph spec %s: %s"
+                % (output_path, exc))
+        self.log.info("Wrote %d Ceph spec entries to %s",
+                      len(specs), output_path)
 
-        with oooutils.TempDirs() as tmp:
-            oooutils.run_ansible_playbook(
-                playbook=spec_playbook,
-                inventory=inventory,
-                workdir=tmp,
-                playbook_dir=constants.ANSIBLE_TRIPLEO_PLAYBOOKS,
-                verbosity=oooutils.playbook_verbosity(self=self),
-                extra_vars=extra_vars,
-                reproduce_command=False,
-                tags=tags,
-            )
+    def _load_yaml(self, path):
+        with open(os.path.abspath(path), 'r') as f:
+            try:
+                return yaml.safe_load(f) or {}
+            except yaml.YAMLError as exc:
+                raise oscexc.CommandError(
+                    "Unable to parse %s: %s" % (path, exc))
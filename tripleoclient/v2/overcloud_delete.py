@@ -90,6 +90,53 @@ class DeleteOvercloud(command.Command):
                     "Network configuration file does not exist:"
                     " {args}".format(args=parsed_args.networks_file))
 
+    def _run_stack_playbooks(self, parsed_args, playbooks,
+                             heat_stack_delete, verbosity):
+        with utils.TempDirs(chdir=False) as tmp:
+            utils.run_ansible_playbook(
+                playbooks,
+                constants.ANSIBLE_INVENTORY.format(parsed_args.stack),
+                workdir=tmp,
+                playbook_dir=constants.ANSIBLE_TRIPLEO_PLAYBOOKS,
+                verbosity=verbosity,
+                extra_vars={
+                    "stack_name": parsed_args.stack,
+                    "heat_stack_delete": heat_stack_delete
+                }
+            )
+
+    def _unprovision_nodes(self, parsed_args, roles, verbosity):
+        with utils.TempDirs(chdir=False) as tmp:
+            utils.run_ansible_playbook(
+                playbook='cli-overcloud-node-unprovision.yaml',
+                workdir=tmp,
+                inventory='localhost,',
+                playbook_dir=constants.ANSIBLE_TRIPLEO_PLAYBOOKS,
+                verbosity=verbosity,
+                extra_vars={
+                    "stack_name": parsed_args.stack,
+                    "baremetal_deployment": roles,
+                    "all": True,
+                    "prompt": False,
+                    "manage_network_ports": parsed_args.network_ports,
+                }
+            )
+
+    def _unprovision_networks(self, parsed_args, verbosity):
+        networks_file_path = os.path.abspath(parsed_args.networks_file)
+
+        with utils.TempDirs(chdir=False) as tmp:
+            utils.run_ansible_playbook(
+                playbook='cli-overcloud-network-unprovision.yaml',
+                inventory='localhost,',
+                workdir=tmp,
+                playbook_dir=constants.ANSIBLE_TRIPLEO_PLAYBOOKS,
+                verbosity=verbosity,
+                extra_vars={
+                    "network_data_path": networks_file_path
+                }
+            )
+
     def take_action(self, parsed_args):
         self.log.debug("take_action({args})".format(args=parsed_args))
 
@@ -103,60 +150,46 @@ class DeleteOvercloud(command.Command):
             if not confirm:
                 raise oscexc.CommandError("Action not confirmed, exiting.")
 
-        if parsed_args.skip_ipa_cleanup:
-            playbooks = ["cli-overcloud-delete.yaml"]
-        else:
-            # Order is important, let's make sure we cleanup FreeIPA before we
-            # start removing infrastructure.
-            playbooks = ["cli-cleanup-ipa.yml", "cli-overcloud-delete.yaml"]
-
         heat_stack_delete = parsed_args.heat_type in ["installed", "native"]
-
-        with utils.TempDirs() as tmp:
-            utils.run_ansible_playbook(
-                playbooks,
-                constants.ANSIBLE_INVENTORY.format(parsed_args.stack),
-                workdir=tmp,
-                playbook_dir=constants.ANSIBLE_TRIPLEO_PLAYBOOKS,
-                verbosity=utils.playbook_verbosity(self=self),
-                extra_vars={
-                    "stack_name": parsed_args.stack,
-                    "heat_stack_delete": heat_stack_delete
-                }
-            )
+        verbosity = utils.playbook_verbosity(self=self)
+
+        # Each phase maps to (callable, dependencies). Phases run
+        # concurrently as soon as the phases they depend on are done.
+        phases = {}
+        stack_delete_deps = []
+        if not parsed_args.skip_ipa_cleanup:
+            # Order is important, let's make sure we cleanup FreeIPA before
+            # we delete the stack.
+            phases['ipa-cleanup'] = (
+                lambda: self._run_stack_playbooks(
+                    parsed_args, ["cli-cleanup-ipa.yml"],
+                    heat_stack_delete, verbosity),
+                [])
+            stack_delete_deps.append('ipa-cleanup')
+        phases['stack-delete'] = (
+            lambda: self._run_stack_playbooks(
+                parsed_args, ["cli-overcloud-delete.yaml"],
+                heat_stack_delete, verbosity),
+            stack_delete_deps)
 
         if parsed_args.baremetal_deployment:
             with open(parsed_args.baremetal_deployment, 'r') as fp:
                 roles = yaml.safe_load(fp)
 
-            with utils.TempDirs() as tmp:
-                utils.run_ansible_playbook(
-                    playbook='cli-overcloud-node-unprovision.yaml',
-                    workdir=tmp,
-                    inventory='localhost,',
-                    playbook_dir=constants.ANSIBLE_TRIPLEO_PLAYBOOKS,
-                    verbosity=utils.playbook_verbosity(self=self),
-                    extra_vars={
-                        "stack_name": parsed_args.stack,
-                        "baremetal_deployment": roles,
-                        "all": True,
-                        "prompt": False,
-                        "manage_network_ports": parsed_args.network_ports,
-                    }
-                )
+            phases['node-unprovision'] = (
+                lambda: self._unprovision_nodes(
+                    parsed_args, roles, verbosity),
+                [])
 
         if parsed_args.networks_file:
-            networks_file_path = os.path.abspath(parsed_args.networks_file)
-
-            with utils.TempDirs() as tmp:
-                utils.run_ansible_playbook(
-                    playbook='cli-overcloud-network-unprovision.yaml',
-                    inventory='localhost,',
-                    workdir=tmp,
-                    playbook_dir=constants.ANSIBLE_TRIPLEO_PLAYBOOKS,
-                    verbosity=utils.playbook_verbosity(self=self),
-                    extra_vars={
-                        "network_data_path": networks_file_path
-                    }
-                )
+            # Networks can only go once the ports of the stack and of the
+            # unprovisioned nodes are released.
+            phases['network-unprovision'] = (
+                lambda: self._unprovision_networks(parsed_args, verbosity),
+                [name for name in ('stack-delete', 'node-unprovision')
+                 if name in phases])
+
+        timings = utils.run_phase_graph(phases, logger=self.log)
+        for name, elapsed in timings.items():
+            print("{}: {:.1f}s".format(name, elapsed))
         print("Success.")
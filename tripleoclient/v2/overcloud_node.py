@@ -86,8 +86,8 @@ class ImportNode(command.Command):
                                    " ironic-python-agent image"))
         parser.add_argument('--concurrency', type=int,
                             default=20,
-                            help=_('Maximum number of nodes to introspect at '
-                                   'once.'))
+                            help=_('Maximum number of nodes to register or '
+                                   'introspect at once.'))
         parser.add_argument('--verbosity', type=int,
                             default=1,
                             help=_('Print debug logs during execution'))
@@ -113,27 +113,20 @@ class ImportNode(command.Command):
             self.app.client_manager,
             nodes_json=nodes_config,
             instance_boot_option=parsed_args.instance_boot_option,
-            boot_mode=parsed_args.boot_mode
+            boot_mode=parsed_args.boot_mode,
+            concurrency=parsed_args.concurrency
         )
 
         nodes_uuids = [node.uuid for node in nodes]
 
         if parsed_args.introspect:
-            extra_vars = {
-                "node_uuids": nodes_uuids,
-                "run_validations": parsed_args.run_validations,
-                "concurrency": parsed_args.concurrency,
-            }
-
-            with oooutils.TempDirs() as tmp:
-                oooutils.run_ansible_playbook(
-                    playbook='cli-baremetal-introspect.yaml',
-                    inventory='localhost,',
-                    workdir=tmp,
-                    playbook_dir=constants.ANSIBLE_TRIPLEO_PLAYBOOKS,
-                    verbosity=oooutils.playbook_verbosity(self=self),
-                    extra_vars=extra_vars
-                )
+            baremetal.introspect(
+                self.app.client_manager,
+                node_uuids=nodes_uuids,
+                run_validations=parsed_args.run_validations,
+                concurrency=parsed_args.concurrency,
+                verbosity=oooutils.playbook_verbosity(self=self)
+            )
 
         if parsed_args.provide:
             provide = tb.TripleoProvide(verbosity=parsed_args.verbosity)
@@ -16,16 +16,22 @@ import logging
 import socket
 import netaddr
 import tempfile
+import time
+
+from concurrent import futures
 
 import ironic_inspector_client
 from oslo_concurrency import processutils
+from oslo_utils import strutils
 from oslo_utils import units
 from tripleo_common import exception as tc_exceptions
 from tripleo_common.utils import nodes as node_utils
+from validations_libs.validation_actions import ValidationActions
 
 from tripleoclient import constants
 from tripleoclient import exceptions
 from tripleoclient import utils
+from tripleoclient.workflows import tripleo_baremetal as tb
 
 LOG = logging.getLogger(__name__)
 
@@ -47,11 +53,168 @@ def validate_nodes(clients, nodes_json):
     raise exceptions.RegisterOrUpdateError(validated_nodes)
 
 
+def _registered_nodes_map(client):
+    """Index the registered nodes by MAC address, BMC address and UUID
+
+    This is the mapping node_utils._populate_node_mapping builds, fetched
+    with one node listing and one port listing instead of a port listing
+    per node.
+    """
+    node_map = {'mac': {}, 'pm_addr': {}, 'uuids': set()}
+    for node in client.node.list(detail=True, limit=0):
+        handler = node_utils.find_driver_handler(node.driver)
+        unique_id = handler.unique_id_from_node(node)
+        if unique_id:
+            node_map['pm_addr'][unique_id] = node.uuid
+        node_map['uuids'].add(node.uuid)
+    for port in client.port.list(fields=['address', 'node_uuid'], limit=0):
+        node_map['mac'][port.address] = port.node_uuid
+    return node_map
+
+
+# Node fields which are not driver details, with the Ironic node paths
+# an update patches, as node_utils.register_ironic_node sets them
+_NON_DRIVER_FIELDS = {
+    'cpu': '/properties/cpus',
+    'memory': '/properties/memory_mb',
+    'disk': '/properties/local_gb',
+    'arch': '/properties/cpu_arch',
+    'root_device': '/properties/root_device',
+    'name': '/name',
+    'resource_class': '/resource_class',
+    'kernel_id': ['/driver_info/deploy_kernel',
+                  '/driver_info/rescue_kernel'],
+    'ramdisk_id': ['/driver_info/deploy_ramdisk',
+                   '/driver_info/rescue_ramdisk'],
+    'platform': '/extra/tripleo_platform',
+    'conductor_group': '/conductor_group',
+}
+_NON_DRIVER_FIELDS.update(
+    {field: '/%s' % field for field in (
+        'boot_interface', 'console_interface', 'deploy_interface',
+        'inspect_interface', 'management_interface', 'network_interface',
+        'power_interface', 'raid_interface', 'rescue_interface',
+        'storage_interface', 'vendor_interface')})
+
+
+def _find_node_handler(node):
+    try:
+        driver = node['pm_type']
+    except KeyError:
+        raise tc_exceptions.InvalidNode('pm_type (ironic driver to use) is '
+                                        'required', node=node)
+    return node_utils.find_driver_handler(driver)
+
+
+def _registered_node_uuid(node, handler, node_map):
+    """Return the UUID of the registered node matching the node data
+
+    Nodes are matched by port MAC address, BMC address or UUID.
+
+    :returns: String or None
+    """
+    candidates = set()
+    for port in node.get('ports', []):
+        if 'address' not in port:
+            continue
+        if not isinstance(port['address'], str):
+            raise tc_exceptions.InvalidNode(
+                'Node data has an unexpected value for the port address, '
+                'make sure it is appropriately quoted', node=node)
+        address = port['address'].lower()
+        if address in node_map['mac']:
+            candidates.add(node_map['mac'][address])
+
+    unique_id = handler.unique_id_from_fields(node)
+    if unique_id and unique_id in node_map['pm_addr']:
+        candidates.add(node_map['pm_addr'][unique_id])
+
+    uuid = node.get('uuid')
+    if uuid and uuid in node_map['uuids']:
+        candidates.add(uuid)
+
+    if len(candidates) > 1:
+        raise tc_exceptions.InvalidNode('Several candidates found for the '
+                                        'same node data: %s' % candidates,
+                                        node=node)
+    if candidates:
+        return candidates.pop()
+    return None
+
+
+def _update_or_register_node(node, node_map, client):
+    """Update the registered node matching the node data or register it
+
+    :returns: The Ironic node
+    """
+    handler = _find_node_handler(node)
+    node_uuid = _registered_node_uuid(node, handler, node_map)
+    if not node_uuid:
+        return node_utils.register_ironic_node(node, client)
+
+    LOG.info('Node %s already registered, updating details.', node_uuid)
+    patched = {}
+    for field, paths in _NON_DRIVER_FIELDS.items():
+        if isinstance(paths, str):
+            paths = [paths]
+        if field in node:
+            value = node.pop(field)
+            for path in paths:
+                patched[path] = value
+
+    caps = node_utils.capabilities_to_dict(node.pop('capabilities', {}))
+    if 'profile' in node:
+        caps['profile'] = node.pop('profile')
+    if caps:
+        patched['/properties/capabilities'] = (
+            node_utils.dict_to_capabilities(caps))
+
+    for key, value in handler.convert(node).items():
+        patched['/driver_info/%s' % key] = value
+
+    node_patch = [{'path': key, 'value': value, 'op': 'add'}
+                  for key, value in patched.items() if key != 'uuid']
+    return client.node.update(node_uuid, node_patch)
+
+
+def _wait_for_manageable(client, node_uuids, timeout, poll_interval):
+    """Wait for nodes to be verified, with one node listing per interval
+
+    :returns: Dict of the UUIDs of the nodes which failed to the error
+    """
+    pending = set(node_uuids)
+    failed = {}
+    deadline = time.monotonic() + timeout
+    while pending:
+        time.sleep(poll_interval)
+        for node in client.node.list(
+                fields=['uuid', 'provision_state', 'target_provision_state',
+                        'last_error'], limit=0):
+            if node.uuid not in pending or node.target_provision_state:
+                continue
+            if node.provision_state == 'manageable':
+                pending.discard(node.uuid)
+            elif node.provision_state == 'enroll':
+                pending.discard(node.uuid)
+                failed[node.uuid] = node.last_error or 'Verification failed'
+        if pending and time.monotonic() >= deadline:
+            for node_uuid in pending:
+                failed[node_uuid] = ('Timeout after {}s waiting for the '
+                                     'manageable state'.format(timeout))
+            break
+    return failed
+
+
 def register_or_update(clients, nodes_json, kernel_name=None,
                        ramdisk_name=None, instance_boot_option=None,
-                       boot_mode=None):
+                       boot_mode=None, concurrency=20, timeout=600,
+                       poll_interval=2):
     """Node Registration or Update
 
+    The registered nodes and ports are fetched once, then the nodes are
+    created or updated concurrently. Enrolled nodes are moved to the
+    manageable state and waited for together.
+
     :param clients: Application client object.
     :type clients: Object
 
@@ -72,6 +235,15 @@ def register_or_update(clients, nodes_json, kernel_name=None,
                       BIOS (bios)
     :type boot_mode: String
 
+    :param concurrency: How many nodes should we register at once
+    :type concurrency: Integer
+
+    :param timeout: How long to wait for the nodes to be manageable
+    :type timeout: Integer
+
+    :param poll_interval: How long to wait between two node listings
+    :type poll_interval: Integer
+
     :returns: List
     """
 
@@ -84,29 +256,99 @@ def register_or_update(clients, nodes_json, kernel_name=None,
             caps.setdefault('boot_mode', boot_mode)
         node['capabilities'] = node_utils.dict_to_capabilities(caps)
 
-    registered_nodes = node_utils.register_all_nodes(
-        nodes_json,
-        client=clients.baremetal,
-        kernel_name=kernel_name,
-        ramdisk_name=ramdisk_name)
-    if not isinstance(registered_nodes, list):
-        raise exceptions.RegisterOrUpdateError(registered_nodes)
-    else:
-        for node in registered_nodes:
-            if node.provision_state == 'enroll':
-                clients.baremetal.node.set_provision_state(
-                    node_uuid=node.uuid,
-                    state='manage'
-                )
-                print('Successfully registered node UUID {}'.format(node.uuid))
-            else:
-                print('Node UUID {} is already registered'.format(node.uuid))
+    client = clients.baremetal
+    node_map = _registered_nodes_map(client)
+    registered = {}
+    failed = {}
+    workers = min(len(nodes_json), concurrency) or 1
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        future_to_node = {}
+        for index, node in enumerate(nodes_json):
+            # the update pops the node fields, name the node beforehand
+            name = node.get('name') or node.get('uuid') or str(index)
+            future = executor.submit(
+                _update_or_register_node, node, node_map, client)
+            future_to_node[future] = (index, name)
+        for future in futures.as_completed(future_to_node):
+            index, name = future_to_node[future]
+            try:
+                registered[index] = future.result()
+            except Exception as e:
+                LOG.error('Failed to register node {}: {}'.format(name, e))
+                failed[name] = str(e)
+
+        nodes = [registered[i] for i in sorted(registered)]
+        enrolled = [n.uuid for n in nodes if n.provision_state == 'enroll']
+        future_to_uuid = {
+            executor.submit(client.node.set_provision_state,
+                            node_uuid=node_uuid, state='manage'): node_uuid
+            for node_uuid in enrolled
+        }
+        for future in futures.as_completed(future_to_uuid):
+            node_uuid = future_to_uuid[future]
+            try:
+                future.result()
+            except Exception as e:
+                failed[node_uuid] = str(e)
+
+    failed.update(_wait_for_manageable(
+        client, [u for u in enrolled if u not in failed], timeout,
+        poll_interval))
+
+    created = updated = 0
+    for node in nodes:
+        if node.uuid in failed:
+            continue
+        if node.uuid in node_map['uuids']:
+            updated += 1
+            print('Node UUID {} is already registered'.format(node.uuid))
+        else:
+            created += 1
+            print('Successfully registered node UUID {}'.format(node.uuid))
+    print('Nodes created: {}, updated: {}, failed: {}'.format(
+        created, updated, len(failed)))
+
+    if failed:
+        raise exceptions.RegisterOrUpdateError(
+            'Failed to register nodes: {}'.format(', '.join(
+                '{} ({})'.format(k, v) for k, v in sorted(failed.items()))))
+    return nodes
 
-    return registered_nodes
+
+def _validations_enabled():
+    """Return the tripleo_validations_enabled hiera value of the undercloud"""
+    try:
+        out, _err = processutils.execute(
+            'sudo', 'hiera', 'tripleo_validations_enabled')
+    except processutils.ProcessExecutionError as exc:
+        raise exceptions.IntrospectionError(
+            'Unable to check whether validations are enabled: {}'.format(
+                exc))
+    return strutils.bool_from_string(out.strip())
+
+
+def _run_pre_introspection_validations():
+    if not _validations_enabled():
+        LOG.info('Validations are disabled on the undercloud, skipping the '
+                 'pre-introspection validations')
+        return
+    actions = ValidationActions(constants.ANSIBLE_VALIDATION_DIR,
+                                log_path=constants.VALIDATIONS_LOG_BASEDIR)
+    results = actions.run_validations(
+        inventory='undercloud',
+        group=['pre-introspection'],
+        validations_dir=constants.ANSIBLE_VALIDATION_DIR)
+    failed = [str(r.get('Validations')) for r in results or []
+              if r.get('Status') != 'PASSED']
+    if failed:
+        raise exceptions.IntrospectionError(
+            'Pre-introspection validations failed: {}'.format(
+                ', '.join(failed)))
 
 
 def introspect(clients, node_uuids, run_validations, concurrency,
-               node_timeout, max_retries, retry_timeout, verbosity=0):
+               node_timeout=1200, max_retries=1, retry_timeout=120,
+               verbosity=0):
     """Introspect Baremetal Nodes
 
     :param clients: Application client object.
@@ -121,27 +363,29 @@ def introspect(clients, node_uuids, run_validations, concurrency,
     :param concurrency: concurrency level
     :type concurrency: Integer
 
+    :param node_timeout: Node timeout for introspection
+    :type node_timeout: Integer
+
+    :param max_retries: Max retries for introspection
+    :type max_retries: Integer
+
+    :param retry_timeout: Max timeout to wait between retries
+    :type retry_timeout: Integer
+
     :param verbosity: Verbosity level
     :type verbosity: Integer
     """
 
-    with utils.TempDirs() as tmp:
-        utils.run_ansible_playbook(
-            playbook='cli-baremetal-introspect.yaml',
-            inventory='localhost,',
-            workdir=tmp,
-            playbook_dir=constants.ANSIBLE_TRIPLEO_PLAYBOOKS,
-            verbosity=verbosity,
-            extra_vars={
-                "node_uuids": node_uuids,
-                "run_validations": run_validations,
-                "concurrency": concurrency,
-                "node_timeout": node_timeout,
-                "max_retries": max_retries,
-                "retry_timeout": retry_timeout,
+    if run_validations:
+        _run_pre_introspection_validations()
 
-            }
-        )
+    tb.TripleoIntrospect(
+        concurrency=concurrency,
+        node_timeout=node_timeout,
+        max_retries=max_retries,
+        retry_timeout=retry_timeout,
+        verbosity=verbosity
+    ).introspect(node_uuids)
 
     print('Successfully introspected nodes: {}'.format(node_uuids))
 
@@ -496,7 +740,7 @@ def _probe_node(ip, port, username, password,
 
 def discover_and_enroll(clients, ip_addresses, credentials, kernel_name,
                         ramdisk_name, instance_boot_option,
-                        existing_nodes=None, ports=None):
+                        existing_nodes=None, ports=None, concurrency=20):
     """Discover nodes and enroll baremetal nodes.
 
     :param clients: application client object.
@@ -526,6 +770,9 @@ def discover_and_enroll(clients, ip_addresses, credentials, kernel_name,
                   will be limted to [623].
     :type ports: List
 
+    :param concurrency: How many nodes should we register at once
+    :type concurrency: Integer
+
     :returns: List
     """
 
@@ -551,7 +798,8 @@ def discover_and_enroll(clients, ip_addresses, credentials, kernel_name,
         nodes_json=probed_nodes,
         instance_boot_option=instance_boot_option,
         kernel_name=kernel_name,
-        ramdisk_name=ramdisk_name
+        ramdisk_name=ramdisk_name,
+        concurrency=concurrency
     )
 
 
@@ -13,8 +13,12 @@
 import copy
 import getpass
 import git
+import hashlib
+import json
+import logging
 import os
 import shutil
+import stat
 import yaml
 
 from heatclient.common import event_utils
@@ -25,10 +29,14 @@ from tripleo_common.utils import overcloudrc as rc_utils
 from tripleoclient.constants import ANSIBLE_TRIPLEO_PLAYBOOKS
 from tripleoclient.constants import CLOUD_HOME_DIR
 from tripleoclient.constants import DEFAULT_WORK_DIR
+from tripleoclient import constants
 from tripleoclient import exceptions
 from tripleoclient import utils
 
 
+LOG = logging.getLogger(__name__)
+
+
 _WORKFLOW_TIMEOUT = 360  # 6 * 60 seconds
 
 
@@ -140,7 +148,7 @@ def get_hosts_and_enable_ssh_admin(stack_name, overcloud_ssh_network,
                                    overcloud_ssh_user, overcloud_ssh_key,
                                    overcloud_ssh_port_timeout,
                                    working_dir, verbosity=0,
-                                   heat_type='installed'):
+                                   heat_type='installed', session=None):
     """Enable ssh admin access.
 
     Get a list of hosts from a given stack and enable admin ssh across all of
@@ -163,6 +171,9 @@ def get_hosts_and_enable_ssh_admin(stack_name, overcloud_ssh_network,
 
     :param verbosity: Verbosity level
     :type verbosity: Integer
+
+    :param session: Session running the playbook
+    :type session: utils.PlaybookSession
     """
 
     hosts = get_overcloud_hosts(stack_name, overcloud_ssh_network, working_dir)
@@ -175,7 +186,8 @@ def get_hosts_and_enable_ssh_admin(stack_name, overcloud_ssh_network,
             overcloud_ssh_port_timeout,
             working_dir,
             verbosity=verbosity,
-            heat_type=heat_type
+            heat_type=heat_type,
+            session=session
         )
     else:
         raise exceptions.DeploymentError(
@@ -187,7 +199,8 @@ def get_hosts_and_enable_ssh_admin(stack_name, overcloud_ssh_network,
 
 
 def enable_ssh_admin(stack_name, hosts, ssh_user, ssh_key, timeout,
-                     working_dir, verbosity=0, heat_type='installed'):
+                     working_dir, verbosity=0, heat_type='installed',
+                     session=None):
     """Run enable ssh admin access playbook.
 
     :param stack_name: Stack name.
@@ -207,6 +220,9 @@ def enable_ssh_admin(stack_name, hosts, ssh_user, ssh_key, timeout,
 
     :param verbosity: Verbosity level
     :type verbosity: Integer
+
+    :param session: Session running the playbook
+    :type session: utils.PlaybookSession
     """
 
     print(
@@ -225,7 +241,8 @@ def enable_ssh_admin(stack_name, hosts, ssh_user, ssh_key, timeout,
         playbook = 'cli-enable-ssh-admin.yaml'
         ansible_work_dir = os.path.join(
             working_dir, os.path.splitext(playbook)[0])
-        utils.run_ansible_playbook(
+        run = session.run if session else utils.run_ansible_playbook
+        run(
             playbook=playbook,
             inventory=','.join(hosts),
             workdir=ansible_work_dir,
@@ -255,7 +272,7 @@ def config_download(log, clients, stack_name, ssh_network='ctlplane',
                     limit_hosts=None, extra_vars=None, inventory_path=None,
                     ssh_user='tripleo-admin', tags=None, skip_tags=None,
                     deployment_timeout=None, forks=None, working_dir=None,
-                    denyed_hostnames=None):
+                    denyed_hostnames=None, session=None):
     """Run config download.
 
     :param log: Logging object
@@ -317,6 +334,9 @@ def config_download(log, clients, stack_name, ssh_network='ctlplane',
     :param working_dir: Consistent working directory used for generated
                         ansible files.
     :type working_dir: String
+
+    :param session: Session running the playbooks
+    :type session: utils.PlaybookSession
     """
 
     def _log_and_print(message, logger, level='info', print_msg=True):
@@ -359,9 +379,8 @@ def config_download(log, clients, stack_name, ssh_network='ctlplane',
     playbook = 'cli-grant-local-access.yaml'
     ansible_work_dir = os.path.join(
         working_dir, os.path.splitext(playbook)[0])
-    utils.run_ansible_playbook(
+    utils.run_local_playbook(
         playbook=playbook,
-        inventory='localhost,',
         workdir=ansible_work_dir,
         playbook_dir=ANSIBLE_TRIPLEO_PLAYBOOKS,
         verbosity=verbosity,
@@ -369,7 +388,8 @@ def config_download(log, clients, stack_name, ssh_network='ctlplane',
         extra_vars={
             'access_path': output_dir,
             'execution_user': getpass.getuser()
-        }
+        },
+        session=session
     )
 
     _log_and_print(
@@ -404,7 +424,8 @@ def config_download(log, clients, stack_name, ssh_network='ctlplane',
     else:
         playbooks = os.path.join(stack_work_dir, ansible_playbook_name)
 
-    utils.run_ansible_playbook(
+    run = session.run if session else utils.run_ansible_playbook
+    run(
         playbook=playbooks,
         inventory=inventory_path,
         workdir=output_dir,
@@ -437,39 +458,184 @@ def config_download(log, clients, stack_name, ssh_network='ctlplane',
     snapshot_dir(stack_work_dir)
 
 
-def snapshot_dir(directory):
+def _snapshot_digest(path, st):
+    """Return the sha1 hex digest of a file or of a symlink target"""
+    digest = hashlib.sha1()
+    if stat.S_ISLNK(st.st_mode):
+        digest.update(os.fsencode(os.readlink(path)))
+    else:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _snapshot_stat_tree(directory, previous=None):
+    """Return a mapping of relative path to signature for a tree
+
+    A signature is [mtime_ns, size, mode, sha1]. The content digest of a
+    path is reused from ``previous`` when its stat data is unchanged, so
+    only files that were rewritten are read again. The .git directory is
+    skipped. Symlinks are recorded without being followed so the
+    signature matches what git stores.
+    """
+    previous = previous or {}
+    entries = {}
+    for root, dirs, files in os.walk(directory):
+        if root == directory and '.git' in dirs:
+            dirs.remove('.git')
+        names = list(files)
+        names.extend(d for d in dirs
+                     if os.path.islink(os.path.join(root, d)))
+        for name in names:
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, directory)
+            try:
+                st = os.lstat(path)
+                sig = [st.st_mtime_ns, st.st_size, st.st_mode]
+                old = previous.get(rel)
+                if old and len(old) == 4 and old[:3] == sig:
+                    sig.append(old[3])
+                else:
+                    sig.append(_snapshot_digest(path, st))
+            except OSError:
+                continue
+            entries[rel] = sig
+    return entries
+
+
+def _snapshot_changes(previous, current):
+    """Return the changed and removed paths between two tree signatures
+
+    The modification time is ignored: config-download rewrites every file
+    on each run, so only the size, mode and content digest are compared.
+    """
+    changed = sorted(path for path, sig in current.items()
+                     if (previous.get(path) or [None])[1:] != sig[1:])
+    removed = sorted(set(previous) - set(current))
+    return changed, removed
+
+
+def _load_snapshot_index(index_path):
+    try:
+        with open(index_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _chunks(items, size=500):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _prune_snapshots(repo, keep):
+    """Rewrite HEAD so that only the newest ``keep`` commits remain"""
+    commits = list(repo.iter_commits('HEAD', max_count=keep + 1))
+    if len(commits) <= keep:
+        return
+    parent = None
+    for commit in reversed(commits[:keep]):
+        args = [commit.tree.hexsha, '-m', commit.message]
+        if parent:
+            args.extend(['-p', parent])
+        parent = repo.git.commit_tree(*args)
+    repo.git.update_ref('HEAD', parent)
+
+
+def snapshot_dir(directory, keep=constants.CONFIG_DOWNLOAD_SNAPSHOT_KEEP,
+                 gc=constants.CONFIG_DOWNLOAD_SNAPSHOT_GC):
     """Git snapshot a directory
 
+    Only the paths whose size, mode or content changed since the previous
+    snapshot are staged, unless most of the tree changed in which case the
+    whole directory is added at once. No commit is made when the resulting
+    tree is identical to the one already recorded in HEAD.
+
     :params directory: Directory to snapshot
     :type directory: string
+    :params keep: Number of snapshot commits to retain. With 1 the
+                  existing commit is amended.
+    :type keep: integer
+    :params gc: Arguments for "git gc" run after a new snapshot, or None
+                to skip garbage collection.
+    :type gc: list
     :returns: None
     """
-    if os.path.exists(directory):
-        # Object to the git repository
-        repo = git.Repo(directory)
+    if not os.path.exists(directory):
+        return
 
-        # Configure git user.name and user.email
-        git_config_user = "mistral"
-        git_config_email = git_config_user + '@' + os.uname().nodename.strip()
-        repo.config_writer().set_value(
-            "user", "name", git_config_user
-        ).release()
-        repo.config_writer().set_value(
-            "user", "email", git_config_email
-        ).release()
+    # Object to the git repository
+    repo = git.Repo(directory)
+    index_path = os.path.join(repo.git_dir,
+                              constants.CONFIG_DOWNLOAD_SNAPSHOT_INDEX)
+    previous = _load_snapshot_index(index_path)
+    current = _snapshot_stat_tree(directory, previous)
+    if previous is not None:
+        changed, removed = _snapshot_changes(previous, current)
+        if not changed and not removed:
+            LOG.debug('No changes in %s since the last snapshot', directory)
+            if previous != current:
+                with open(index_path, 'w') as f:
+                    json.dump(current, f)
+            return
+
+    # Configure git user.name and user.email
+    git_config_user = "mistral"
+    git_config_email = git_config_user + '@' + os.uname().nodename.strip()
+    reader = repo.config_reader('repository')
+    if (reader.get_value('user', 'name', None) != git_config_user or
+            reader.get_value('user', 'email', None) != git_config_email):
+        with repo.config_writer() as writer:
+            writer.set_value("user", "name", git_config_user)
+            writer.set_value("user", "email", git_config_email)
+
+    if (previous is None or
+            len(changed) + len(removed) >
+            len(current) * constants.CONFIG_DOWNLOAD_SNAPSHOT_FULL_RATIO):
+        # A single "git add" is cheaper than many chunked calls when most
+        # of the tree changed
+        repo.git.add("-A", ".")
+    else:
+        if changed:
+            # Paths matched by .gitignore must not be passed to git add
+            ignored = set()
+            for chunk in _chunks(changed):
+                ignored.update(repo.ignored(*chunk))
+            changed = [path for path in changed if path not in ignored]
+        for chunk in _chunks(changed):
+            repo.git.add('--', *chunk)
+        for chunk in _chunks(removed):
+            repo.git.rm('--cached', '--ignore-unmatch', '-q', '--', *chunk)
+
+    head_valid = repo.head.is_valid()
+    tree = repo.git.write_tree()
+    if head_valid and tree == repo.head.commit.tree.hexsha:
+        LOG.debug('Tree of %s is unchanged, skipping snapshot', directory)
+    else:
+        if not head_valid:
+            repo.git.commit('-m', 'Snapshot of {}'.format(directory))
+        elif keep <= 1:
+            repo.git.commit("--amend", "--no-edit")
+        else:
+            repo.git.commit('-m', 'Snapshot of {}'.format(directory))
+            _prune_snapshots(repo, keep)
+        if gc:
+            repo.git.gc(*gc)
 
-        # Add and commit all files to the git repository
-        repo.git.add(".")
-        repo.git.commit("--amend", "--no-edit")
+    with open(index_path, 'w') as f:
+        json.dump(current, f)
 
 
 def get_horizon_url(stack, verbosity=0,
                     heat_type='installed',
-                    working_dir=None):
+                    working_dir=None, session=None):
     """Return horizon URL string.
 
     :params stack: Stack name
     :type stack: string
+    :param session: Session running the playbook
+    :type session: utils.PlaybookSession
     :returns: string
     """
 
@@ -480,9 +646,8 @@ def get_horizon_url(stack, verbosity=0,
         ansible_work_dir = os.path.join(
             working_dir, os.path.splitext(playbook)[0])
         horizon_file = os.path.join(ansible_work_dir, 'horizon_url')
-        utils.run_ansible_playbook(
+        utils.run_local_playbook(
             playbook=playbook,
-            inventory='localhost,',
             workdir=ansible_work_dir,
             playbook_dir=ANSIBLE_TRIPLEO_PLAYBOOKS,
             verbosity=verbosity,
@@ -490,7 +655,9 @@ def get_horizon_url(stack, verbosity=0,
             extra_vars={
                 'stack_name': stack,
                 'horizon_url_output_file': horizon_file
-            }
+            },
+            context={'working_dir': working_dir},
+            session=session
         )
     finally:
         if heat_type != 'installed' and tc_heat_utils.heatclient:
@@ -10,6 +10,8 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import collections
+from collections import abc as collections_abc
 import logging
 import os
 import re
@@ -91,7 +93,7 @@ def build_derived_params_environment(clients, stack_name, tht_root, env_files,
     # Build stack_data
     stack_data = utils.build_stack_data(
         clients, stack_name, template,
-        files, env_files_tracker)
+        files, env_files_tracker, cache_dir=working_dir)
 
     # Get role list
     role_list = roles.get_roles(clients, stack_name, template, files,
@@ -109,6 +111,61 @@ def build_derived_params_environment(clients, stack_name, tht_root, env_files,
         )
 
 
+def _analyze_parameters(stack_data, role_list):
+    """Find deprecated, unused and invalid role-specific parameters
+
+    :param stack_data: Data returned by utils.build_stack_data
+    :type stack_data: Dictionary
+    :param role_list: Names of the enabled roles
+    :type role_list: List
+    :returns: Tuple of deprecated, unused and invalid role-specific
+              parameter lists
+    """
+    user_params = stack_data.get('environment_parameters') or {}
+    heat_resource_tree = stack_data.get('heat_resource_tree', {})
+    heat_resource_tree_params = heat_resource_tree.get('parameters', {})
+    heat_resource_tree_resources = heat_resource_tree.get('resources', {})
+
+    params_role_specific_tag = set(
+        i.get('name')
+        for i in heat_resource_tree_params.values()
+        if 'tags' in i and 'role_specific' in i['tags']
+    )
+
+    # We are setting a frozenset here because python 3 complains that dict is
+    # a unhashable type.
+    user_params_keys = frozenset(user_params.keys())
+    deprecated_parameters = []
+    for resource in heat_resource_tree_resources.values():
+        groups = resource.get('parameter_groups')
+        if not groups or groups[0].get('label') != 'deprecated':
+            continue
+        if not frozenset(groups[0]).isdisjoint(user_params_keys):
+            deprecated_parameters.append(groups[0])
+
+    unused_params = [i for i in user_params
+                     if i not in heat_resource_tree_params]
+
+    # A user parameter applies to every role name it is a substring of,
+    # index all role name substrings to count matches in constant time.
+    role_substrings = collections.Counter()
+    for role in role_list:
+        role_substrings.update(set(
+            role[start:end]
+            for start in range(len(role) + 1)
+            for end in range(start, len(role) + 1)))
+
+    invalid_role_specific_params = []
+    for k, v in user_params.items():
+        matches = role_substrings.get(k, 0)
+        if (matches and isinstance(v, collections_abc.Hashable) and
+                v in params_role_specific_tag):
+            invalid_role_specific_params.extend([v] * matches)
+
+    return (deprecated_parameters, unused_params,
+            invalid_role_specific_params)
+
+
 def check_deprecated_parameters(clients, stack_name, template, files,
                                 env_files_tracker, working_dir):
     """Checks for deprecated parameters and adds warning if present.
@@ -133,69 +190,14 @@ def check_deprecated_parameters(clients, stack_name, template, files,
                                 detail=False,
                                 valid=True)
 
-    # Build stack_data
+    # Build stack_data, this is served from the cache populated by get_roles
     stack_data = utils.build_stack_data(
         clients, stack_name, template,
-        files, env_files_tracker)
-    user_params = stack_data.get('environment_parameters', {})
-    heat_resource_tree = stack_data.get('heat_resource_tree', {})
-    heat_resource_tree_params = heat_resource_tree.get('parameters', {})
-    heat_resource_tree_resources = heat_resource_tree.get('resources', {})
-    all_params = heat_resource_tree_params.keys()
-    parameter_groups = [
-        i.get('parameter_groups')
-        for i in heat_resource_tree_resources.values()
-        if i.get('parameter_groups')
-    ]
-    params_role_specific_tag = [
-        i.get('name')
-        for i in heat_resource_tree_params.values()
-        if 'tags' in i and 'role_specific' in i['tags']
-    ]
-
-    r = re.compile(".*Count")
-    filtered_names = list(filter(r.match, all_params))
-    valid_role_name_list = list()
-    for name in filtered_names:
-        default = heat_resource_tree_params[name].get('default', 0)
-        if default and int(default) > 0:
-            role_name = name.rstrip('Count')
-            if [i for i in role_list if i == role_name]:
-                valid_role_name_list.append(role_name)
-
-    deprecated_params = [
-        i[0] for i in parameter_groups
-        if i[0].get('label') == 'deprecated'
-    ]
-    # We are setting a frozenset here because python 3 complains that dict is
-    # a unhashable type.
-    # On user_defined, we check if the size is higher than 0 because an empty
-    # frozenset still is a subset of a frozenset, so we can't use issubset
-    # here.
-    user_params_keys = frozenset(user_params.keys())
-    deprecated_result = [
-        {
-            'parameter': i,
-            'deprecated': True,
-            'user_defined': len(
-                [x for x in frozenset(i) if x in user_params_keys]) > 0
-        }
-        for i in deprecated_params
-    ]
-    unused_params = [i for i in user_params.keys() if i not in all_params]
-    user_provided_role_specific = [
-        v for i in role_list
-        for k, v in user_params.items()
-        if k in i
-    ]
-    invalid_role_specific_params = [
-        i for i in user_provided_role_specific
-        if i in params_role_specific_tag
-    ]
-    deprecated_parameters = [
-        param['parameter'] for param in deprecated_result
-        if param.get('user_defined')
-    ]
+        files, env_files_tracker, cache_dir=working_dir)
+
+    (deprecated_parameters, unused_params,
+     invalid_role_specific_params) = _analyze_parameters(stack_data,
+                                                         role_list)
 
     if deprecated_parameters:
         deprecated_join = ', '.join(deprecated_parameters)
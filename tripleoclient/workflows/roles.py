@@ -36,7 +36,7 @@ def get_roles(clients,
 
     stack_data = utils.build_stack_data(
         clients, stack_name, template,
-        files, env_files)
+        files, env_files, cache_dir=working_dir)
 
     valid_roles = []
     for name in role_names:
@@ -11,16 +11,18 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import collections
 import logging
+import time
 from typing import Dict
 from typing import List
 
 from concurrent import futures
-from openstack import connect as sdkclient
 from openstack import exceptions
 from openstack.utils import iterate_timeout
 from oslo_utils import units
 from tripleoclient import exceptions as ooo_exceptions
+from tripleoclient import utils
 from tripleo_common.utils import nodes as node_utils
 
 
@@ -41,9 +43,7 @@ class TripleoBaremetal(object):
     """
 
     def __init__(self, timeout: int = 1200, verbosity: int = 1):
-        self.conn = sdkclient(
-            cloud='undercloud'
-        )
+        self.conn = utils.get_sdk_connection(cloud='undercloud')
         self.timeout = timeout
         self.log = logging.getLogger(__name__)
         if verbosity > 0:
@@ -343,6 +343,12 @@ class TripleoConfigure(TripleoBaremetal):
     :param overwrite_root_device_hints: Should we overwrite existing root
                                         device hints when root_device is used.
     :type overwrite_root_device_hints: Boolean
+
+    :param concurrency: How many nodes should we configure at once
+    :type concurrency: integer
+
+    :param dry_run: Print the changes of each node instead of applying them
+    :type dry_run: Boolean
     """
 
     log = logging.getLogger(__name__)
@@ -351,7 +357,8 @@ class TripleoConfigure(TripleoBaremetal):
                  instance_boot_option: str = None, boot_mode: str = None,
                  root_device: str = None, verbosity: int = 0,
                  root_device_minimum_size: int = 4,
-                 overwrite_root_device_hints: bool = False):
+                 overwrite_root_device_hints: bool = False,
+                 concurrency: int = 20, dry_run: bool = False):
 
         super().__init__(verbosity=verbosity)
         self.kernel_name = kernel_name
@@ -361,13 +368,19 @@ class TripleoConfigure(TripleoBaremetal):
         self.root_device = root_device
         self.root_device_minimum_size = root_device_minimum_size
         self.overwrite_root_device_hints = overwrite_root_device_hints
-
-    def _apply_root_device_strategy(self, node_uuid: List,
-                                    strategy: str, minimum_size: int = 4,
-                                    overwrite: bool = False):
-        clients = self.conn
-        node = clients.baremetal.find_node(node_uuid)
-
+        self.concurrency = concurrency
+        self.dry_run = dry_run
+        # The same for every node
+        self.image_values = {
+            '/driver_info/deploy_ramdisk': ramdisk_name,
+            '/driver_info/deploy_kernel': kernel_name,
+            '/driver_info/rescue_ramdisk': ramdisk_name,
+            '/driver_info/rescue_kernel': kernel_name,
+        }
+
+    def _root_device_values(self, node, strategy: str,
+                            minimum_size: int = 4,
+                            overwrite: bool = False) -> Dict:
         if node.properties.get('root_device') and not overwrite:
             # This is a correct situation, we still want to allow people to
             # fine-tune the root device setting for a subset of nodes.
@@ -379,21 +392,20 @@ class TripleoConfigure(TripleoBaremetal):
             self.log.warning('You may unset them by running $ ironic '
                              'node-update {} remove '
                              'properties/root_device'.format(node.id))
-            return
+            return {}
 
         inspector_client = self.conn.baremetal_introspection
-        baremetal_client = self.conn.baremetal
 
         try:
             data = inspector_client.get_introspection_data(node.id)
         except Exception:
-            raise exceptions.RootDeviceDetectionError(
+            raise ooo_exceptions.RootDeviceDetectionError(
                 f'No introspection data found for node {node.id}, '
                 'root device cannot be detected')
         try:
             disks = data['inventory']['disks']
         except KeyError:
-            raise exceptions.RootDeviceDetectionError(
+            raise ooo_exceptions.RootDeviceDetectionError(
                 f'Malformed introspection data for node {node.id}: '
                 'disks list is missing')
 
@@ -401,7 +413,7 @@ class TripleoConfigure(TripleoBaremetal):
         disks = [d for d in disks if d.get('size', 0) >= minimum_size]
 
         if not disks:
-            raise exceptions.RootDeviceDetectionError(
+            raise ooo_exceptions.RootDeviceDetectionError(
                 f'No suitable disks found for node {node.id}')
 
         if strategy == 'smallest':
@@ -421,7 +433,7 @@ class TripleoConfigure(TripleoBaremetal):
                 else:
                     break
             else:
-                raise exceptions.RootDeviceDetectionError(
+                raise ooo_exceptions.RootDeviceDetectionError(
                     f'Cannot find a disk with any of names {strategy} '
                     f'for node {node.id}')
 
@@ -434,7 +446,7 @@ class TripleoConfigure(TripleoBaremetal):
 
         if hint is None:
             # I don't think it might actually happen, but just in case
-            raise exceptions.RootDeviceDetectionError(
+            raise ooo_exceptions.RootDeviceDetectionError(
                 f"Neither WWN nor serial number are known for device "
                 f"{root_device['name']} "
                 f"on node {node.id}; root device hints cannot be used")
@@ -445,82 +457,416 @@ class TripleoConfigure(TripleoBaremetal):
         # This -1 is what we always do to account for partitioning
         new_size -= 1
 
-        baremetal_client.update_node(
-            node.id,
-            [{'op': 'add', 'path': '/properties/root_device', 'value': hint},
-             {'op': 'add', 'path': '/properties/local_gb', 'value': new_size}])
-        self.log.info('Updated root device for node %s, new device '
-                      'is %s, new local_gb is %s',
-                      node.id, root_device, new_size
-                      )
-
-    def _configure_boot(self, node_uuid: List,
-                        kernel_name: str = None,
-                        ramdisk_name: str = None,
-                        instance_boot_option: str = None,
-                        boot_mode: str = None):
-
-        baremetal_client = self.conn.baremetal
-
-        image_ids = {'kernel': kernel_name, 'ramdisk': ramdisk_name}
-        node = baremetal_client.find_node(node_uuid)
+        self.log.info('Root device for node %s is %s, new local_gb is %s',
+                      node.id, root_device, new_size)
+        return {'/properties/root_device': hint,
+                '/properties/local_gb': new_size}
+
+    def _boot_values(self, node) -> Dict:
         capabilities = node.properties.get('capabilities', {})
         capabilities = node_utils.capabilities_to_dict(capabilities)
 
-        if instance_boot_option is not None:
-            capabilities['boot_option'] = instance_boot_option
-        if boot_mode is not None:
-            capabilities['boot_mode'] = boot_mode
-
-        capabilities = node_utils.dict_to_capabilities(capabilities)
-        baremetal_client.update_node(node.id, [
-            {
-                'op': 'add',
-                'path': '/properties/capabilities',
-                'value': capabilities,
-            },
-            {
-                'op': 'add',
-                'path': '/driver_info/deploy_ramdisk',
-                'value': image_ids['ramdisk'],
-            },
-            {
-                'op': 'add',
-                'path': '/driver_info/deploy_kernel',
-                'value': image_ids['kernel'],
-            },
-            {
-                'op': 'add',
-                'path': '/driver_info/rescue_ramdisk',
-                'value': image_ids['ramdisk'],
-            },
-            {
-                'op': 'add',
-                'path': '/driver_info/rescue_kernel',
-                'value': image_ids['kernel'],
-            },
-        ])
+        if self.instance_boot_option is not None:
+            capabilities['boot_option'] = self.instance_boot_option
+        if self.boot_mode is not None:
+            capabilities['boot_mode'] = self.boot_mode
+
+        values = {'/properties/capabilities':
+                  node_utils.dict_to_capabilities(capabilities)}
+        values.update(self.image_values)
+        return values
+
+    @staticmethod
+    def _current_value(node, path: str):
+        field, _, key = path.lstrip('/').partition('/')
+        return (getattr(node, field, None) or {}).get(key)
+
+    def _node_patch(self, node) -> List:
+        """Return the JSON patch of the changes to a node"""
+        values = self._boot_values(node)
+        if self.root_device:
+            values.update(self._root_device_values(
+                node,
+                strategy=self.root_device,
+                minimum_size=self.root_device_minimum_size,
+                overwrite=self.overwrite_root_device_hints))
+        return [{'op': 'add', 'path': path, 'value': value}
+                for path, value in values.items()
+                if self._current_value(node, path) != value]
+
+    def _configure_node(self, node_uuid: str):
+        client = self.conn.baremetal
+        node = client.find_node(node_uuid, ignore_missing=False)
+        patch = self._node_patch(node)
+        if self.dry_run:
+            if not patch:
+                print('Node {}: no change'.format(node.id))
+            for op in patch:
+                print('Node {}: {}: {!r} -> {!r}'.format(
+                    node.id, op['path'],
+                    self._current_value(node, op['path']), op['value']))
+        elif patch:
+            client.patch_node(node, patch)
+            self.log.debug('Configured node {}: {}'.format(node.id, patch))
 
     def configure(self, node_uuids: List):
 
         """Configure Node boot options.
 
+        The changes of each node are sent as a single patch, only holding
+        the values which differ, and the nodes are patched concurrently.
+
         :param node_uuids: List of instance UUID(s).
         :type node_uuids: List
 
+        Raises:
+          NodeConfigurationError: If any of the nodes failed to be
+                                  configured.
         """
-        for node_uuid in node_uuids:
-            self._configure_boot(node_uuid, self.kernel_name,
-                                 self.ramdisk_name, self.instance_boot_option,
-                                 self.boot_mode)
-            if self.root_device:
-                self._apply_root_device_strategy(
-                    node_uuid,
-                    strategy=self.root_device,
-                    minimum_size=self.root_device_minimum_size,
-                    overwrite=self.overwrite_root_device_hints)
-
-        self.log.info('Successfully configured the nodes.')
+        failed = {}
+        workers = min(len(node_uuids), self.concurrency) or 1
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            future_to_node = {
+                executor.submit(self._configure_node, node_uuid): node_uuid
+                for node_uuid in node_uuids
+            }
+            for future in futures.as_completed(future_to_node):
+                node_uuid = future_to_node[future]
+                try:
+                    future.result()
+                except (ooo_exceptions.RootDeviceDetectionError,
+                        exceptions.SDKException) as e:
+                    self.log.error('Failed to configure node {}: {}'.format(
+                        node_uuid, e))
+                    failed[node_uuid] = str(e)
+
+        if failed:
+            raise ooo_exceptions.NodeConfigurationError(
+                'Failed to configure {} of {} nodes: {}'.format(
+                    len(failed), len(node_uuids), ', '.join(
+                        '{} ({})'.format(n, failed[n])
+                        for n in node_uuids if n in failed)))
+        if not self.dry_run:
+            self.log.info('Successfully configured the nodes.')
 
     def configure_manageable_nodes(self):
         self.configure(node_uuids=self.all_manageable_nodes())
+
+
+class TripleoUnprovision(TripleoBaremetal):
+
+    """TripleoUnprovision removes deployed instances and their ports.
+
+    It consumes the plan computed by the cli-overcloud-node-unprovision
+    playbook, a list of dicts with the hostname, name and id of every
+    instance, so Ironic and Neutron do not have to be searched again.
+
+    :param stack: Name of the stack the instances belong to
+    :type stack: String
+
+    :param concurrency: How many instances should we unprovision at once
+    :type concurrency: integer
+
+    :param timeout: How long to wait for each node to be undeployed
+    :type timeout: integer
+
+    :param manage_network_ports: Also delete the network ports tagged with
+                                 the stack and hostname of each instance
+    :type manage_network_ports: boolean
+    """
+
+    log = logging.getLogger(__name__)
+
+    # Node extra fields used by metalsmith to track its network ports
+    METALSMITH_PORT_FIELDS = ('metalsmith_created_ports',
+                              'metalsmith_attached_ports')
+
+    def __init__(self, stack: str, concurrency: int = 1,
+                 timeout: int = 1200, verbosity: int = 0,
+                 manage_network_ports: bool = False):
+        super().__init__(timeout=timeout, verbosity=verbosity)
+        self.stack = stack
+        self.concurrency = concurrency
+        self.manage_network_ports = manage_network_ports
+        self._planned = {}
+
+    def _node_state(self, node_id: str):
+        try:
+            node = self.conn.baremetal.get_node(node_id)
+        except exceptions.ResourceNotFound:
+            return node_id, None
+        return node_id, [node.provision_state, node.instance_id]
+
+    def record_plan(self, nodes: List):
+        """Record the Ironic state of the planned nodes
+
+        Nodes whose state differs from the recorded one when they are
+        unprovisioned are left untouched and reported as failed.
+
+        :param nodes: The unprovision plan
+        :type nodes: List
+        """
+        node_ids = [n['id'] for n in nodes if n.get('id')]
+        workers = min(len(node_ids), self.concurrency) or 1
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            self._planned = dict(executor.map(self._node_state, node_ids))
+
+    def _delete_network_ports(self, hostname: str):
+        client = self.conn.network
+        tags = ['tripleo_stack_name={}'.format(self.stack),
+                'tripleo_hostname={}'.format(hostname)]
+        for port in client.ports(tags=tags):
+            self.log.debug('Deleting port {} of {}'.format(port.id, hostname))
+            client.delete_port(port.id)
+
+    def _unprovision_node(self, node_id: str):
+        client = self.conn.baremetal
+        node = client.get_node(node_id)
+        planned = self._planned.get(node_id)
+        if (node_id in self._planned and
+                planned != [node.provision_state, node.instance_id]):
+            raise ooo_exceptions.NodeUnprovisionError(
+                'Node {} changed since the unprovision plan was '
+                'computed'.format(node_id))
+        extra = node.extra or {}
+        created_ports = extra.get('metalsmith_created_ports') or []
+        for vif in client.list_node_vifs(node):
+            client.detach_vif_from_node(node, vif, ignore_missing=True)
+            if vif in created_ports:
+                self.conn.network.delete_port(vif, ignore_missing=True)
+        patch = [{'op': 'remove', 'path': '/extra/{}'.format(field)}
+                 for field in self.METALSMITH_PORT_FIELDS
+                 if field in extra]
+        if patch:
+            client.patch_node(node, patch)
+        if node.provision_state not in ('available', 'manageable'):
+            client.set_node_provision_state(
+                node, 'deleted', wait=True, timeout=self.timeout)
+
+    def _unprovision_instance(self, instance: Dict):
+        if instance.get('id'):
+            self._unprovision_node(instance['id'])
+        if self.manage_network_ports and instance.get('hostname'):
+            self._delete_network_ports(instance['hostname'])
+
+    def unprovision(self, nodes: List):
+        """Unprovision the instances and network ports of a plan.
+
+        :param nodes: The unprovision plan
+        :type nodes: List
+
+        Raises:
+          NodeUnprovisionError: If any of the instances failed to be
+                                unprovisioned.
+        """
+        failed = []
+        workers = min(len(nodes), self.concurrency) or 1
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            future_to_node = {
+                executor.submit(self._unprovision_instance, node):
+                    node.get('hostname') or node.get('id')
+                for node in nodes
+            }
+            for future in futures.as_completed(future_to_node):
+                name = future_to_node[future]
+                try:
+                    future.result()
+                    self.log.info('Unprovisioned {}'.format(name))
+                except Exception as e:
+                    self.log.error(
+                        'Failed to unprovision {}: {}'.format(name, e))
+                    failed.append(name)
+        if failed:
+            raise ooo_exceptions.NodeUnprovisionError(
+                'Failed to unprovision: {}'.format(', '.join(sorted(failed))))
+
+
+class TripleoIntrospect(TripleoBaremetal):
+
+    """TripleoIntrospect inspects baremetal nodes in waves.
+
+    Inspection is started on up to concurrency nodes at once and the
+    progress of all of them is followed with a single node listing per
+    poll interval. As soon as a node finishes the next one is started.
+    Nodes failing or timing out are retried, after a delay doubling with
+    every attempt and capped by retry_timeout.
+
+    :param concurrency: How many nodes should we inspect at once
+    :type concurrency: integer
+
+    :param node_timeout: How long to wait for each node to be inspected
+    :type node_timeout: integer
+
+    :param max_retries: How many times a failed node is inspected again
+    :type max_retries: integer
+
+    :param retry_timeout: Maximum delay before inspecting a node again
+    :type retry_timeout: integer
+
+    :param poll_interval: How long to wait between two node listings
+    :type poll_interval: integer
+    """
+
+    # Fields of the node listing used to follow the inspection
+    POLL_FIELDS = ('uuid', 'provision_state', 'target_provision_state',
+                   'last_error')
+
+    def __init__(self, concurrency: int = 20, node_timeout: int = 1200,
+                 max_retries: int = 1, retry_timeout: int = 120,
+                 poll_interval: int = 10, verbosity: int = 1):
+        super().__init__(timeout=node_timeout, verbosity=verbosity)
+        self.concurrency = max(concurrency, 1)
+        self.max_retries = max_retries
+        self.retry_timeout = retry_timeout
+        self.poll_interval = poll_interval
+
+    def _start_inspection(self, node_uuid: str):
+        client = self.conn.baremetal
+        node = client.get_node(node_uuid)
+        if node.provision_state not in ('manageable', 'inspect failed'):
+            raise ooo_exceptions.IntrospectionError(
+                'Node {} is in the {} state, it must be manageable to be '
+                'introspected'.format(node_uuid, node.provision_state))
+        if node.reservation:
+            node = client.wait_for_node_reservation(
+                node, timeout=self.retry_timeout)
+        if node.power_state != 'power off':
+            client.set_node_power_state(node, 'power off', wait=True,
+                                        timeout=self.retry_timeout)
+        client.set_node_provision_state(node, 'inspect', wait=False)
+
+    def _abort_inspection(self, node_uuid: str):
+        try:
+            self.conn.baremetal.set_node_provision_state(node_uuid, 'abort')
+        except exceptions.SDKException as e:
+            self.log.debug('Can not abort the introspection of node '
+                           '{}: {}'.format(node_uuid, e))
+
+    def _poll(self, node_uuids: List) -> Dict:
+        """Return the nodes among node_uuids whose inspection ended
+
+        :returns: Dict of node UUIDs to None when the inspection
+                  succeeded, or to the error when it failed
+        """
+        nodes = {n.id: n for n in self.conn.baremetal.nodes(
+            fields=list(self.POLL_FIELDS))}
+        finished = {}
+        for node_uuid in node_uuids:
+            node = nodes.get(node_uuid)
+            if node is None:
+                finished[node_uuid] = 'Node not found'
+            elif node.target_provision_state:
+                continue
+            elif node.provision_state == 'manageable':
+                finished[node_uuid] = None
+            elif node.provision_state == 'inspect failed':
+                finished[node_uuid] = node.last_error or 'Inspection failed'
+        return finished
+
+    def introspect(self, node_uuids: List):
+        """Introspect nodes and return them once all of them are done.
+
+        :param node_uuids: The UUIDs of the nodes to introspect
+        :type node_uuids: List
+
+        Raises:
+          NoNodeFound: If no node is given.
+          IntrospectionError: If any node failed to be introspected after
+                              all of its retries.
+        """
+        if not node_uuids:
+            raise ooo_exceptions.NoNodeFound
+
+        total = len(node_uuids)
+        waiting = collections.deque(node_uuids)
+        retrying = {}
+        running = {}
+        attempts = collections.Counter()
+        passed = []
+        failed = {}
+
+        def attempt_failed(node_uuid, error, retry=True):
+            attempts[node_uuid] += 1
+            attempt = attempts[node_uuid]
+            if retry and attempt <= self.max_retries:
+                delay = min(self.retry_timeout,
+                            self.poll_interval * 2 ** (attempt - 1))
+                self.log.warning(
+                    'Introspection of node {} failed, retrying in {}s: '
+                    '{}'.format(node_uuid, delay, error))
+                retrying[node_uuid] = time.monotonic() + delay
+            else:
+                failed[node_uuid] = error
+                self.log.error('[{}/{}] Introspection of node {} failed: '
+                               '{}'.format(len(passed) + len(failed), total,
+                                           node_uuid, error))
+
+        workers = min(total, self.concurrency)
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            while waiting or retrying or running:
+                now = time.monotonic()
+                for node_uuid, due in list(retrying.items()):
+                    if due <= now:
+                        del retrying[node_uuid]
+                        waiting.append(node_uuid)
+
+                wave = {}
+                while waiting and len(running) + len(wave) < self.concurrency:
+                    node_uuid = waiting.popleft()
+                    wave[executor.submit(self._start_inspection,
+                                         node_uuid)] = node_uuid
+                for future in futures.as_completed(wave):
+                    node_uuid = wave[future]
+                    try:
+                        future.result()
+                    except ooo_exceptions.IntrospectionError as e:
+                        attempt_failed(node_uuid, str(e), retry=False)
+                    except exceptions.SDKException as e:
+                        attempt_failed(node_uuid, str(e))
+                    else:
+                        self.log.info('Introspection started for node '
+                                      '{}'.format(node_uuid))
+                        running[node_uuid] = (
+                            time.monotonic() + self.timeout)
+
+                if running:
+                    time.sleep(self.poll_interval)
+                elif retrying:
+                    time.sleep(max(0, min(retrying.values()) -
+                                   time.monotonic()))
+                    continue
+                else:
+                    continue
+
+                try:
+                    finished = self._poll(list(running))
+                except exceptions.SDKException as e:
+                    self.log.warning('Can not list the nodes: {}'.format(e))
+                    finished = {}
+                now = time.monotonic()
+                for node_uuid, deadline in list(running.items()):
+                    if node_uuid in finished:
+                        del running[node_uuid]
+                        error = finished[node_uuid]
+                        if error:
+                            attempt_failed(node_uuid, error)
+                        else:
+                            passed.append(node_uuid)
+                            self.log.info(
+                                '[{}/{}] Introspection of node {} '
+                                'succeeded'.format(len(passed) + len(failed),
+                                                   total, node_uuid))
+                    elif deadline <= now:
+                        del running[node_uuid]
+                        self._abort_inspection(node_uuid)
+                        attempt_failed(
+                            node_uuid, 'Timeout after {}s waiting for the '
+                            'introspection'.format(self.timeout))
+
+        if failed:
+            raise ooo_exceptions.IntrospectionError(
+                'Introspection failed for {} of {} nodes: {}'.format(
+                    len(failed), total, ', '.join(
+                        '{} ({})'.format(n, failed[n])
+                        for n in node_uuids if n in failed)))
+        return passed